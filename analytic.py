@@ -0,0 +1,114 @@
+"""
+Many of the first runs of a search fail, and queueing theory can tell which ones before simulating them. This module
+estimates the smallest number of desks that can succeed, and the desk searches start at that estimate instead of at
+one desk (see estimated_search in search.py).
+
+The hospital is treated as a non-preemptive priority M/M/c queue:
+
+    1. Rates: the interarrival gaps and service times are max(1, round(X)) of an exponential X with mean
+    INTERARRIVAL_RATE_LAMBDA_PARAM and SERVICE_TIME_LAMBDA_PARAM. The discretised value G is at least k for
+    k >= 2 exactly when X >= k - 0.5, so E[G] = 1 + sum_{k>=2} exp(-(k - 0.5) / scale)
+    = 1 + exp(-1.5 / scale) / (1 - exp(-1 / scale)). The arrival rate is 1 / E[gap] and the service rate
+    1 / E[service time]. The priorities are uniform, so every priority class gets the same share of the arrivals.
+
+    2. Stability: if num_desks * service_rate <= arrival_rate, the waiting line grows without bound and in the
+    long run hits WAITING_LINE_CAPACITY (or, without a capacity, the allowed waiting times).
+
+    3. Waiting line capacity: Erlang-C gives the probability C that a patient has to wait and the mean number of
+    waiting patients Lq = C * rho / (1 - rho). If Lq is above WAITING_LINE_CAPACITY, the line is over its capacity
+    on average and goes over it in the long run.
+
+    4. Allowed waiting times: in a non-preemptive priority M/M/c queue the mean waiting time of class k is
+    W_k = C / (c * mu) / ((1 - sigma_{k-1}) * (1 - sigma_k)), where sigma_k is the load of the classes 1..k. If the
+    mean waiting time of a class is above its allowed waiting time, some patient of that class waits too long in
+    the long run.
+
+The rules describe the steady state of the queue, whatever SIMULATION_TIME is, so none of them is certain to hold
+for a run. A short run can end before the line has grown over its capacity (with SIMULATION_TIME 200, a number of
+desks below the stability limit can succeed), and a run can be lucky with its patients. The estimate is therefore
+never used to rule a number of desks out: the searches start at it and, if it succeeds, still simulate the numbers
+of desks below it until one fails. A good estimate saves most of the runs of a linear search; a high one costs a
+few extra runs, not a wrong required number of desks.
+"""
+
+from math import exp
+from config import *
+
+
+def discretised_exponential_mean(scale):
+    """
+    Mean of max(1, round(X)) for an exponential X with the given mean (scale).
+    """
+    return 1 + exp(-1.5 / scale) / (1 - exp(-1 / scale))
+
+
+def erlang_c(num_desks, offered_load):
+    """
+    Probability that an arriving patient has to wait in an M/M/c queue (Erlang-C formula).
+
+    Parameters:
+    - num_desks (int): Number of desks (c).
+    - offered_load (float): arrival_rate / service_rate, which must be less than num_desks.
+    """
+    # Erlang-B by its stable recursion, then converted to Erlang-C
+    erlang_b = 1.0
+    for k in range(1, num_desks + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+    utilisation = offered_load / num_desks
+    return erlang_b / (1 - utilisation * (1 - erlang_b))
+
+
+def allowed_waiting_time(priority, config=DEFAULT_CONFIG):
+    """
+    Allowed waiting time of a patient with the given priority (see Patient in simulation.py).
+    """
+    return priority if priority <= config.emergency_threshold else config.non_emergency_allowed_waiting_time
+
+
+def infeasibility_cause(num_desks, config=DEFAULT_CONFIG):
+    """
+    Checks whether a number of desks breaks one of the steady-state rules for the hospital of the config.
+
+    Returns:
+    - The STOP_TRIGGERS value the runs with this number of desks end with in the long run, or None if the number of
+      desks passes the rules.
+    """
+    arrival_rate = 1 / discretised_exponential_mean(config.interarrival_rate_lambda_param)
+    service_rate = 1 / discretised_exponential_mean(config.service_time_lambda_param)
+    offered_load = arrival_rate / service_rate
+    utilisation = offered_load / num_desks
+
+    if utilisation >= 1:
+        if config.waiting_line_capacity == float('inf'):
+            return STOP_TRIGGERS['patient_waiting_time_failure']
+        return STOP_TRIGGERS['waiting_queue_failure']
+
+    probability_of_waiting = erlang_c(num_desks, offered_load)
+    if probability_of_waiting * utilisation / (1 - utilisation) > config.waiting_line_capacity:
+        return STOP_TRIGGERS['waiting_queue_failure']
+
+    class_utilisation = utilisation / (config.priority_upper_bound - config.priority_lower_bound + 1)
+    base_waiting_time = probability_of_waiting / (num_desks * service_rate)
+    higher_classes_load = 0
+    for priority in range(config.priority_lower_bound, config.priority_upper_bound + 1):
+        classes_load = higher_classes_load + class_utilisation
+        mean_waiting_time = base_waiting_time / ((1 - higher_classes_load) * (1 - classes_load))
+        if mean_waiting_time > allowed_waiting_time(priority, config):
+            return STOP_TRIGGERS['patient_waiting_time_failure']
+        higher_classes_load = classes_load
+
+    return None
+
+
+def analytic_estimate(start=1, config=DEFAULT_CONFIG):
+    """
+    Returns the smallest number of desks, starting at start, that passes the steady-state rules for the hospital of
+    the config. The patients of an arrival log (see arrival_log.py) do not follow the distributions, so the estimate
+    of a log is start.
+    """
+    if config.arrival_log:
+        return start
+    number_of_desks = start
+    while infeasibility_cause(number_of_desks, config) is not None:
+        number_of_desks += 1
+    return number_of_desks
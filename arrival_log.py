@@ -0,0 +1,257 @@
+"""
+Real arrival logs can drive the runs instead of the exponential distributions of config.py. A log is a CSV file with
+a header and one row per patient, in arrival order:
+
+    timestamp,priority,service_time
+    2024-03-01T08:00:00,4,12
+    2024-03-01T08:01:30,9,25
+
+The timestamp is either a number of minutes or an ISO 8601 date and time, the priority is a triage priority between
+PRIORITY_LOWER_BOUND and PRIORITY_UPPER_BOUND and the service time is in minutes. Like the sampled values, the times
+are rounded to whole minutes and the service times are at least one minute.
+
+Reading a CSV with millions of rows into Python objects for every run would cost more than the runs, so a log is
+converted once to a compact NumPy binary next to it (the same name with .npy), with one LOG_DTYPE record per patient:
+the gap in minutes since the previous arrival, the priority and the service time. The conversion streams the CSV
+in blocks of CONVERSION_BLOCK_SIZE rows into a memory-mapped .npy file, so it does not hold the log in memory either,
+and it is done again only when the CSV is newer than its binary.
+
+The runs memory-map the binary (open_arrival_log). A process maps every log once and all its runs, for every number
+of desks of a search, read the same mapped buffer; the pages come from the page cache of the operating system, so
+the worker processes (see workers.py) share them as well and nothing is copied. LogSampler has the interface of
+PatientSampler (see sampler.py), so both engines take it as is: it converts the log to lists one block of
+SAMPLER_BLOCK_SIZE rows at a time, as PatientSampler does with its drawn values.
+
+The first patient of the log arrives at minute 0 of the run. Once the log is used up, the next arrival is put off
+to the first minute after SIMULATION_TIME, so it ends the run like the arrival after SIMULATION_TIME does with the
+distributions, and the run stops at that time like a sampled one instead of far in the future; that last arrival is
+not a patient of the log and gets the lowest priority and a one-minute service. A run that gets through the whole
+log and the rest of SIMULATION_TIME without a failure is a success, and a log longer than SIMULATION_TIME is only
+used up to it.
+
+A log replays the same patients whatever the seed, so all the replications of a number of desks are the same run.
+The analytic estimate (see analytic.py) assumes the exponential distributions and is not used for a log.
+"""
+
+import csv
+import os
+from datetime import datetime
+import numpy as np
+from config import *
+from sampler import PatientSampler
+
+LOG_DTYPE = np.dtype([('gap', '<i4'), ('priority', '<i1'), ('service_time', '<i4')])
+LOG_COLUMNS = ('timestamp', 'priority', 'service_time')
+PRIORITY_RANGE = np.iinfo(LOG_DTYPE['priority'])
+CONVERSION_BLOCK_SIZE = 100000
+
+# Gaps after the arrival that ends a run with a log, and after the last patient if SIMULATION_TIME is not finite
+END_OF_LOG_GAP = 2 ** 62
+
+# The logs this process has mapped, by the path of their binary
+mapped_logs = {}
+
+
+def binary_path(path):
+    return os.path.splitext(path)[0] + '.npy'
+
+
+def parse_timestamp(value):
+    """
+    Returns a timestamp of the log in minutes: a number as is, or an ISO 8601 date and time in minutes since the
+    epoch.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp() / 60
+
+
+def read_blocks(csv_path):
+    """
+    Yields the rows of a log as (timestamps, priorities, service_times) lists of at most CONVERSION_BLOCK_SIZE rows.
+    """
+    with open(csv_path, newline='') as log:
+        reader = csv.reader(log)
+        header = [name.strip() for name in next(reader, [])]
+        if any(name not in header for name in LOG_COLUMNS):
+            raise ValueError(f"{csv_path} needs the columns {', '.join(LOG_COLUMNS)}")
+        columns = [header.index(name) for name in LOG_COLUMNS]
+        block = ([], [], [])
+        for line, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                block[0].append(parse_timestamp(row[columns[0]]))
+                block[1].append(int(row[columns[1]]))
+                block[2].append(float(row[columns[2]]))
+            except (IndexError, ValueError):
+                raise ValueError(f"{csv_path}, line {line}: not a timestamp, priority and service time: {row}")
+            if len(block[0]) == CONVERSION_BLOCK_SIZE:
+                yield block
+                block = ([], [], [])
+        if block[0]:
+            yield block
+
+
+def convert_arrival_log(csv_path, npy_path=None):
+    """
+    Converts a CSV log to its binary and returns the path of the binary.
+
+    Parameters:
+    - csv_path (str): The CSV log.
+    - npy_path (str): The binary to write. None uses the CSV path with .npy.
+    """
+    npy_path = npy_path or binary_path(csv_path)
+    with open(csv_path, newline='') as log:
+        rows = sum(1 for row in csv.reader(log) if row) - 1
+    if rows == 0:
+        raise ValueError(f"{csv_path} has no patients")
+
+    # Another process may convert the same log at the same time, so every process writes a file of its own
+    temporary_path = f"{npy_path}.{os.getpid()}.tmp"
+    records = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=LOG_DTYPE, shape=(rows,))
+    try:
+        start = 0
+        first_arrival = previous_arrival = None
+        for timestamps, priorities, service_times in read_blocks(csv_path):
+            if first_arrival is None:
+                first_arrival = previous_arrival = timestamps[0]
+            arrivals = np.round(np.array(timestamps) - first_arrival)
+            gaps = np.diff(arrivals, prepend=np.round(previous_arrival - first_arrival))
+            if (gaps < 0).any():
+                raise ValueError(f"{csv_path} is not in arrival order")
+            if min(priorities) < PRIORITY_RANGE.min or max(priorities) > PRIORITY_RANGE.max:
+                raise ValueError(f"{csv_path} has priorities out of the range of {LOG_DTYPE['priority']}")
+            block = records[start:start + len(timestamps)]
+            block['gap'] = gaps
+            block['priority'] = priorities
+            block['service_time'] = np.maximum(1, np.round(service_times))
+            start += len(timestamps)
+            previous_arrival = timestamps[-1]
+        records.flush()
+    except BaseException:
+        # A log that can not be converted leaves no half-written binary behind
+        del records
+        os.remove(temporary_path)
+        raise
+    del records
+    os.replace(temporary_path, npy_path)
+    return npy_path
+
+
+def prepare_arrival_log(path):
+    """
+    Returns the binary of a log, converting a CSV first if its binary is missing or older than it.
+
+    Parameters:
+    - path (str): The CSV log or its .npy binary.
+    """
+    npy_path = binary_path(path)
+    if path != npy_path and (not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(path)):
+        convert_arrival_log(path, npy_path)
+    return npy_path
+
+
+def log_fingerprint(path):
+    """
+    Returns what tells two versions of a log apart: the size and modification time of its binary.
+    """
+    stat = os.stat(prepare_arrival_log(path))
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def open_arrival_log(path):
+    """
+    Returns the records of a log, memory-mapped and read-only. The map is made once per process and version of the
+    binary, and reused by all the runs.
+    """
+    npy_path = prepare_arrival_log(path)
+    version = log_fingerprint(npy_path)
+    mapped = mapped_logs.get(npy_path)
+    if mapped is None or mapped[0] != version:
+        mapped = mapped_logs[npy_path] = (version, np.load(npy_path, mmap_mode='r'))
+    return mapped[1]
+
+
+class LogSampler(PatientSampler):
+    def __init__(self, config=DEFAULT_CONFIG, block_size=SAMPLER_BLOCK_SIZE):
+        """
+        Hands out the patients and gaps of the arrival log of the config. Only the draws differ from
+        PatientSampler: they read the next records instead of drawing random values.
+
+        Parameters:
+        - config (SimulationConfig): The simulated hospital, whose arrival_log is read.
+        - block_size (int): Number of records converted to lists at a time.
+        """
+        self.config = config
+        self.block_size = block_size
+        self.records = open_arrival_log(config.arrival_log)
+
+        self.priorities = []
+        self.allowed_waiting_times = []
+        self.service_times = []
+        self.patient_index = 0
+        self.patient_start = 0
+        self.interarrival_times = []
+        self.interarrival_index = 0
+        # The gap to the next arrival is the gap of the next record, so the gaps start at the second record
+        self.interarrival_start = 1
+        # The arrival time of the last patient handed out a gap, and whether the log is used up
+        self.arrival_time = 0
+        self.log_ended = False
+
+    def __getstate__(self):
+        # The mapped records are not pickled (that would copy the log), they are mapped again when unpickled
+        state = self.__dict__.copy()
+        del state['records']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.records = open_arrival_log(self.config.arrival_log)
+
+    def draw_patients(self, size):
+        """
+        Returns the priorities, allowed waiting times and service times of the next size patients of the log, as
+        arrays. Past the end of the log, they are filled up with patients of the lowest priority and a one-minute
+        service.
+        """
+        config = self.config
+        block = self.records[self.patient_start:self.patient_start + size]
+        self.patient_start += len(block)
+        priorities = block['priority'].astype(np.int64)
+        if len(block) and (priorities.min() < config.priority_lower_bound
+                           or priorities.max() > config.priority_upper_bound):
+            raise ValueError(f"{config.arrival_log} has priorities outside of {config.priority_lower_bound} to "
+                             f"{config.priority_upper_bound}")
+        priorities = np.concatenate([priorities, np.full(size - len(block), config.priority_upper_bound)])
+        service_times = np.concatenate([block['service_time'].astype(np.int64), np.ones(size - len(block), np.int64)])
+        allowed_waiting_times = np.where(priorities <= config.emergency_threshold, priorities,
+                                         config.non_emergency_allowed_waiting_time)
+        return priorities, allowed_waiting_times, service_times
+
+    def draw_interarrival_times(self, size):
+        """
+        Returns the next size gaps of the log, as an array. Past the end of the log, the first gap takes the next
+        arrival to the first minute after SIMULATION_TIME, which ends the run, and the others are END_OF_LOG_GAP.
+        """
+        block = self.records[self.interarrival_start:self.interarrival_start + size]
+        self.interarrival_start += len(block)
+        gaps = np.concatenate([block['gap'].astype(np.int64), np.full(size - len(block), END_OF_LOG_GAP)])
+        self.arrival_time += int(gaps[:len(block)].sum())
+        if len(block) < size and not self.log_ended:
+            self.log_ended = True
+            simulation_time = self.config.simulation_time
+            if simulation_time != float('inf'):
+                gaps[len(block)] = max(1, int(simulation_time) + 1 - self.arrival_time)
+        return gaps
+
+
+def make_sampler(seed, config=DEFAULT_CONFIG):
+    """
+    Returns the sampler of a run: a LogSampler if the config has an arrival log, else a PatientSampler with the seed.
+    """
+    if config.arrival_log:
+        return LogSampler(config)
+    return PatientSampler(seed, config)
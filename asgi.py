@@ -0,0 +1,127 @@
+"""
+The ASGI (FastAPI) entry point of the app. It serves the same pages, /metrics, /jobs (see jobs.py) and
+/run-simulation and /run-sweep streams as app.py, with the same query parameters, event ids and Last-Event-ID
+resume (see session.py), but on an event loop:
+
+    1. A stream does not hold a thread. It waits on an asyncio queue that the driver thread of its session wakes up
+    whenever there is a new event (see SimulationSession.simulate_and_stream_async), and sends a heartbeat every
+    SSE_HEARTBEAT_INTERVAL seconds in between. One server process can keep hundreds of idle or slow streams open.
+
+    2. The CPU work never runs on the event loop. The runs are simulated on the shared process pool (see
+    workers.py). The search itself, which waits for them (and waits RUN_PACING seconds between the runs of a
+    browser's sequential search), runs in one of the SESSION_WORKERS driver threads of session.py. A search holds
+    its driver thread for its whole life, so hundreds of searches started at once do not get hundreds of threads:
+    SESSION_WORKERS of them run and the others wait in the queue of the driver threads, while their streams send
+    heartbeats.
+
+Run it with:
+
+    uvicorn asgi:app
+
+or python asgi.py.
+"""
+
+import os
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from config import *
+from session import open_session, search_arguments, resume_position, SSE_HEADERS
+from sweep import SweepSession, sweep_arguments
+from jobs import JOB_KINDS, submit_job, find_job, job_status, job_position
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE
+
+app = FastAPI()
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
+
+
+@app.get('/run-simulation')
+async def run_simulation(request: Request):
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    if last_event_id:
+        position = resume_position(last_event_id)
+        if position is None:
+            return Response(status_code=204)
+        session, last_event_number = position
+        return StreamingResponse(session.simulate_and_stream_async(last_event_number),
+                                 media_type='text/event-stream', headers=SSE_HEADERS)
+
+    try:
+        arguments = search_arguments(request.query_params)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    session = open_session(DEFAULT_CONFIG, **arguments)
+    return StreamingResponse(session.simulate_and_stream_async(), media_type='text/event-stream',
+                             headers=SSE_HEADERS)
+
+
+@app.get('/run-sweep')
+async def run_sweep(request: Request):
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    if last_event_id:
+        position = resume_position(last_event_id)
+        if position is None:
+            return Response(status_code=204)
+        session, last_event_number = position
+        return StreamingResponse(session.simulate_and_stream_async(last_event_number),
+                                 media_type='text/event-stream', headers=SSE_HEADERS)
+
+    try:
+        arguments = sweep_arguments(request.query_params)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    session = open_session(session_class=SweepSession, **arguments)
+    return StreamingResponse(session.simulate_and_stream_async(), media_type='text/event-stream',
+                             headers=SSE_HEADERS)
+
+
+@app.post('/jobs')
+async def create_job(request: Request):
+    kind = request.query_params.get('kind', 'search')
+    if kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind '{kind}', expected one of {sorted(JOB_KINDS)}")
+    try:
+        arguments = (search_arguments(request.query_params) if kind == 'search'
+                     else sweep_arguments(request.query_params))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    session, deduplicated = submit_job(kind, arguments)
+    return JSONResponse({**job_status(session), 'deduplicated': deduplicated}, status_code=202)
+
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    session = find_job(job_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job_status(session)
+
+
+@app.get('/jobs/{job_id}/events')
+async def stream_job(job_id: str, request: Request):
+    session = find_job(job_id)
+    if session is None:
+        return Response(status_code=204)
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    return StreamingResponse(session.simulate_and_stream_async(job_position(session, last_event_id)),
+                             media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.get('/')
+async def index(request: Request):
+    return templates.TemplateResponse(request, 'index.html')
+
+
+@app.get('/sweep')
+async def sweep(request: Request):
+    return templates.TemplateResponse(request, 'sweep.html')
+
+
+@app.get('/metrics')
+async def metrics():
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app)
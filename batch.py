@@ -0,0 +1,292 @@
+"""
+The batch runner searches the required number of desks of many scenarios without the web app, for example
+overnight. A scenario file is YAML: a list of scenarios, or a mapping with the scenarios under 'scenarios' and the
+overrides every scenario starts from under 'defaults'. A scenario has a name and overrides constants of config.py
+by their names:
+
+    defaults:
+      REPLICATIONS: 10
+    scenarios:
+      - name: baseline
+      - name: busy winter
+        INTERARRIVAL_RATE_LAMBDA_PARAM: 0.6
+        WAITING_LINE_CAPACITY: .inf
+      - name: march log
+        ARRIVAL_LOG: logs/march.csv
+
+The constants of the simulated hospital (the fields of SimulationConfig) make the config of the scenario, and
+SIMULATION_ENGINE, DESK_SEARCH, REPLICATIONS, SEARCH_SEED, COMMON_RANDOM_NUMBERS and ANALYTIC_LOWER_BOUND set its
+desk search (see search_required_desks in sweep.py); the constants a scenario does not name keep their config.py
+values. An ARRIVAL_LOG is relative to the scenario file, the priority bounds and EMERGENCY_THRESHOLD must be whole
+numbers, in that order, and only WAITING_LINE_CAPACITY and NON_EMERGENCY_ALLOWED_WAITING_TIME can be .inf (an
+infinite SIMULATION_TIME would never let a run succeed). All the scenarios are read and checked before the first one is simulated, so a typo
+does not show up hours into a batch.
+
+Every scenario is searched in a thread of its own, up to --workers at a time, and the runs of all the searches are
+simulated on the shared process pool of --workers processes (see workers.py), or replayed from the result cache
+(see result_cache.py). The worker processes trace nothing, so there is no terminal output per patient or per run,
+and nothing is plotted. Every scenario is written out as soon as its search is over, in the order the searches
+finish, so the output of a batch that is cut short holds every scenario done until then:
+
+    1. JSON Lines (any output not ending in .csv): one record per scenario with its name, overrides, required
+    number of desks, the number of desks its search started at, its wall time and the DeskResult (see
+    replication.py) of every number of desks it simulated, or its error.
+
+    2. CSV: one row per scenario with its name, its overrides (one column per constant any scenario overrides),
+    the required number of desks, the number of desks its search started at and simulated, the success rate, average
+    waiting time and confidence interval of the required number of desks, its wall time and its error.
+
+Run it from the repository root:
+
+    python batch.py SCENARIOS.yaml [MORE.yaml ...] [--output results.jsonl] [--workers N]
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+import yaml
+from config import *
+import event_trace
+from search import DESK_SEARCHES
+from simulation import ENGINES
+from analytic import analytic_estimate
+from workers import get_process_pool
+from sweep import search_required_desks
+
+"""
+SEARCH_OPTIONS: The constants of config.py that set the desk search of a scenario, and the argument of
+search_required_desks each of them is.
+"""
+
+SEARCH_OPTIONS = {
+    'SIMULATION_ENGINE': 'engine',
+    'DESK_SEARCH': 'search_mode',
+    'REPLICATIONS': 'replications',
+    'SEARCH_SEED': 'seed',
+    'COMMON_RANDOM_NUMBERS': 'common_random_numbers',
+    'ANALYTIC_LOWER_BOUND': 'analytic_lower_bound'
+}
+
+# The fields of SimulationConfig that count priorities, and so must be whole numbers
+WHOLE_FIELDS = ('priority_lower_bound', 'priority_upper_bound', 'emergency_threshold')
+# The fields of SimulationConfig that can be infinite, meaning no limit
+UNBOUNDED_FIELDS = ('waiting_line_capacity', 'non_emergency_allowed_waiting_time')
+
+CSV_COLUMNS = ['scenario', 'required_desks', 'start', 'desk_counts', 'success_rate', 'average_waiting_time',
+               'confidence_interval_low', 'confidence_interval_high', 'wall_time', 'error']
+
+
+class Scenario(NamedTuple):
+    name: str
+    overrides: dict
+    config: SimulationConfig
+    engine: str
+    search_mode: str
+    replications: int
+    seed: int
+    common_random_numbers: bool
+    analytic_lower_bound: bool
+
+
+def make_scenario(name, overrides, folder):
+    """
+    Returns the Scenario of a name and its overrides, and raises ValueError if an override is not valid: the
+    priority bounds and the emergency threshold must be whole numbers, with the threshold between the bounds, and
+    only the fields of UNBOUNDED_FIELDS can be infinite.
+
+    Parameters:
+    - name (str): The name of the scenario.
+    - overrides (dict): The values of the config.py constants the scenario overrides, by their names.
+    - folder (str): The folder of the scenario file, which an ARRIVAL_LOG is relative to.
+    """
+    fields = {}
+    options = {'engine': SIMULATION_ENGINE, 'search_mode': DESK_SEARCH, 'replications': REPLICATIONS,
+               'seed': SEARCH_SEED, 'common_random_numbers': COMMON_RANDOM_NUMBERS,
+               'analytic_lower_bound': ANALYTIC_LOWER_BOUND}
+    for key, value in overrides.items():
+        if key in SEARCH_OPTIONS:
+            options[SEARCH_OPTIONS[key]] = value
+        elif key == str(key).upper() and str(key).lower() in SimulationConfig._fields:
+            field = key.lower()
+            if field == 'arrival_log':
+                if value is not None and not isinstance(value, str):
+                    raise ValueError(f"scenario '{name}': {key} must be a path")
+                fields[field] = os.path.join(folder, value) if value else None
+            elif field in WHOLE_FIELDS and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+                raise ValueError(f"scenario '{name}': {key} must be a positive whole number")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or not value > 0:
+                raise ValueError(f"scenario '{name}': {key} must be a positive number")
+            elif not math.isfinite(value) and field not in UNBOUNDED_FIELDS:
+                raise ValueError(f"scenario '{name}': {key} must be finite")
+            else:
+                fields[field] = value
+        else:
+            raise ValueError(f"scenario '{name}': {key} is not a constant of config.py a scenario can override")
+
+    config = DEFAULT_CONFIG._replace(**fields)
+    if not config.priority_lower_bound <= config.priority_upper_bound:
+        raise ValueError(f"scenario '{name}': PRIORITY_LOWER_BOUND ({config.priority_lower_bound}) is above "
+                         f"PRIORITY_UPPER_BOUND ({config.priority_upper_bound})")
+    if not config.priority_lower_bound <= config.emergency_threshold <= config.priority_upper_bound:
+        raise ValueError(f"scenario '{name}': EMERGENCY_THRESHOLD ({config.emergency_threshold}) is not between "
+                         f"PRIORITY_LOWER_BOUND and PRIORITY_UPPER_BOUND ({config.priority_lower_bound}.."
+                         f"{config.priority_upper_bound})")
+
+    if options['engine'] not in ENGINES:
+        raise ValueError(f"scenario '{name}': unknown engine '{options['engine']}', expected one of {sorted(ENGINES)}")
+    if options['search_mode'] not in DESK_SEARCHES:
+        raise ValueError(f"scenario '{name}': unknown search '{options['search_mode']}', expected one of "
+                         f"{sorted(DESK_SEARCHES)}, the scenarios are searched in parallel already")
+    for option in ('replications', 'seed'):
+        if isinstance(options[option], bool) or not isinstance(options[option], int) or options[option] < 0:
+            raise ValueError(f"scenario '{name}': {option} must be a whole number")
+    if options['replications'] < 1:
+        raise ValueError(f"scenario '{name}': replications must be at least 1")
+    for option in ('common_random_numbers', 'analytic_lower_bound'):
+        if not isinstance(options[option], bool):
+            raise ValueError(f"scenario '{name}': {option} must be true or false")
+    return Scenario(name, overrides, config, **options)
+
+
+def read_scenarios(path):
+    """
+    Returns the Scenarios of a scenario file, and raises ValueError if the file or a scenario is not valid. A
+    scenario without a name is named after the file and its position in it.
+    """
+    with open(path) as scenario_file:
+        document = yaml.safe_load(scenario_file)
+    defaults = {}
+    if isinstance(document, dict):
+        defaults = document.get('defaults') or {}
+        document = document.get('scenarios')
+    if not isinstance(document, list) or not isinstance(defaults, dict):
+        raise ValueError(f"{path} needs a list of scenarios, or a mapping with 'scenarios' and 'defaults'")
+
+    scenarios = []
+    for position, entry in enumerate(document, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: scenario {position} is not a mapping of constants")
+        overrides = {**defaults, **entry}
+        name = str(overrides.pop('name', f"{os.path.basename(path)}#{position}"))
+        scenarios.append(make_scenario(name, overrides, os.path.dirname(os.path.abspath(path))))
+    return scenarios
+
+
+def run_scenario(scenario):
+    """
+    Runs the desk search of a scenario and returns its record: the JSON Lines output of the scenario.
+    """
+    record = {'scenario': scenario.name, 'overrides': scenario.overrides}
+    start_time = time.perf_counter()
+    try:
+        start = analytic_estimate(1, scenario.config) if scenario.analytic_lower_bound else 1
+        results = []
+        required_desks, _ = search_required_desks(scenario.config, 1, scenario.engine, scenario.search_mode,
+                                                  scenario.replications, scenario.seed,
+                                                  scenario.common_random_numbers, results, estimate=start)
+        record.update(required_desks=required_desks, start=start,
+                      desk_counts=[result._asdict() for result in results])
+    except Exception as error:
+        record['error'] = f"{type(error).__name__}: {error}"
+    record['wall_time'] = round(time.perf_counter() - start_time, 3)
+    return record
+
+
+def csv_row(record):
+    """
+    Returns the CSV row of the record of a scenario.
+    """
+    row = {'scenario': record['scenario'], **record['overrides'], 'wall_time': record['wall_time'],
+           'error': record.get('error', '')}
+    if 'required_desks' in record:
+        required = next(result for result in record['desk_counts']
+                        if result['number_of_desks'] == record['required_desks'])
+        row.update(required_desks=record['required_desks'], start=record['start'],
+                   desk_counts=len(record['desk_counts']), success_rate=required['success_rate'],
+                   average_waiting_time=required['average_waiting_time'],
+                   confidence_interval_low=required['confidence_interval'][0],
+                   confidence_interval_high=required['confidence_interval'][1])
+    return row
+
+
+def quiet_worker():
+    """
+    Turns the trace of the runs of a worker process off (see event_trace.py). The initializer of the batch's
+    worker processes.
+    """
+    event_trace.TRACE_LEVEL = 'off'
+    event_trace.TRACE_TO_TERMINAL = False
+
+
+def run_batch(scenarios, output, workers=PARALLEL_WORKERS, progress=None):
+    """
+    Runs the desk searches of the scenarios and writes their records to output as they finish. Returns the number of
+    scenarios that failed.
+
+    Parameters:
+    - scenarios (list): The Scenarios to search.
+    - output (str): The output file, CSV if it ends in .csv and JSON Lines otherwise.
+    - workers (int): Number of worker processes, and of scenarios searched at the same time.
+    - progress (function): Called with the record of every scenario once it is written, or None.
+    """
+    get_process_pool(workers, initializer=quiet_worker)
+    as_csv = output.lower().endswith('.csv')
+    failed = 0
+    with open(output, 'w', newline='') as output_file:
+        if as_csv:
+            overridden = list(dict.fromkeys(key for scenario in scenarios for key in scenario.overrides))
+            writer = csv.DictWriter(output_file, [CSV_COLUMNS[0], *overridden, *CSV_COLUMNS[1:]])
+            writer.writeheader()
+
+        threads = ThreadPoolExecutor(max_workers=workers)
+        try:
+            searches = [threads.submit(run_scenario, scenario) for scenario in scenarios]
+            for search in as_completed(searches):
+                record = search.result()
+                failed += 'error' in record
+                if as_csv:
+                    writer.writerow(csv_row(record))
+                else:
+                    output_file.write(json.dumps(record, default=str) + '\n')
+                output_file.flush()
+                if progress is not None:
+                    progress(record)
+        finally:
+            threads.shutdown(wait=False, cancel_futures=True)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Desk searches of the scenarios of YAML files, without the web app.")
+    parser.add_argument('scenario_files', nargs='+', help="YAML scenario files")
+    parser.add_argument('--output', default='results.jsonl', help="output file, .csv for CSV and JSON Lines otherwise")
+    parser.add_argument('--workers', type=int, default=PARALLEL_WORKERS, help="number of worker processes")
+    arguments = parser.parse_args()
+
+    try:
+        scenarios = [scenario for path in arguments.scenario_files for scenario in read_scenarios(path)]
+    except (OSError, ValueError, yaml.YAMLError) as error:
+        sys.exit(f"error: {error}")
+    names = [scenario.name for scenario in scenarios]
+    if len(set(names)) < len(names):
+        sys.exit("error: the scenarios need different names")
+
+    start = time.perf_counter()
+    done = 0
+
+    def report(record):
+        global done
+        done += 1
+        outcome = record.get('error') or f"{record['required_desks']} desks"
+        print(f"[{done}/{len(scenarios)}] {record['scenario']}: {outcome} ({record['wall_time']:.1f} s)")
+
+    failed = run_batch(scenarios, arguments.output, arguments.workers, report)
+    print(f"{len(scenarios)} scenarios in {time.perf_counter() - start:.1f} s, {failed} failed, "
+          f"written to {arguments.output}")
+    sys.exit(1 if failed else 0)
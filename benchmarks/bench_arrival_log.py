@@ -0,0 +1,108 @@
+"""
+Benchmark of the arrival logs (see arrival_log.py). It writes a CSV log of ROWS patients drawn by a PatientSampler,
+so the log holds exactly the patients and gaps that sampler would hand out, and then:
+
+    1. times the conversion of the CSV to its binary and compares their sizes.
+
+    2. checks that runs replaying the log give the same stop cause, waiting time counts and counters as runs with
+    the sampler, for both engines and several numbers of desks.
+
+    3. checks that the samplers of several runs read the same mapped buffer.
+
+    4. times heap runs over the whole log with the log and with the sampler, and reports the tracemalloc peak of a
+    run with the log, which stays far below the size of the log since the records are only mapped.
+
+Run it from the repository root:
+
+    python benchmarks/bench_arrival_log.py [ROWS]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from config import *
+from sampler import PatientSampler
+from arrival_log import LogSampler, convert_arrival_log
+from simulation import ENGINES
+from event_trace import Trace
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+SEED = 0
+DESKS = range(14, 22)
+
+
+def write_log(path, rows, seed):
+    """
+    Writes the first rows patients of a PatientSampler as a CSV log. Returns the minute of the last arrival.
+    """
+    sampler = PatientSampler(seed)
+    arrival = 0
+    with open(path, 'w', newline='') as log:
+        writer = csv.writer(log)
+        writer.writerow(['timestamp', 'priority', 'service_time'])
+        for _ in range(rows):
+            priority, _, service_time = sampler.next_patient()
+            writer.writerow([arrival, priority, service_time])
+            last_arrival = arrival
+            arrival += sampler.next_interarrival_time()
+    return last_arrival
+
+
+def run(engine, sampler, config, num_desks):
+    counters = {}
+    stop_cause, waiting_time_counts = ENGINES[engine](num_desks, sampler, config, trace=Trace('off'),
+                                                      counters=counters)
+    return stop_cause, waiting_time_counts, counters
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        csv_path = os.path.join(folder, 'arrivals.csv')
+        last_arrival = write_log(csv_path, ROWS, SEED)
+
+        start = time.perf_counter()
+        npy_path = convert_arrival_log(csv_path)
+        conversion_time = time.perf_counter() - start
+        print(f"{ROWS} patients over {last_arrival} minutes: CSV {os.path.getsize(csv_path) / 2 ** 20:.1f} MB, "
+              f"binary {os.path.getsize(npy_path) / 2 ** 20:.1f} MB, converted in {conversion_time:.2f} s")
+
+        config = DEFAULT_CONFIG._replace(arrival_log=npy_path)
+        mismatches = 0
+        for engine in ENGINES:
+            for num_desks in DESKS:
+                if run(engine, LogSampler(config), config, num_desks) != run(engine, PatientSampler(SEED), config,
+                                                                                num_desks):
+                    mismatches += 1
+                    print(f"MISMATCH: {engine} engine, {num_desks} desks")
+        print(f"log vs sampler: {2 * len(DESKS) - mismatches} of {2 * len(DESKS)} runs agree")
+
+        samplers = [LogSampler(config) for _ in range(3)]
+        print(f"runs share one mapped buffer: "
+              f"{all(sampler.records is samplers[0].records for sampler in samplers)}, "
+              f"memory-mapped: {isinstance(samplers[0].records, np.memmap)}")
+
+        # A run long enough to use up the whole log, with enough desks to get through it
+        long_config = config._replace(simulation_time=last_arrival + 1, waiting_line_capacity=float('inf'))
+        for name, make_sampler in [('log', lambda: LogSampler(long_config)), ('sampler', lambda: PatientSampler(SEED))]:
+            start = time.perf_counter()
+            stop_cause, waiting_time_counts, _ = run('heap', make_sampler(), long_config, max(DESKS) + 10)
+            elapsed = time.perf_counter() - start
+            print(f"heap run over the whole log with the {name}: {elapsed:.2f} s, "
+                  f"{len(waiting_time_counts) / elapsed:,.0f} patients/s, stop cause {stop_cause}")
+
+        tracemalloc.start()
+        run('heap', LogSampler(long_config), long_config, max(DESKS) + 10)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"tracemalloc peak of a run over the whole log: {peak / 2 ** 20:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
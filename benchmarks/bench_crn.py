@@ -0,0 +1,55 @@
+"""
+Benchmark of common random numbers (see session.py). For pairs of neighbouring numbers of desks it simulates
+REPLICATIONS_PER_PAIR replications twice: once with independent seeds for the two numbers of desks and once with
+the same seed for both. It reports the standard deviation of the difference of their average waiting times and how
+often the larger number of desks fails while the smaller one succeeds (an inversion). Runs that fail stop early, so
+their average waiting times cover different stretches of time and the standard deviation only shrinks a little;
+the inversions, which are what misleads a search, disappear with common random numbers.
+
+Run it from the repository root:
+
+    python benchmarks/bench_crn.py
+"""
+
+import os
+import sys
+from statistics import stdev
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler, run_seed
+from event_engine import run_heap_simulation
+from event_trace import Trace
+
+DESK_PAIRS = [(15, 16), (16, 17), (17, 18), (18, 19)]
+REPLICATIONS_PER_PAIR = 100
+
+
+def run(num_desks, seed):
+    stop_cause, waiting_time_counts = run_heap_simulation(num_desks, PatientSampler(seed), trace=Trace('off'))
+    return stop_cause, waiting_time_counts.total() / len(waiting_time_counts)
+
+
+def compare(num_desks, seeds, other_seeds):
+    differences = []
+    inversions = 0
+    for seed, other_seed in zip(seeds, other_seeds):
+        smaller_stop_cause, smaller_average = run(num_desks, seed)
+        larger_stop_cause, larger_average = run(num_desks + 1, other_seed)
+        differences.append(smaller_average - larger_average)
+        success = STOP_TRIGGERS['success']
+        inversions += smaller_stop_cause == success and larger_stop_cause != success
+    return differences, inversions
+
+
+if __name__ == "__main__":
+    print(f"{'desks':>8} {'sd independent':>15} {'sd common':>10} {'inversions independent':>23} {'inversions common':>18}")
+    for num_desks, _ in DESK_PAIRS:
+        replications = range(REPLICATIONS_PER_PAIR)
+        seeds = [run_seed(SEARCH_SEED, replication, num_desks) for replication in replications]
+        other_seeds = [run_seed(SEARCH_SEED, replication, num_desks + 1) for replication in replications]
+        independent, independent_inversions = compare(num_desks, seeds, other_seeds)
+        common, common_inversions = compare(num_desks, seeds, seeds)
+        print(f"{num_desks:>3} - {num_desks + 1:<2} {stdev(independent):15.3f} {stdev(common):10.3f} "
+              f"{independent_inversions:23d} {common_inversions:18d}")
@@ -0,0 +1,61 @@
+"""
+Benchmark of the two simulation engines. For a range of seeds and desk counts it first checks that the SimPy model
+of simulation.py and the heapq engine of event_engine.py give the same stop cause, waiting times, per-patient trace,
+created patients and longest waiting line for the same sampler, then times a full run of each engine with the trace
+off.
+
+Run it from the repository root:
+
+    python benchmarks/bench_engines.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import ENGINES
+from sampler import PatientSampler
+from event_trace import Trace
+
+SEEDS = range(20)
+DESK_COUNTS = range(1, 25)
+
+
+def run(engine, num_desks, seed, trace_level='off'):
+    trace = Trace(trace_level, capacity=100000)
+    counters = {}
+    result = ENGINES[engine](num_desks, PatientSampler(seed), trace=trace, counters=counters)
+    # The events are engine specific
+    return result, trace.events(), counters['patients_created'], counters['peak_waiting_line']
+
+
+def check_equivalence():
+    mismatches = []
+    for seed in SEEDS:
+        for num_desks in DESK_COUNTS:
+            if run('simpy', num_desks, seed, 'per-patient') != run('heap', num_desks, seed, 'per-patient'):
+                mismatches.append((seed, num_desks))
+    return mismatches
+
+
+def time_engine(engine):
+    start = time.perf_counter()
+    for seed in SEEDS:
+        for num_desks in DESK_COUNTS:
+            run(engine, num_desks, seed)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    mismatches = check_equivalence()
+    runs = len(SEEDS) * len(DESK_COUNTS)
+    if mismatches:
+        sys.exit(f"engines disagree on {len(mismatches)} of {runs} runs (seed, desks): {mismatches[:10]}")
+    print(f"engines agree on all {runs} runs")
+
+    simpy_seconds = time_engine('simpy')
+    heap_seconds = time_engine('heap')
+    print(f"simpy: {simpy_seconds / runs * 1e3:8.2f} ms per run")
+    print(f"heap:  {heap_seconds / runs * 1e3:8.2f} ms per run ({simpy_seconds / heap_seconds:.1f}x faster)")
@@ -0,0 +1,147 @@
+"""
+Microbenchmark of the per-patient path of the SimPy model. It runs the model of simulation.py next to a copy of the
+old per-patient path (a nested service process per patient, the waiting queue as a list of names with
+list.remove(), a __dict__ per patient), checks that both give the same stop cause and waiting times, and reports
+the patients per second (patients that got to a desk) of each. Every path is timed REPEATS times with timeit, and
+the best and the median of the repeats are reported, so one slow repeat does not skew the comparison.
+
+Run it from the repository root:
+
+    python benchmarks/bench_patient_path.py
+"""
+
+import os
+import sys
+import statistics
+import timeit
+import simpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler
+from simulation import run_simpy_simulation
+from event_trace import Trace
+
+SEEDS = range(10)
+DESK_COUNTS = range(14, 22)
+REPEATS = 5
+
+
+class LegacyHospital:
+    def __init__(self, env, num_desks, config):
+        self.env = env
+        self.desks = simpy.PriorityResource(env, num_desks)
+        self.config = config
+        self.waiting_queue = []
+        self.waiting_times = []
+        self.stop_simulation = env.event()
+        self.stop_cause = None
+        self.patient_number = 1
+
+    def service(self, service_time):
+        yield self.env.timeout(service_time)
+
+
+class LegacyPatient:
+    def __init__(self, name, priority, allowed_waiting_time, service_time):
+        self.name = name
+        self.priority = priority
+        self.allowed_waiting_time = allowed_waiting_time
+        self.service_time = service_time
+        self.hospital_arrival_time = None
+        self.desk_arrival_time = None
+        self.exit_time = None
+        self.waiting_time = None
+
+
+def legacy_stop(hospital, cause):
+    if not hospital.stop_simulation.triggered:
+        hospital.stop_simulation.succeed()
+        hospital.stop_cause = STOP_TRIGGERS[cause]
+
+
+def legacy_patient_process(env, hospital, sampler):
+    name = hospital.patient_number
+    hospital.patient_number += 1
+    patient = LegacyPatient(name, *sampler.next_patient())
+    hospital.waiting_queue.append(patient.name)
+    if len(hospital.waiting_queue) > hospital.config.waiting_line_capacity:
+        legacy_stop(hospital, 'waiting_queue_failure')
+    patient.hospital_arrival_time = env.now
+
+    with hospital.desks.request(priority=patient.priority) as request:
+        yield request
+        patient.desk_arrival_time = env.now
+        patient.waiting_time = patient.desk_arrival_time - patient.hospital_arrival_time
+        hospital.waiting_times.append(patient.waiting_time)
+        patient_state = patient.__dict__
+        if patient_state['allowed_waiting_time'] < patient_state['waiting_time']:
+            legacy_stop(hospital, 'patient_waiting_time_failure')
+        hospital.waiting_queue.remove(patient.name)
+        yield env.process(hospital.service(patient.service_time))
+        patient.exit_time = env.now
+
+
+def legacy_setup(env, hospital, sampler):
+    while True:
+        env.process(legacy_patient_process(env, hospital, sampler))
+        interarrival_time = sampler.next_interarrival_time()
+        if env.now > hospital.config.simulation_time:
+            legacy_stop(hospital, 'success')
+        yield env.timeout(interarrival_time)
+
+
+def run_legacy_simulation(num_desks, sampler, config=DEFAULT_CONFIG):
+    env = simpy.Environment()
+    hospital = LegacyHospital(env, num_desks, config)
+    env.process(legacy_setup(env, hospital, sampler))
+    env.run(until=hospital.stop_simulation)
+    return hospital.stop_cause, hospital.waiting_times
+
+
+def run_current_simulation(num_desks, sampler):
+    return run_simpy_simulation(num_desks, sampler, trace=Trace('off'))
+
+
+def waiting_times_of(waiting_time_counts):
+    """
+    Returns the waiting times counted by a WaitingTimeCounts (see online_stats.py), in increasing order.
+    """
+    counts, overflow = waiting_time_counts.distribution()
+    return [waiting_time for waiting_time, count in [*enumerate(counts), *overflow] for _ in range(count)]
+
+
+def run_all(run):
+    patients = 0
+    for seed in SEEDS:
+        for num_desks in DESK_COUNTS:
+            stop_cause, waiting_times = run(num_desks, PatientSampler(seed))
+            patients += len(waiting_times)
+    return patients
+
+
+def patients_per_second(run):
+    """
+    Returns the best and the median patients per second of REPEATS timings of all the runs.
+    """
+    patients = run_all(run)
+    seconds = timeit.repeat(lambda: run_all(run), number=1, repeat=REPEATS)
+    return patients / min(seconds), patients / statistics.median(seconds)
+
+
+if __name__ == "__main__":
+    for seed in SEEDS:
+        for num_desks in DESK_COUNTS:
+            legacy_stop_cause, legacy_waiting_times = run_legacy_simulation(num_desks, PatientSampler(seed))
+            stop_cause, waiting_time_counts = run_current_simulation(num_desks, PatientSampler(seed))
+            if (legacy_stop_cause, sorted(legacy_waiting_times)) != (stop_cause, waiting_times_of(waiting_time_counts)):
+                sys.exit(f"the old and new per-patient paths disagree on seed {seed} with {num_desks} desks")
+    print(f"old and new per-patient paths agree on all {len(SEEDS) * len(DESK_COUNTS)} runs")
+
+    before_best, before_median = patients_per_second(run_legacy_simulation)
+    after_best, after_median = patients_per_second(run_current_simulation)
+    print(f"best of {REPEATS} repeats and median:")
+    print(f"before: {before_best:10.0f} patients/s, median {before_median:10.0f}")
+    print(f"after:  {after_best:10.0f} patients/s, median {after_median:10.0f} "
+          f"({after_best / before_best:.2f}x best, {after_median / before_median:.2f}x median)")
@@ -0,0 +1,54 @@
+"""
+Benchmark of the per-patient cost of drawing random inputs. It compares the old way of drawing a patient's
+priority, service time and interarrival gap (three scalar np.random calls per patient) with reading them from a
+PatientSampler that pre-draws them in blocks.
+
+Run it from the repository root:
+
+    python benchmarks/bench_sampler.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler
+
+NUMBER_OF_PATIENTS = 200_000
+REPEATS = 5
+
+
+def scalar_draws(n):
+    for _ in range(n):
+        priority = np.random.randint(PRIORITY_LOWER_BOUND, PRIORITY_UPPER_BOUND + 1)
+        allowed_waiting_time = (
+            priority if priority <= EMERGENCY_THRESHOLD else NON_EMERGENCY_ALLOWED_WAITING_TIME
+        )
+        service_time = max(1, round(np.random.exponential(scale=SERVICE_TIME_LAMBDA_PARAM)))
+        interarrival_time = max(1, round(np.random.exponential(scale=INTERARRIVAL_RATE_LAMBDA_PARAM)))
+
+
+def sampler_draws(n):
+    sampler = PatientSampler(seed=10)
+    for _ in range(n):
+        priority, allowed_waiting_time, service_time = sampler.next_patient()
+        interarrival_time = sampler.next_interarrival_time()
+
+
+def per_patient_ns(function):
+    seconds = min(timeit.repeat(lambda: function(NUMBER_OF_PATIENTS), number=1, repeat=REPEATS))
+    return seconds / NUMBER_OF_PATIENTS * 1e9
+
+
+if __name__ == "__main__":
+    np.random.seed(10)
+    scalar = per_patient_ns(scalar_draws)
+    block = per_patient_ns(sampler_draws)
+    print(f"scalar np.random calls: {scalar:8.1f} ns per patient")
+    print(f"PatientSampler blocks:  {block:8.1f} ns per patient "
+          f"(block size {SAMPLER_BLOCK_SIZE}, {scalar / block:.1f}x faster)")
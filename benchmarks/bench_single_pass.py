@@ -0,0 +1,100 @@
+"""
+Benchmark of the single pass over numbers of desks (see run_desk_counts in vector_engine.py and single_pass.py). It
+runs the numbers of desks 1..MAX_DESKS on the patients of REPLICATIONS seeds in one pass and then:
+
+    1. checks that every run agrees with a separate heap engine run of the same number of desks and seed (stop
+    cause, stop time, waiting time counts, patients created and longest waiting line), and does the same for one
+    pass over an arrival log with many arrivals in the same minute (see bench_vector_engine.py).
+
+    2. times the pass against the MAX_DESKS separate heap runs of every seed. The samplers are created inside the
+    timings, since the pass draws every stream once and the separate runs draw it once per number of desks.
+
+    3. prints the failure curve: for every number of desks, the stop causes of its runs and the mean time they
+    stopped at.
+
+Run it from the repository root:
+
+    python benchmarks/bench_single_pass.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler
+from arrival_log import LogSampler, convert_arrival_log
+from bench_vector_engine import write_bursty_log
+from event_engine import run_heap_simulation
+from vector_engine import run_desk_counts
+from event_trace import Trace
+
+MAX_DESKS = 25
+REPLICATIONS = 20
+
+
+def heap_run(num_desks, sampler, config=DEFAULT_CONFIG):
+    counters = {}
+    stop_cause, waiting_time_counts = run_heap_simulation(num_desks, sampler, config, trace=Trace('off'),
+                                                          counters=counters)
+    return (stop_cause, counters['stop_time'], waiting_time_counts, counters['patients_created'],
+            counters['peak_waiting_line'])
+
+
+def check_arrival_log(desk_counts):
+    with tempfile.TemporaryDirectory() as folder:
+        write_bursty_log(os.path.join(folder, 'bursty.csv'))
+        config = DEFAULT_CONFIG._replace(arrival_log=convert_arrival_log(os.path.join(folder, 'bursty.csv')))
+        single_pass = run_desk_counts(desk_counts, [LogSampler(config)], config)
+        agree = 0
+        for num_desks, ((stop_cause, waiting_time_counts, counters, _),) in zip(desk_counts, single_pass):
+            if heap_run(num_desks, LogSampler(config), config) == (
+                    stop_cause, counters['stop_time'], waiting_time_counts, counters['patients_created'],
+                    counters['peak_waiting_line']):
+                agree += 1
+            else:
+                print(f"differs on the arrival log: {num_desks} desks")
+        print(f"single pass vs heap on an arrival log: {agree} of {len(desk_counts)} runs agree")
+
+
+def main():
+    desk_counts = range(1, MAX_DESKS + 1)
+    seeds = range(REPLICATIONS)
+
+    start = time.perf_counter()
+    single_pass = run_desk_counts(desk_counts, [PatientSampler(seed) for seed in seeds])
+    pass_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    separate = {num_desks: [heap_run(num_desks, PatientSampler(seed)) for seed in seeds] for num_desks in desk_counts}
+    separate_time = time.perf_counter() - start
+
+    agree = 0
+    for num_desks, runs in zip(desk_counts, single_pass):
+        for seed, (stop_cause, waiting_time_counts, counters, _) in zip(seeds, runs):
+            if separate[num_desks][seed] == (stop_cause, counters['stop_time'], waiting_time_counts,
+                                             counters['patients_created'], counters['peak_waiting_line']):
+                agree += 1
+            else:
+                print(f"differs: {num_desks} desks, seed {seed}")
+    print(f"single pass vs heap: {agree} of {len(desk_counts) * REPLICATIONS} runs agree")
+    check_arrival_log(desk_counts)
+    print(f"desks 1..{MAX_DESKS} x {REPLICATIONS} replications: single pass {pass_time:.2f} s, "
+          f"separate heap runs {separate_time:.2f} s ({separate_time / pass_time:.1f}x)")
+
+    names = {value: name for name, value in STOP_TRIGGERS.items()}
+    print(f"{'desks':>5}  {'mean stop time':>14}  stop causes")
+    for num_desks, runs in zip(desk_counts, single_pass):
+        causes = {}
+        for stop_cause, _, _, _ in runs:
+            causes[names[stop_cause]] = causes.get(names[stop_cause], 0) + 1
+        mean_stop_time = sum(counters['stop_time'] for _, _, counters, _ in runs) / len(runs)
+        print(f"{num_desks:>5}  {mean_stop_time:>14.1f}  "
+              f"{', '.join(f'{name} {count}' for name, count in sorted(causes.items()))}")
+
+
+if __name__ == "__main__":
+    main()
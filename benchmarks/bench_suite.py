@@ -0,0 +1,220 @@
+"""
+Benchmark suite of the simulation, without Flask. It measures, for every engine at several scales of SIMULATION_TIME
+and arrival rate (SCALES):
+
+    1. throughput: simulated patients and model events per second of single runs at two fixed numbers of desks,
+    ANALYTIC_MARGINS above the analytic estimate of the scale (see analytic.py). The patients and events are the
+    patients_created and events counters of the runs, so every engine reports them. Each engine counts the events
+    it processes, so the events of different engines are not comparable, only the records of the same engine.
+
+    2. search: the wall time of a full linear desk search with one replication per number of desks (see
+    search_required_desks in sweep.py), with the runs on the process pool and the result cache off, so every run is
+    simulated.
+
+    3. memory: the tracemalloc peak of one run, and the peak RSS of a fresh process that does that run.
+
+Every timing is the best of REPEATS, to keep the noise of the machine out. The measurements are appended as one JSON
+record per line to a history file (benchmarks/history.jsonl by default), with the commit, Python version and
+machine, and compare flags the metrics of a record that are worse than those of an earlier one by more than a
+threshold.
+
+Run it from the repository root:
+
+    python benchmarks/bench_suite.py run [--quick] [--history PATH]
+    python benchmarks/bench_suite.py compare [--threshold 10] [--history PATH] [BASE] [NEW]
+
+BASE and NEW are indexes of records in the history (negative ones count from the end), the last two by default.
+compare exits with status 1 if it finds a regression.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import result_cache
+from config import *
+from simulation import ENGINES
+from sampler import PatientSampler
+from event_trace import Trace
+from analytic import analytic_estimate
+from sweep import search_required_desks
+
+# (SIMULATION_TIME, INTERARRIVAL_RATE_LAMBDA_PARAM) of every scale; --quick only runs QUICK_SCALES
+SCALES = [(2000, 0.76), (10000, 0.76), (50000, 0.76), (2000, 0.5), (10000, 0.5), (50000, 0.5)]
+QUICK_SCALES = [(2000, 0.76), (10000, 0.76)]
+ANALYTIC_MARGINS = (2, 6)
+SEEDS = range(3)
+REPEATS = 3
+HISTORY_PATH = os.path.join(ROOT, 'benchmarks', 'history.jsonl')
+
+# Whether a larger value of a metric is better, by the last part of its name
+HIGHER_IS_BETTER = {
+    'patients_per_second': True,
+    'events_per_second': True,
+    'search_seconds': False,
+    'tracemalloc_peak_mb': False,
+    'peak_rss_mb': False
+}
+
+
+def scale_config(simulation_time, interarrival):
+    return DEFAULT_CONFIG._replace(simulation_time=simulation_time, interarrival_rate_lambda_param=interarrival)
+
+
+def run(engine, config, num_desks, seed, counters=None):
+    return ENGINES[engine](num_desks, PatientSampler(seed, config), config, trace=Trace('off'), counters=counters)
+
+
+def measure_throughput(engine, config, num_desks):
+    best = float('inf')
+    for _ in range(REPEATS):
+        patients = events = 0
+        start = time.perf_counter()
+        for seed in SEEDS:
+            counters = {}
+            run(engine, config, num_desks, seed, counters)
+            patients += counters['patients_created']
+            events += counters['events']
+        best = min(best, time.perf_counter() - start)
+    return {'patients_per_second': round(patients / best), 'events_per_second': round(events / best)}
+
+
+def measure_search(engine, config):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        required_desks, _ = search_required_desks(config, 1, engine, 'linear', 1,
+                                                  estimate=analytic_estimate(1, config))
+        best = min(best, time.perf_counter() - start)
+    return {'search_seconds': round(best, 4), 'required_desks': required_desks}
+
+
+def peak_rss_of_run(engine, config, num_desks):
+    """
+    Does one run and returns the peak RSS of the process in MB. Runs in a fresh process of its own.
+    """
+    run(engine, config, num_desks, SEEDS[0])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_memory(engine, config, num_desks):
+    tracemalloc.start()
+    run(engine, config, num_desks, SEEDS[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as process:
+        peak_rss = process.submit(peak_rss_of_run, engine, config, num_desks).result()
+    return {'tracemalloc_peak_mb': round(peak / 2 ** 20, 3), 'peak_rss_mb': round(peak_rss, 1)}
+
+
+def run_suite(scales):
+    """
+    Returns the metrics of every engine at every scale, by name.
+    """
+    metrics = {}
+    for simulation_time, interarrival in scales:
+        config = scale_config(simulation_time, interarrival)
+        estimate = analytic_estimate(1, config)
+        scale = f"time={simulation_time},interarrival={interarrival}"
+        for engine in ENGINES:
+            for margin in ANALYTIC_MARGINS:
+                for name, value in measure_throughput(engine, config, estimate + margin).items():
+                    metrics[f"throughput/{engine}/{scale}/desks={estimate + margin}/{name}"] = value
+            for name, value in measure_search(engine, config).items():
+                metrics[f"search/{engine}/{scale}/{name}"] = value
+            for name, value in measure_memory(engine, config, estimate + ANALYTIC_MARGINS[-1]).items():
+                metrics[f"memory/{engine}/{scale}/{name}"] = value
+            print(f"{engine:6} {scale}: " + ', '.join(f"{name.split(scale + '/')[1]}={value}" for name, value
+                                                       in metrics.items() if f"/{engine}/{scale}/" in name))
+    return metrics
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def compare(base, new, threshold):
+    """
+    Returns a line for every metric of both records that is more than threshold percent worse in new.
+    """
+    regressions = []
+    for name, new_value in new['metrics'].items():
+        higher_is_better = HIGHER_IS_BETTER.get(name.rsplit('/', 1)[-1])
+        base_value = base['metrics'].get(name)
+        if higher_is_better is None or not base_value:
+            continue
+        change = (new_value - base_value) / base_value * 100
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append(f"{name}: {base_value} -> {new_value} ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the simulation.")
+    history_option = argparse.ArgumentParser(add_help=False)
+    history_option.add_argument('--history', default=HISTORY_PATH, help="JSON lines file of the measurements")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_command = commands.add_parser('run', parents=[history_option],
+                                      help="measure and append a record to the history")
+    run_command.add_argument('--quick', action='store_true', help="only measure QUICK_SCALES")
+    compare_command = commands.add_parser('compare', parents=[history_option],
+                                          help="flag the regressions of a record of the history")
+    compare_command.add_argument('base', nargs='?', type=int, default=-2)
+    compare_command.add_argument('new', nargs='?', type=int, default=-1)
+    compare_command.add_argument('--threshold', type=float, default=10, help="percent a metric may get worse")
+    arguments = parser.parse_args()
+
+    if arguments.command == 'run':
+        # Every run of the search has to be simulated, not replayed from the cache
+        result_cache.RESULT_CACHE = False
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': f"{platform.machine()}, {os.cpu_count()} cpus",
+            'metrics': run_suite(QUICK_SCALES if arguments.quick else SCALES)
+        }
+        with open(arguments.history, 'a') as history:
+            history.write(json.dumps(record) + '\n')
+        print(f"appended to {arguments.history}")
+        return
+
+    history = read_history(arguments.history)
+    try:
+        base, new = history[arguments.base], history[arguments.new]
+    except IndexError:
+        sys.exit(f"{arguments.history} has {len(history)} records")
+    regressions = compare(base, new, arguments.threshold)
+    print(f"{base['commit']} ({base['timestamp']}) -> {new['commit']} ({new['timestamp']}): "
+          f"{len(regressions)} regressions beyond {arguments.threshold}%")
+    for regression in regressions:
+        print(f"  {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Benchmark of the trace levels (see event_trace.py). It times full runs of both engines with the trace off, at the
+summary level, at the per-patient level and at the per-patient level with the terminal sink (printed to
+/dev/null, so the terminal itself is not part of the measurement).
+
+Run it from the repository root:
+
+    python benchmarks/bench_trace.py
+"""
+
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import ENGINES
+from sampler import PatientSampler
+from event_trace import Trace, terminal_sink
+
+SEEDS = range(10)
+DESK_COUNTS = range(14, 22)
+
+
+def time_runs(engine, level, sink=None):
+    start = time.perf_counter()
+    for seed in SEEDS:
+        for num_desks in DESK_COUNTS:
+            ENGINES[engine](num_desks, PatientSampler(seed), trace=Trace(level, sink=sink))
+    return (time.perf_counter() - start) / (len(SEEDS) * len(DESK_COUNTS))
+
+
+if __name__ == "__main__":
+    with open(os.devnull, 'w') as devnull:
+        for engine in ENGINES:
+            off = time_runs(engine, 'off')
+            print(f"{engine:6} off:                  {off * 1e3:8.2f} ms per run")
+            for label, level, sink in [('summary', 'summary', None),
+                                       ('per-patient', 'per-patient', None),
+                                       ('per-patient, printed', 'per-patient', terminal_sink)]:
+                with contextlib.redirect_stdout(devnull):
+                    seconds = time_runs(engine, level, sink)
+                print(f"{engine:6} {label + ':':21} {seconds * 1e3:8.2f} ms per run ({(seconds / off - 1) * 100:+.0f}%)")
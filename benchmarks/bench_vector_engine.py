@@ -0,0 +1,111 @@
+"""
+Benchmark of the lockstep engine (see vector_engine.py). It first checks that the engine agrees with the heap engine
+(stop cause, stop time, waiting time counts, patients created and longest waiting line) on REPLICATIONS replications
+of every number of desks in DESKS, and on an arrival log of LOG_ROWS patients with many arrivals in the same minute
+for every number of desks in LOG_DESKS. It then measures the replications per second of one batch of R runs for
+every R in BATCH_SIZES, against looping over the same runs with the heap engine and with the SimPy model. The
+samplers are created outside of the timings, since every engine needs them.
+
+Run it from the repository root:
+
+    python benchmarks/bench_vector_engine.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler
+from arrival_log import LogSampler, convert_arrival_log
+from simulation import run_simpy_simulation
+from event_engine import run_heap_simulation
+from vector_engine import run_lockstep
+from event_trace import Trace
+
+DESKS = range(14, 22)
+REPLICATIONS = 100
+BATCH_SIZES = (10, 100, 1000)
+TIMED_DESKS = 18
+LOG_ROWS = 3000
+LOG_DESKS = range(1, 30)
+# The loops over the single-run engines are timed on at most this many runs and scaled up
+LOOP_RUNS = {'heap': 100, 'simpy': 20}
+
+
+def heap_run(num_desks, sampler, config=DEFAULT_CONFIG):
+    counters = {}
+    stop_cause, waiting_time_counts = run_heap_simulation(num_desks, sampler, config, trace=Trace('off'),
+                                                          counters=counters)
+    return (stop_cause, counters['stop_time'], waiting_time_counts, counters['patients_created'],
+            counters['peak_waiting_line'])
+
+
+def lockstep_run(stop_cause, waiting_time_counts, counters, failure):
+    return (stop_cause, counters['stop_time'], waiting_time_counts, counters['patients_created'],
+            counters['peak_waiting_line'])
+
+
+def write_bursty_log(path):
+    # Gaps of a fraction of a minute, rounded: about half of the patients arrive in the minute of the one before
+    generator = np.random.default_rng(0)
+    timestamps = np.cumsum(np.rint(generator.exponential(0.7, LOG_ROWS)).astype(int))
+    priorities = generator.integers(PRIORITY_LOWER_BOUND, PRIORITY_UPPER_BOUND + 1, LOG_ROWS)
+    service_times = np.maximum(1, np.rint(generator.exponential(SERVICE_TIME_LAMBDA_PARAM, LOG_ROWS)).astype(int))
+    with open(path, 'w') as log_file:
+        log_file.write('timestamp,priority,service_time\n')
+        for row in zip(timestamps, priorities, service_times):
+            log_file.write(','.join(map(str, row)) + '\n')
+
+
+def check_agreement():
+    agree = 0
+    for num_desks in DESKS:
+        seeds = range(REPLICATIONS)
+        lockstep = run_lockstep(num_desks, [PatientSampler(seed) for seed in seeds])
+        for seed, result in zip(seeds, lockstep):
+            if heap_run(num_desks, PatientSampler(seed)) == lockstep_run(*result):
+                agree += 1
+            else:
+                print(f"differs: {num_desks} desks, seed {seed}")
+    print(f"vector vs heap: {agree} of {len(DESKS) * REPLICATIONS} runs agree")
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_bursty_log(os.path.join(folder, 'bursty.csv'))
+        config = DEFAULT_CONFIG._replace(arrival_log=convert_arrival_log(os.path.join(folder, 'bursty.csv')))
+        agree = 0
+        for num_desks in LOG_DESKS:
+            result, = run_lockstep(num_desks, [LogSampler(config)], config)
+            if heap_run(num_desks, LogSampler(config), config) == lockstep_run(*result):
+                agree += 1
+            else:
+                print(f"differs on the arrival log: {num_desks} desks")
+        print(f"vector vs heap on an arrival log: {agree} of {len(LOG_DESKS)} runs agree")
+
+
+def runs_per_second(runs, simulate):
+    samplers = [PatientSampler(seed) for seed in range(runs)]
+    start = time.perf_counter()
+    simulate(samplers)
+    return runs / (time.perf_counter() - start)
+
+
+def main():
+    check_agreement()
+    off = Trace('off')
+    for batch_size in BATCH_SIZES:
+        vector = runs_per_second(batch_size, lambda samplers: run_lockstep(TIMED_DESKS, samplers))
+        heap = runs_per_second(min(batch_size, LOOP_RUNS['heap']), lambda samplers: [
+            run_heap_simulation(TIMED_DESKS, sampler, trace=off) for sampler in samplers])
+        simpy = runs_per_second(min(batch_size, LOOP_RUNS['simpy']), lambda samplers: [
+            run_simpy_simulation(TIMED_DESKS, sampler, trace=off) for sampler in samplers])
+        print(f"{batch_size:5} replications of {TIMED_DESKS} desks: vector {vector:6.0f} runs/s, heap {heap:4.0f}, "
+              f"simpy {simpy:3.0f} (vector {vector / simpy:.1f}x simpy, {vector / heap:.1f}x heap)")
+
+
+if __name__ == "__main__":
+    main()
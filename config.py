@@ -1,3 +1,6 @@
+import os
+from typing import NamedTuple, Optional
+
 """
 These are the constants of the simulation which will be discussed
 
@@ -23,6 +26,110 @@ But it can also be second, hour, day, etc.
 INTERARRIVAL_RATE_LAMBDA_PARAM, SERVICE_TIME_LAMBDA_PARAM: The service time and interarrival
 time of patients are each assigned to them using an exponential distribution. This statistical 
 distribution requires a lambda parameter which is assigned to it using these variables.
+
+SIMULATION_ENGINE: The engine that runs the simulations by default. 'simpy' uses the SimPy model of simulation.py
+and 'heap' the faster heapq based event kernel of event_engine.py. Both give the same results. 'vector' simulates
+all the replications of a number of desks at once as NumPy arrays (see vector_engine.py), which pays off with many
+REPLICATIONS, and gives the same results as the other two.
+
+DESK_SEARCH: How the required number of desks is searched for (see search.py). 'linear' adds one desk
+after every failed run, 'galloping' doubles the desks until a run succeeds and then bisects, and
+'parallel' is a linear search that simulates PARALLEL_WORKERS numbers of desks at once (see parallel.py).
+'single-pass' is a linear search that simulates SINGLE_PASS_WIDTH numbers of desks in one pass over the same
+patients on the lockstep engine (see single_pass.py).
+
+ANALYTIC_LOWER_BOUND: If True, the desk search starts at the number of desks queueing theory estimates (see
+analytic.py) instead of at one desk. If that number succeeds, the numbers of desks below it are still simulated,
+downwards until one fails, so the estimate saves runs but does not change the required number of desks.
+
+PARALLEL_WORKERS: Number of worker processes that simulate the runs (see workers.py). They are shared by
+all the searches, and the parallel desk search keeps this many runs in flight. It defaults to the number of cores.
+
+SINGLE_PASS_WIDTH: How many numbers of desks every pass of the single-pass desk search simulates together.
+
+REPLICATIONS: How many independent runs every number of desks gets (see replication.py). With more than
+one, the runs are summarized by their mean waiting time with a
+CONFIDENCE_LEVEL confidence interval and the fraction of runs that ended with each stop cause.
+
+SUCCESS_RATE_THRESHOLD: The fraction of successful replications a number of desks needs to count as
+successful (feasible).
+
+CONFIDENCE_LEVEL: The confidence level of the waiting time intervals.
+
+SAMPLER_BLOCK_SIZE: The random attributes of patients and the interarrival gaps are pre-drawn in blocks of
+this many values (see sampler.py). It only affects speed and memory, not the drawn values.
+
+SEARCH_SEED: The seed every desk search starts from (see session.py). The seed of each of its runs is derived
+from it, the number of desks and the replication (see sampler.py), so two searches with the same settings simulate
+the same runs, and any run can be simulated again on its own.
+
+COMMON_RANDOM_NUMBERS: If True, every number of desks of a search replays the same patients: replication r of
+every number of desks gets the same seed, so the numbers of desks are compared on the same arrivals,
+priorities and service times (see session.py) instead of on independent streams.
+
+RESULT_CACHE: If True, the results of the runs are stored on disk and a run that has been simulated before, with
+the same config, number of desks, seed and engine class, is replayed from there (see result_cache.py).
+
+RESULT_CACHE_PATH: The SQLite database of the result cache, in the instance folder of the app.
+
+RESULT_CACHE_SIZE: How many runs the result cache keeps. The least recently used runs are evicted first.
+
+SSE_HEARTBEAT_INTERVAL: Seconds between the heartbeat comments of /run-simulation while no result is ready, so
+that proxies do not drop the connection of a long search.
+
+SESSION_RESUME_TIMEOUT: Seconds a search goes on without any client listening to it. A client that reconnects
+within this time resumes the search; after it, the search is stopped.
+
+SESSION_HISTORY: How many of the latest searches can be resumed.
+
+SESSION_WORKERS: How many searches of /run-simulation and /run-sweep run at the same time, each in a driver thread
+(see session.py). The others wait for a driver thread in the order they were started.
+
+MAX_REPLICATIONS: The most replications a request can ask for per number of desks.
+
+RUN_PACING: Seconds the linear and galloping searches of /run-simulation wait before every number of desks, with its
+run number printed, so that the scatterplot fills in one run at a time. Jobs (see jobs.py), sweeps and the batch
+runner do not wait.
+
+TELEMETRY: If True, the runs of the SimPy engine report busy desks, queue lengths and waiting time percentiles
+while they are simulated, and /run-simulation streams them (see telemetry.py).
+
+TELEMETRY_INTERVAL: Simulated minutes between two telemetry snapshots of a run.
+
+TELEMETRY_BUFFER_SIZE: How many snapshots the telemetry of a run keeps. Once the buffer is full, every other
+snapshot is dropped, so it always covers the whole run.
+
+TELEMETRY_RATE: How many times per second of wall-clock time a run publishes its telemetry at most.
+
+TRACE_LEVEL: What the trace of a run records (see event_trace.py): 'off', 'summary' (the failures that end
+a run) or 'per-patient' (also every patient's arrival, desk arrival and exit).
+
+TRACE_BUFFER_SIZE: How many events the trace of a run keeps. Older events are overwritten.
+
+TRACE_TO_TERMINAL: If True, the recorded events are printed to the terminal as they happen.
+
+WAITING_TIME_QUANTILES: The quantiles of the waiting times every run reports (see online_stats.py).
+
+WAITING_TIME_BIN_WIDTH: Minutes per bin of the waiting time histograms of the runs.
+
+WAITING_TIME_MAX_BINS: The most minutes of waiting time every run counts per priority in a list (see
+online_stats.py). Longer waiting times are counted sparsely, so a long or infinite allowed waiting time does not
+make every run and every cached result larger.
+
+CHECKPOINT_INTERVAL: Simulated minutes between two checkpoints of a long-horizon run (see long_horizon.py).
+
+CHECKPOINT_DIR: The folder of the checkpoints of the long-horizon runs, in the instance folder of the app.
+
+ARRIVAL_LOG: A CSV log of real arrivals (timestamp, priority and service time of every patient) that the runs
+replay instead of drawing the patients from the distributions above, or None. It is converted once to a NumPy
+binary next to it, which the runs memory-map (see arrival_log.py).
+
+SWEEP_MAX_CELLS: The most cells a parameter sweep (see sweep.py) can have, since every cell is a desk search of
+its own.
+
+JOB_WORKERS: How many searches of the job queue (see jobs.py) run at the same time. The others wait for their turn.
+
+JOB_HISTORY: How many finished jobs are kept for their results. Queued and running jobs are always kept.
 """
 
 PRIORITY_LOWER_BOUND = 1
@@ -33,3 +140,82 @@ WAITING_LINE_CAPACITY = 10
 SIMULATION_TIME = 2000
 INTERARRIVAL_RATE_LAMBDA_PARAM = 0.76
 SERVICE_TIME_LAMBDA_PARAM = 15
+SAMPLER_BLOCK_SIZE = 4096
+SIMULATION_ENGINE = 'simpy'
+DESK_SEARCH = 'linear'
+ANALYTIC_LOWER_BOUND = True
+PARALLEL_WORKERS = os.cpu_count() or 1
+SINGLE_PASS_WIDTH = 16
+REPLICATIONS = 1
+SUCCESS_RATE_THRESHOLD = 0.9
+CONFIDENCE_LEVEL = 0.95
+SEARCH_SEED = 10
+COMMON_RANDOM_NUMBERS = False
+RESULT_CACHE = True
+RESULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'results.sqlite3')
+RESULT_CACHE_SIZE = 100000
+SSE_HEARTBEAT_INTERVAL = 15
+SESSION_RESUME_TIMEOUT = 60
+SESSION_HISTORY = 100
+SESSION_WORKERS = 32
+MAX_REPLICATIONS = 1000
+RUN_PACING = 0.5
+TELEMETRY = True
+TELEMETRY_INTERVAL = 20
+TELEMETRY_BUFFER_SIZE = 200
+TELEMETRY_RATE = 2
+TRACE_LEVEL = 'summary'
+TRACE_BUFFER_SIZE = 10000
+TRACE_TO_TERMINAL = True
+WAITING_TIME_QUANTILES = (0.5, 0.9, 0.99)
+WAITING_TIME_BIN_WIDTH = 5
+WAITING_TIME_MAX_BINS = 241
+CHECKPOINT_INTERVAL = 100000
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'checkpoints')
+SWEEP_MAX_CELLS = 400
+ARRIVAL_LOG = None
+JOB_WORKERS = 4
+JOB_HISTORY = 100
+
+
+"""
+STOP_TRIGGERS: There are essentially three reasons why a simulation is terminated:
+
+    1. patient_waiting_time_failure: This means a patient has waited more than we are allowed 
+    to keep them waiting. When this happens, it means we need at least one more service desk in
+    our hospital.
+    
+    2. waiting_queue_failure: It means we have more people in line than we could handle. The
+    simulation is then terminated to add another desk to process the patients faster so that
+    they don't stack up.
+    
+    3. success: we have reached SIMULATION_TIME without having the discussed failures
+"""
+
+STOP_TRIGGERS = {
+    'patient_waiting_time_failure' : 1,
+    'waiting_queue_failure' : 2,
+    'success' : 3
+}
+
+
+"""
+SimulationConfig: The constants that define the simulated hospital, in one immutable object. A run gets its
+config as an argument instead of reading the constants above, so it can be handed to another process and
+two runs can be told apart by their configs. DEFAULT_CONFIG holds the values of the constants above, and
+other hospitals can be made with DEFAULT_CONFIG._replace(...).
+"""
+
+class SimulationConfig(NamedTuple):
+    priority_lower_bound: int = PRIORITY_LOWER_BOUND
+    priority_upper_bound: int = PRIORITY_UPPER_BOUND
+    emergency_threshold: int = EMERGENCY_THRESHOLD
+    non_emergency_allowed_waiting_time: float = NON_EMERGENCY_ALLOWED_WAITING_TIME
+    waiting_line_capacity: float = WAITING_LINE_CAPACITY
+    simulation_time: float = SIMULATION_TIME
+    interarrival_rate_lambda_param: float = INTERARRIVAL_RATE_LAMBDA_PARAM
+    service_time_lambda_param: float = SERVICE_TIME_LAMBDA_PARAM
+    arrival_log: Optional[str] = ARRIVAL_LOG
+
+
+DEFAULT_CONFIG = SimulationConfig()
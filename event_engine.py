@@ -0,0 +1,223 @@
+"""
+This is a compact discrete-event engine for the hospital of simulation.py, built on heapq instead of SimPy. Every patient
+in the SimPy model is a generator process and goes through a PriorityResource, and most of
+the time of a run is spent in SimPy's scheduling machinery. Here the whole run is one loop over a heap of plain
+tuples, the waiting line is a second heap and the desks are a counter.
+
+The engine models the same system: the patients get the same priorities, allowed waiting times and service times
+from the sampler, they are served by num_desks desks in the order of (priority, arrival time, arrival order), and
+the run stops on the same three STOP_TRIGGERS conditions. To give the same stop causes and waiting times as the
+SimPy model, it also processes the events of one time unit in the same order. SimPy orders its events by
+(time, priority, insertion order) and needs a few hops between a service ending and the next patient getting to
+the desk. Those hops matter because all the times are integers and many events share the same time, so they are
+kept as event kinds of their own:
+
+    1. ARRIVAL: a patient arrives (the setup() loop and the start of patient_process in simulation.py). The success
+    condition is checked and the next arrival is scheduled before the patient joins the waiting line.
+
+    2. DESK_ARRIVAL: the patient's desk request has been granted and the patient gets to the desk. The waiting
+    time condition is checked and the end of the service is scheduled.
+
+    3. SERVICE_END: the service timeout is over, the patient's process resumes, the patient leaves and their desk
+    is released.
+
+    4. RELEASE: the release is processed and the freed desk is given to the head of the waiting line.
+
+    5. STOP: the stop event is processed and the run ends.
+
+A desk can only be granted when a patient joins the waiting line or when a release is processed, and in both cases
+only to the head of the line, exactly as PriorityResource does.
+
+The trace events (see event_trace.py) are recorded at the same points as in the SimPy model, so both engines also
+record the same trace. The waiting times are counted inline, with the same bins as WaitingTimeCounts.add.
+
+The state of a run is kept in a HeapRun and the loop is advance(), which can pause at an arrival and go on later
+exactly where it stopped. A plain run advances in one go; a long-horizon run (see long_horizon.py) advances in
+slices and stores the HeapRun in between.
+"""
+
+from heapq import heappush, heappop
+from config import *
+from online_stats import WaitingTimeCounts
+from event_trace import (default_trace, PATIENT_ARRIVAL, DESK_ARRIVAL as TRACE_DESK_ARRIVAL, PATIENT_EXIT,
+                         WAITING_TIME_FAILURE, WAITING_LINE_FAILURE)
+
+ARRIVAL = 1
+DESK_ARRIVAL = 2
+SERVICE_END = 3
+RELEASE = 4
+STOP = 5
+
+
+class HeapRun:
+    def __init__(self, num_desks, sampler, config=DEFAULT_CONFIG):
+        """
+        The whole state of a run of the heap engine between two calls of advance(). It is plain data (tuples,
+        lists, ints and the sampler with its Generators), so a run can be pickled, stored and picked up again
+        (see long_horizon.py).
+
+        Parameters:
+        - num_desks (int): Number of service desks of the hospital.
+        - sampler (PatientSampler): Source of the patients' random attributes and interarrival gaps.
+        - config (SimulationConfig): The simulated hospital.
+        """
+        # events: (time, insertion order, kind, patient), waiting_line: (priority, arrival time, arrival order,
+        # patient). A patient is a (name, priority, allowed_waiting_time, service_time, hospital_arrival_time)
+        # tuple. The service events carry (name, waiting_time) for the exit event of the trace.
+        self.num_desks = num_desks
+        self.sampler = sampler
+        self.config = config
+        self.events = [(0, 0, ARRIVAL, None)]
+        self.waiting_line = []
+        self.event_number = 1
+        self.patient_number = 1
+        self.busy_desks = 0
+        self.queue_length = 0
+        self.peak_queue_length = 0
+        self.waiting_time_counts = WaitingTimeCounts(config)
+        self.stop_cause = None
+        self.now = 0
+        self.finished = False
+
+    def counters(self):
+        """
+        Returns the events, patients_created and peak_waiting_line of the run so far.
+        """
+        return {'events': self.event_number - len(self.events), 'patients_created': self.patient_number - 1,
+                'peak_waiting_line': self.peak_queue_length}
+
+
+def advance(run, trace=None, until=float('inf')):
+    """
+    Processes the events of a HeapRun until the run is over or until the first arrival at or after the time until,
+    which is left for the next call. Returns whether the run is over.
+
+    Parameters:
+    - run (HeapRun): The run, which is updated in place.
+    - trace (Trace): Records the events of the run. None uses default_trace() (see event_trace.py).
+    - until (int): The simulation time to pause at.
+    """
+    events = run.events
+    waiting_line = run.waiting_line
+    event_number = run.event_number
+    patient_number = run.patient_number
+    busy_desks = run.busy_desks
+    queue_length = run.queue_length
+    peak_queue_length = run.peak_queue_length
+    waiting_time_counts = run.waiting_time_counts
+    counts = waiting_time_counts.counts
+    bins = waiting_time_counts.bins
+    stop_cause = run.stop_cause
+    num_desks = run.num_desks
+    sampler = run.sampler
+    simulation_time = run.config.simulation_time
+    waiting_line_capacity = run.config.waiting_line_capacity
+    if trace is None:
+        trace = default_trace()
+    trace_summary = trace.summary
+    trace_patients = trace.patients
+
+    while True:
+        now, order, kind, patient = heappop(events)
+
+        if kind == ARRIVAL:
+            if now >= until:
+                heappush(events, (now, order, kind, patient))
+                break
+            interarrival_time = sampler.next_interarrival_time()
+            if stop_cause is None and now > simulation_time:
+                stop_cause = STOP_TRIGGERS['success']
+                heappush(events, (now, event_number, STOP, None))
+                event_number += 1
+            heappush(events, (now + interarrival_time, event_number, ARRIVAL, None))
+            event_number += 1
+
+            priority, allowed_waiting_time, service_time = sampler.next_patient()
+            patient = (patient_number, priority, allowed_waiting_time, service_time, now)
+            queue_length += 1
+            if queue_length > peak_queue_length:
+                peak_queue_length = queue_length
+            if stop_cause is None and queue_length > waiting_line_capacity:
+                if trace_summary:
+                    trace.record(WAITING_LINE_FAILURE, now)
+                stop_cause = STOP_TRIGGERS['waiting_queue_failure']
+                heappush(events, (now, event_number, STOP, None))
+                event_number += 1
+            if trace_patients:
+                trace.record(PATIENT_ARRIVAL, now, patient_number, priority, service_time, allowed_waiting_time)
+            heappush(waiting_line, (priority, now, patient_number, patient))
+            patient_number += 1
+
+            if busy_desks < num_desks:
+                busy_desks += 1
+                heappush(events, (now, event_number, DESK_ARRIVAL, heappop(waiting_line)[3]))
+                event_number += 1
+
+        elif kind == DESK_ARRIVAL:
+            name, priority, allowed_waiting_time, service_time, hospital_arrival_time = patient
+            waiting_time = now - hospital_arrival_time
+            if waiting_time < bins:
+                counts[priority][waiting_time] += 1
+            else:
+                waiting_time_counts.add_overflow(priority, waiting_time)
+            if trace_patients:
+                trace.record(TRACE_DESK_ARRIVAL, now, name)
+            if stop_cause is None and allowed_waiting_time < waiting_time:
+                if trace_summary:
+                    trace.record(WAITING_TIME_FAILURE, now, name)
+                stop_cause = STOP_TRIGGERS['patient_waiting_time_failure']
+                heappush(events, (now, event_number, STOP, None))
+                event_number += 1
+            queue_length -= 1
+            heappush(events, (now + service_time, event_number, SERVICE_END,
+                              (name, waiting_time) if trace_patients else None))
+            event_number += 1
+
+        elif kind == SERVICE_END:
+            if trace_patients:
+                trace.record(PATIENT_EXIT, now, *patient)
+            busy_desks -= 1
+            heappush(events, (now, event_number, RELEASE, None))
+            event_number += 1
+
+        elif kind == RELEASE:
+            if waiting_line and busy_desks < num_desks:
+                busy_desks += 1
+                heappush(events, (now, event_number, DESK_ARRIVAL, heappop(waiting_line)[3]))
+                event_number += 1
+
+        else:
+            run.finished = True
+            break
+
+    run.event_number = event_number
+    run.patient_number = patient_number
+    run.busy_desks = busy_desks
+    run.queue_length = queue_length
+    run.peak_queue_length = peak_queue_length
+    run.stop_cause = stop_cause
+    run.now = now
+    return run.finished
+
+
+def run_heap_simulation(num_desks, sampler, config=DEFAULT_CONFIG, trace=None, telemetry=None, counters=None):
+    """
+    Runs one simulation with the heapq based event engine.
+
+    Parameters:
+    - num_desks (int): Number of service desks of the hospital.
+    - sampler (PatientSampler): Source of the patients' random attributes and interarrival gaps.
+    - config (SimulationConfig): The simulated hospital.
+    - trace (Trace): Records the events of the run. None uses default_trace() (see event_trace.py).
+    - telemetry (Telemetry): Not used, the heap engine does not record telemetry (see telemetry.py).
+    - counters (dict): If given, gets the events, patients_created, peak_waiting_line and stop_time of the run.
+
+    Returns:
+    - (stop_cause, waiting_time_counts): The STOP_TRIGGERS value that ended the run and the WaitingTimeCounts of the
+      patients that got to a desk.
+    """
+    run = HeapRun(num_desks, sampler, config)
+    advance(run, trace)
+    if counters is not None:
+        counters.update(run.counters(), stop_time=run.now)
+    return run.stop_cause, run.waiting_time_counts
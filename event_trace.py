@@ -0,0 +1,117 @@
+"""
+The trace of a run records what happens to the patients. It used to be a print() per patient event, with the
+message formatted right away, and at our arrival rates those tens of thousands of terminal writes per run made the
+whole search as slow as the terminal. A Trace only stores raw event tuples, in a ring buffer of
+TRACE_BUFFER_SIZE events (once it is full the oldest events are overwritten), and the messages of messages.py are
+only formatted when somebody asks for them with lines() or when a sink is attached.
+
+TRACE_LEVEL decides what is recorded:
+
+    1. off: nothing. The engines check one boolean per event, so a run costs about the same as with no trace.
+
+    2. summary: the events that end a run (the two failures, see STOP_TRIGGERS).
+
+    3. per-patient: the summary events and every patient's arrival, desk arrival and exit.
+
+An event is a tuple that starts with its kind and the simulation time, followed by the fields of the kind:
+
+    PATIENT_ARRIVAL: (kind, time, name, priority, service_time, allowed_waiting_time)
+    DESK_ARRIVAL: (kind, time, name)
+    PATIENT_EXIT: (kind, time, name, waiting_time)
+    WAITING_TIME_FAILURE: (kind, time, name)
+    WAITING_LINE_FAILURE: (kind, time)
+
+A sink is a function that is called with every recorded event. terminal_sink prints the event's message with the
+colors of messages.py, as the simulation used to; default_trace() attaches it if TRACE_TO_TERMINAL is set.
+"""
+
+from config import *
+from messages import (arrival_message, arrived_at_desk_message, exit_hospital_message,
+                      failure_message, waiting_line_capacity_failure_message)
+
+PATIENT_ARRIVAL = 1
+DESK_ARRIVAL = 2
+PATIENT_EXIT = 3
+WAITING_TIME_FAILURE = 4
+WAITING_LINE_FAILURE = 5
+
+TRACE_LEVELS = ['off', 'summary', 'per-patient']
+
+
+class Trace:
+    def __init__(self, level=TRACE_LEVEL, capacity=TRACE_BUFFER_SIZE, sink=None):
+        """
+        Parameters:
+        - level (str): One of TRACE_LEVELS.
+        - capacity (int): Number of events the ring buffer holds.
+        - sink (function): Called with every recorded event, or None.
+        """
+        if level not in TRACE_LEVELS:
+            raise ValueError(f"Unknown trace level '{level}', expected one of {TRACE_LEVELS}")
+        self.level = level
+        self.summary = level != 'off'
+        self.patients = level == 'per-patient'
+        self.capacity = capacity
+        self.buffer = [None] * capacity if self.summary else []
+        self.recorded = 0
+        self.sink = sink
+
+    def record(self, *event):
+        """
+        Stores an event in the ring buffer and hands it to the sink. The callers check summary or patients first.
+        """
+        self.buffer[self.recorded % self.capacity] = event
+        self.recorded += 1
+        if self.sink is not None:
+            self.sink(event)
+
+    def events(self):
+        """
+        Returns the events in the buffer, oldest first.
+        """
+        if self.recorded <= self.capacity:
+            return self.buffer[:self.recorded]
+        start = self.recorded % self.capacity
+        return self.buffer[start:] + self.buffer[:start]
+
+    def dropped(self):
+        """
+        Returns the number of events that have been overwritten.
+        """
+        return max(0, self.recorded - self.capacity)
+
+    def lines(self):
+        """
+        Formats the events in the buffer as the messages of messages.py.
+        """
+        return [format_event(event) for event in self.events()]
+
+
+def format_event(event):
+    """
+    Returns the message of one trace event.
+    """
+    kind, time, *fields = event
+    if kind == PATIENT_ARRIVAL:
+        name, priority, service_time, allowed_waiting_time = fields
+        return arrival_message({'name': name, 'hospital_arrival_time': time, 'priority': priority,
+                                'service_time': service_time, 'allowed_waiting_time': allowed_waiting_time})
+    if kind == DESK_ARRIVAL:
+        return arrived_at_desk_message({'name': fields[0], 'desk_arrival_time': time})
+    if kind == PATIENT_EXIT:
+        name, waiting_time = fields
+        return exit_hospital_message({'name': name, 'exit_time': time, 'waiting_time': waiting_time})
+    if kind == WAITING_TIME_FAILURE:
+        return failure_message({'name': fields[0]})
+    return waiting_line_capacity_failure_message()
+
+
+def terminal_sink(event):
+    print(format_event(event))
+
+
+def default_trace():
+    """
+    Returns a new Trace with TRACE_LEVEL, TRACE_BUFFER_SIZE and, if TRACE_TO_TERMINAL is set, the terminal sink.
+    """
+    return Trace(TRACE_LEVEL, TRACE_BUFFER_SIZE, terminal_sink if TRACE_TO_TERMINAL else None)
@@ -0,0 +1,133 @@
+"""
+A job is a search (a SimulationSession of session.py, or a SweepSession of sweep.py) that runs in the background
+instead of in the stream of the client that asked for it. Submitting a job returns its id right away, and the search
+runs to the end even if no client is listening to it, so a browser that disconnects does not lose the work:
+
+    1. The jobs wait in a queue and JOB_WORKERS threads run them, one search at a time each, so a burst of
+    submissions does not start a burst of searches. Their runs are simulated on the shared process pool (see
+    workers.py), like those of any other session.
+
+    2. A submission is identified by its kind and arguments. If an identical job is queued or running, the
+    submission gets the id of that job instead of a new one, so the same scenario started by several people is only
+    searched once. A finished job is not reused, but the runs of a new one come from the result cache (see
+    result_cache.py).
+
+    3. Any number of clients can stream a job (see SimulationSession.simulate_and_stream). A stream gets the events
+    the job has produced so far and then follows it live, and it resumes after its Last-Event-ID if it reconnects.
+
+The last JOB_HISTORY finished jobs are kept for their events; queued and running jobs are always kept.
+"""
+
+import json
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+from config import *
+from session import SimulationSession
+from sweep import SweepSession
+from metrics import JOB_SUBMISSIONS, ACTIVE_JOBS
+
+JOB_KINDS = {'search': SimulationSession, 'sweep': SweepSession}
+
+jobs = OrderedDict()
+active_jobs = {}
+jobs_lock = threading.Lock()
+job_queue = queue.Queue()
+job_workers = []
+
+
+def job_key(kind, arguments):
+    """
+    Returns what tells two submissions apart: their kind and their arguments.
+    """
+    return json.dumps([kind, arguments], sort_keys=True, default=str)
+
+
+def submit_job(kind, arguments):
+    """
+    Queues a job, unless an identical one is queued or running already. Returns the session of the job and whether
+    it is the job of an earlier submission.
+
+    Parameters:
+    - kind (str): A key of JOB_KINDS.
+    - arguments (dict): The keyword arguments of the session, as search_arguments (see session.py) or
+      sweep_arguments (see sweep.py) return them.
+    """
+    key = job_key(kind, arguments)
+    with jobs_lock:
+        session = active_jobs.get(key)
+        if session is not None:
+            JOB_SUBMISSIONS.inc('deduplicated')
+            return session, True
+
+        session = JOB_KINDS[kind](**arguments)
+        session.detached = True
+        session.job_kind = kind
+        session.job_key = key
+        active_jobs[key] = session
+        jobs[session.session_id] = session
+        finished = [job_id for job_id, job in jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del jobs[job_id]
+        while len(job_workers) < JOB_WORKERS:
+            worker = threading.Thread(target=run_jobs, daemon=True)
+            worker.start()
+            job_workers.append(worker)
+    JOB_SUBMISSIONS.inc('queued')
+    ACTIVE_JOBS.inc()
+    job_queue.put(session)
+    return session, False
+
+
+def run_jobs():
+    """
+    Runs the jobs of the queue, one after the other. The loop of every job worker thread.
+    """
+    for session in iter(job_queue.get, None):
+        try:
+            session.drive()
+        except Exception:
+            # A failed search ends its job, not the worker
+            traceback.print_exc()
+        finally:
+            with jobs_lock:
+                active_jobs.pop(session.job_key, None)
+            ACTIVE_JOBS.dec()
+
+
+def find_job(job_id):
+    """
+    Returns the session of the job with the given id, or None if there is none.
+    """
+    with jobs_lock:
+        return jobs.get(job_id)
+
+
+def job_status(session):
+    """
+    Returns the state of a job for the clients: its id, kind and status ('queued', 'running' or 'done'), how many
+    events it has produced, how many clients are streaming it and, for a search, the required number of desks once
+    it is found.
+    """
+    with session.condition:
+        if session.finished:
+            status = 'done'
+        elif session.driver is None:
+            status = 'queued'
+        else:
+            status = 'running'
+        return {'job_id': session.session_id, 'kind': session.job_kind, 'status': status,
+                'events': len(session.events), 'listeners': session.listeners,
+                'required_desks': session.required_desks}
+
+
+def job_position(session, last_event_id):
+    """
+    Returns the last event number a stream of a job has seen: the one of its Last-Event-ID, or -1 to start from the
+    first event.
+    """
+    job_id, _, last_event_number = (last_event_id or '').partition(':')
+    if job_id != session.session_id or not last_event_number.isdigit():
+        return -1
+    return int(last_event_number)
@@ -0,0 +1,134 @@
+"""
+A long-horizon run simulates one number of desks over months of simulated time (a SIMULATION_TIME in the millions)
+and survives crashes and restarts. It runs on the heap engine, whose whole state is plain data (see HeapRun in
+event_engine.py); a SimPy run lives in generators that can not be stored.
+
+The run advances in slices of CHECKPOINT_INTERVAL simulated minutes. After every slice, the HeapRun is written to
+a checkpoint file: the clock, the pending arrivals and services (the event heap), the waiting line, the sampler
+with the state of its Generators and the rest of its pre-drawn blocks, the waiting time counts (see
+online_stats.py) and the counters. The file is pickled and gzip compressed, written next to the old one and then
+moved over it, so a crash while writing leaves the previous checkpoint intact.
+
+run_long_horizon picks the run up from its checkpoint if there is one, and the rest of the run is exactly what an
+uninterrupted run would have simulated, since the sampler goes on from the same random state. The checkpoint of a
+run is found by a hash of its config, number of desks and seed (with RNG_SCHEME and CHECKPOINT_VERSION, like the
+keys of result_cache.py, and the version of its arrival log if it has one), in CHECKPOINT_DIR unless a path is
+given.
+
+The memory of a run does not grow with its horizon: the waiting times are counted, not stored, the event heap holds
+one arrival and at most one event per desk and patient at a desk, the waiting line is bounded by its capacity and
+the run is traced at the summary level only (the failure that ends it).
+
+Run it from the repository root:
+
+    python long_horizon.py --desks 25 --time 5000000 [--seed 1] [--interval 100000] [--checkpoint PATH]
+                           [--arrival-log PATH]
+
+and run the same command again to resume it.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import time
+from config import *
+from sampler import RNG_SCHEME
+from arrival_log import make_sampler, log_fingerprint
+from event_engine import HeapRun, advance
+from event_trace import Trace, terminal_sink
+from simulation import RunResult
+
+CHECKPOINT_VERSION = 3
+
+
+def checkpoint_path(config, num_desks, seed):
+    """
+    Returns the checkpoint file of a run in CHECKPOINT_DIR.
+    """
+    description = [CHECKPOINT_VERSION, RNG_SCHEME, config._asdict(), num_desks, seed]
+    if config.arrival_log:
+        description.append(log_fingerprint(config.arrival_log))
+    key = hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+    return os.path.join(CHECKPOINT_DIR, f"{key[:32]}.checkpoint")
+
+
+def save_checkpoint(path, run, seed):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with gzip.open(path + '.tmp', 'wb') as checkpoint:
+        pickle.dump({'version': CHECKPOINT_VERSION, 'seed': seed, 'run': run}, checkpoint,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(path, config, num_desks, seed):
+    """
+    Returns the HeapRun stored in a checkpoint file, or None if there is none for this config, number of desks and
+    seed.
+    """
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rb') as checkpoint:
+        stored = pickle.load(checkpoint)
+    run = stored['run']
+    if (stored['version'] != CHECKPOINT_VERSION or stored['seed'] != seed or run.config != config
+            or run.num_desks != num_desks):
+        return None
+    return run
+
+
+def run_long_horizon(config, num_desks, seed, path=None, interval=CHECKPOINT_INTERVAL, progress=None):
+    """
+    Runs one simulation on the heap engine with a checkpoint every interval simulated minutes, resuming from the
+    checkpoint if there is one, and returns its RunResult (see simulation.py). The wall time is that of this call.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - num_desks (int): Number of service desks of the hospital.
+    - seed (int): Seed of the run's PatientSampler.
+    - path (str): The checkpoint file. None uses checkpoint_path().
+    - interval (int): Simulated minutes between two checkpoints.
+    - progress (function): Called with the HeapRun after every checkpoint, or None.
+    """
+    path = path or checkpoint_path(config, num_desks, seed)
+    run = load_checkpoint(path, config, num_desks, seed)
+    if run is None:
+        run = HeapRun(num_desks, make_sampler(seed, config), config)
+    trace = Trace('summary', sink=terminal_sink if TRACE_TO_TERMINAL else None)
+
+    start = time.perf_counter()
+    while not run.finished:
+        advance(run, trace, until=(run.now // interval + 1) * interval)
+        save_checkpoint(path, run, seed)
+        if progress is not None:
+            progress(run)
+    wall_time = time.perf_counter() - start
+
+    counters = run.counters()
+    waiting_time_counts = run.waiting_time_counts
+    patients_served = len(waiting_time_counts)
+    average_waiting_time = round(waiting_time_counts.total() / patients_served, 2) if patients_served else 0.0
+    return RunResult(num_desks, seed, run.stop_cause, average_waiting_time, patients_served, wall_time,
+                     counters['patients_created'], counters['peak_waiting_line'], counters['events'], run.now,
+                     waiting_time_counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-horizon run of one number of desks, with checkpoints.")
+    parser.add_argument('--desks', type=int, required=True, help="number of desks")
+    parser.add_argument('--time', type=int, default=SIMULATION_TIME, help="simulated minutes")
+    parser.add_argument('--seed', type=int, default=SEARCH_SEED, help="seed of the run")
+    parser.add_argument('--interval', type=int, default=CHECKPOINT_INTERVAL, help="simulated minutes per checkpoint")
+    parser.add_argument('--checkpoint', help="checkpoint file, by default one per run in CHECKPOINT_DIR")
+    parser.add_argument('--arrival-log', default=ARRIVAL_LOG, help="CSV arrival log to replay (see arrival_log.py)")
+    arguments = parser.parse_args()
+
+    config = DEFAULT_CONFIG._replace(simulation_time=arguments.time, arrival_log=arguments.arrival_log)
+    result = run_long_horizon(config, arguments.desks, arguments.seed, arguments.checkpoint, arguments.interval,
+                              progress=lambda run: print(f"minute {run.now}: {len(run.waiting_time_counts)} patients "
+                                                         f"served, checkpoint written"))
+    cause = next(name for name, value in STOP_TRIGGERS.items() if value == result.stop_cause)
+    print(f"{cause}: {result.patients_served} patients served, average waiting time {result.average_waiting_time}")
+    print(json.dumps(result.waiting_time_counts.summary()['overall']))
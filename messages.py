@@ -43,4 +43,9 @@ def success_message(number_of_desks):
 def run_number_message(run_number):
     
     message = (f'\033[1;34mThis is run #{run_number}\033[0m')
+    return message
+
+def analytic_estimate_message(number_of_desks):
+
+    message = (f'\033[1;33mthe search starts at the analytic estimate of {number_of_desks} desks\033[0m')
     return message
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""
+The metrics of the app, in the Prometheus text format, so that a slow search can be told apart from a slow run, a
+busy pool or a crowded hospital. They are kept in an in-process registry (REGISTRY) and served at /metrics by
+app.py and asgi.py; there is no external service.
+
+Nothing is measured per event of a run. The engines keep three counters of their own (the events they processed,
+the patients they created and the longest waiting line, see simulate_run in simulation.py), which come back with
+the RunResult, and the metrics below are updated once per run, once per search and once per stream:
+
+    hospital_runs_total: the runs, by engine and source ('simulated' on the process pool or 'cache', replayed from
+    the result cache, see result_cache.py).
+
+    hospital_run_stop_causes_total: the runs by the STOP_TRIGGERS key that ended them.
+
+    hospital_run_seconds: histogram of the wall time of the simulated runs.
+
+    hospital_run_events_total, hospital_patients_created_total, hospital_patients_served_total: the events,
+    created patients and patients that got to a desk of the simulated runs.
+
+    hospital_run_peak_waiting_line: histogram of the longest waiting line of every simulated run.
+
+    hospital_search_runs: histogram of the numbers of desks a desk search simulated before it was over.
+
+    hospital_sse_streams: the Server-Sent Event streams that are open.
+
+    hospital_job_submissions_total: the submissions of the job queue (see jobs.py), by outcome ('queued' for a new
+    job or 'deduplicated' for one that joined an identical job).
+
+    hospital_jobs: the jobs that are queued or running.
+
+The metrics are updated by the threads of the server and of the searches, so every metric has a lock.
+"""
+
+import threading
+from bisect import bisect_left
+from config import *
+
+STOP_CAUSE_NAMES = {cause: name for name, cause in STOP_TRIGGERS.items()}
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        """
+        Parameters:
+        - name (str): The name of the metric.
+        - help (str): The description of the metric.
+        - labels (tuple): The names of its labels. Their values are given in order when the metric is updated.
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        """
+        Returns the (name, label pairs, value) of every sample of the metric.
+        """
+        with self.lock:
+            return [(self.name, list(zip(self.labels, label_values)), value)
+                    for label_values, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        """
+        Parameters:
+        - name, help, labels: Those of Counter.
+        - buckets (tuple): The upper bounds of the buckets, in increasing order. +Inf is added to them.
+        """
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0, 'count': 0}
+            counts['buckets'][bisect_left(self.buckets, value)] += 1
+            counts['sum'] += value
+            counts['count'] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for label_values, counts in sorted(self.values.items()):
+                pairs = list(zip(self.labels, label_values))
+                cumulative = 0
+                for bound, count in zip([*self.buckets, '+Inf'], counts['buckets']):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", pairs + [('le', bound)], cumulative))
+                samples.append((f"{self.name}_sum", pairs, counts['sum']))
+                samples.append((f"{self.name}_count", pairs, counts['count']))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns all the metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, pairs, value in metric.samples():
+                lines.append(f"{name}{format_labels(pairs)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+RUNS = REGISTRY.register(Counter(
+    'hospital_runs_total', "Runs, by engine and source (simulated or cache).", ('engine', 'source')))
+STOP_CAUSES = REGISTRY.register(Counter(
+    'hospital_run_stop_causes_total', "Runs, by the STOP_TRIGGERS key that ended them.", ('engine', 'cause')))
+RUN_SECONDS = REGISTRY.register(Histogram(
+    'hospital_run_seconds', "Wall time of the simulated runs.",
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30), ('engine',)))
+RUN_EVENTS = REGISTRY.register(Counter(
+    'hospital_run_events_total', "Events processed by the engines in the simulated runs.", ('engine',)))
+PATIENTS_CREATED = REGISTRY.register(Counter(
+    'hospital_patients_created_total', "Patients created in the simulated runs.", ('engine',)))
+PATIENTS_SERVED = REGISTRY.register(Counter(
+    'hospital_patients_served_total', "Patients that got to a desk in the simulated runs.", ('engine',)))
+PEAK_WAITING_LINE = REGISTRY.register(Histogram(
+    'hospital_run_peak_waiting_line', "Longest waiting line of every simulated run.",
+    (1, 2, 5, 10, 20, 50, 100, 200, 500), ('engine',)))
+SEARCH_RUNS = REGISTRY.register(Histogram(
+    'hospital_search_runs', "Numbers of desks simulated by a desk search.", (1, 2, 3, 5, 8, 13, 21, 34)))
+SSE_STREAMS = REGISTRY.register(Gauge(
+    'hospital_sse_streams', "Open Server-Sent Event streams."))
+JOB_SUBMISSIONS = REGISTRY.register(Counter(
+    'hospital_job_submissions_total', "Job submissions, by outcome (queued or deduplicated).", ('outcome',)))
+ACTIVE_JOBS = REGISTRY.register(Gauge(
+    'hospital_jobs', "Jobs that are queued or running."))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def record_run(result, engine, source):
+    """
+    Counts a RunResult that was simulated by engine or, if source is 'cache', replayed from the result cache.
+    """
+    RUNS.inc(engine, source)
+    STOP_CAUSES.inc(engine, STOP_CAUSE_NAMES[result.stop_cause])
+    if source == 'simulated':
+        RUN_SECONDS.observe(result.wall_time, engine)
+        RUN_EVENTS.inc(engine, amount=result.events)
+        PATIENTS_CREATED.inc(engine, amount=result.patients_created)
+        PATIENTS_SERVED.inc(engine, amount=result.patients_served)
+        PEAK_WAITING_LINE.observe(result.peak_waiting_line, engine)
+
+
+def record_simulated_run(engine, future):
+    """
+    Counts the RunResult of a finished run of the process pool. A done callback of its future.
+    """
+    if not future.cancelled() and future.exception() is None:
+        record_run(future.result(), engine, 'simulated')
@@ -0,0 +1,207 @@
+"""
+The waiting times of a run used to be kept in a list, one entry per patient that got to a desk, only to take their
+average at the end. For long horizons that list grows without bound. WaitingTimeCounts grows with the number of
+distinct waiting times instead of the number of patients, and gives more than the average: the count, mean, standard deviation, minimum, maximum,
+WAITING_TIME_QUANTILES and a histogram of WAITING_TIME_BIN_WIDTH minute bins, of all the patients and of every
+priority.
+
+The times of the simulation are whole minutes (the sampler rounds the service times and interarrival gaps, see
+sampler.py), so the waiting times are whole minutes as well, and a patient that waits longer than its allowed
+waiting time stops the run. So WaitingTimeCounts counts the patients per priority and per minute of waiting time,
+with one bin for every minute up to the longest allowed waiting time of the config, but never more than
+WAITING_TIME_MAX_BINS bins, so that a long or infinite allowed waiting time does not cost memory in every run (and
+in every row of the result cache, see result_cache.py). Adding a waiting time is a single list increment, which is
+all the engines do per patient; the waiting times above the bins (the patient that failed, those served at the same
+time, and the long waits an allowed waiting time above the bins lets through) are counted sparsely, per priority
+and waiting time, in the overflow.
+
+Everything else is computed from the counts once the run is over, so the statistics are exact:
+
+    1. mean and variance: Welford's update (see RunningStats), with every waiting time added once, weighted by its
+    count.
+
+    2. quantiles: the waiting time of the patient at rank int(count * q) in waiting time order.
+
+    3. histogram: the counts summed per WAITING_TIME_BIN_WIDTH minutes, with a last bin for the waiting times above
+    the bins.
+
+A streaming quantile estimator like P² would not need whole minutes, but it costs a few microseconds per patient and
+quantile, more than the heap engine spends on a whole patient (see event_engine.py), and it is only approximate.
+
+The counts of several runs of the same config can be merged, which is how the replications of a number of desks are
+summarized (see replication.py).
+"""
+
+from config import *
+
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value, weight=1):
+        """
+        Adds a value weight times, with Welford's update of the mean and of the sum of squared deviations.
+        """
+        self.count += weight
+        delta = value - self.mean
+        self.mean += delta * weight / self.count
+        self.m2 += weight * delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class WaitingTimeCounts:
+    def __init__(self, config=DEFAULT_CONFIG):
+        """
+        Parameters:
+        - config (SimulationConfig): The simulated hospital, which defines the priorities and the longest allowed
+          waiting time.
+        """
+        longest_allowed_waiting_time = max(config.emergency_threshold, config.non_emergency_allowed_waiting_time)
+        self.bins = int(min(longest_allowed_waiting_time + 1, WAITING_TIME_MAX_BINS))
+        self.counts = [[0] * self.bins for _ in range(config.priority_upper_bound + 1)]
+        self.overflow = {}
+
+    def add(self, priority, waiting_time):
+        if waiting_time < self.bins:
+            self.counts[priority][waiting_time] += 1
+        else:
+            self.add_overflow(priority, waiting_time)
+
+    def add_overflow(self, priority, waiting_time, count=1):
+        """
+        Counts a waiting time above the bins.
+        """
+        key = (priority, waiting_time)
+        self.overflow[key] = self.overflow.get(key, 0) + count
+
+    def copy(self):
+        return WaitingTimeCounts.from_dict(self.to_dict())
+
+    def merge(self, other):
+        """
+        Adds the counts of another run of the same config.
+        """
+        for counts, other_counts in zip(self.counts, other.counts):
+            for waiting_time, count in enumerate(other_counts):
+                counts[waiting_time] += count
+        for (priority, waiting_time), count in other.overflow.items():
+            self.add_overflow(priority, waiting_time, count)
+
+    def __len__(self):
+        return sum(map(sum, self.counts)) + sum(self.overflow.values())
+
+    def __eq__(self, other):
+        return (isinstance(other, WaitingTimeCounts) and self.counts == other.counts
+                and self.overflow == other.overflow)
+
+    def total(self):
+        """
+        Returns the sum of all the waiting times.
+        """
+        return (sum(waiting_time * count for counts in self.counts for waiting_time, count in enumerate(counts))
+                + sum(waiting_time * count for (_, waiting_time), count in self.overflow.items()))
+
+    def distribution(self, priority=None):
+        """
+        Returns the counts per waiting time, of one priority or of all of them, with the waiting times above the
+        bins appended.
+        """
+        if priority is None:
+            counts = [sum(column) for column in zip(*self.counts)]
+        else:
+            counts = list(self.counts[priority])
+        overflow = {}
+        for (overflow_priority, waiting_time), count in self.overflow.items():
+            if priority is None or overflow_priority == priority:
+                overflow[waiting_time] = overflow.get(waiting_time, 0) + count
+        return counts, sorted(overflow.items())
+
+    def to_dict(self):
+        """
+        Returns the counts as JSON: the number of bins, the counts of every priority without the zeros after its
+        longest waiting time, and the overflow as [priority, waiting time, count] triples.
+        """
+        counts = []
+        for priority_counts in self.counts:
+            end = len(priority_counts)
+            while end and not priority_counts[end - 1]:
+                end -= 1
+            counts.append(priority_counts[:end])
+        return {'bins': self.bins, 'counts': counts,
+                'overflow': [[priority, waiting_time, count]
+                             for (priority, waiting_time), count in sorted(self.overflow.items())]}
+
+    @classmethod
+    def from_dict(cls, data):
+        waiting_time_counts = cls.__new__(cls)
+        waiting_time_counts.bins = data['bins']
+        waiting_time_counts.counts = [list(counts) + [0] * (data['bins'] - len(counts)) for counts in data['counts']]
+        waiting_time_counts.overflow = {(priority, waiting_time): count
+                                        for priority, waiting_time, count in data['overflow']}
+        return waiting_time_counts
+
+    def summary(self):
+        """
+        Returns the statistics of all the patients ('overall') and of every priority that got to a desk
+        ('by_priority'), see describe_distribution, and the bin_width of their histograms.
+        """
+        by_priority = {}
+        for priority in range(len(self.counts)):
+            if any(self.counts[priority]) or any(entry[0] == priority for entry in self.overflow):
+                by_priority[priority] = describe_distribution(*self.distribution(priority))
+        return {'bin_width': WAITING_TIME_BIN_WIDTH, 'overall': describe_distribution(*self.distribution()),
+                'by_priority': by_priority}
+
+
+def quantiles(counts, overflow, probabilities=WAITING_TIME_QUANTILES):
+    """
+    Returns the quantiles of a distribution given as counts per waiting time and (waiting time, count) pairs above
+    them, or Nones if it is empty.
+    """
+    pairs = [*enumerate(counts), *overflow]
+    patients = sum(count for _, count in pairs)
+    if patients == 0:
+        return [None] * len(probabilities)
+    result = []
+    for probability in probabilities:
+        rank = min(int(patients * probability), patients - 1)
+        seen = 0
+        for waiting_time, count in pairs:
+            seen += count
+            if seen > rank:
+                result.append(waiting_time)
+                break
+    return result
+
+
+def describe_distribution(counts, overflow):
+    """
+    Returns the count, mean, std, min, max, quantiles (p50 for 0.5 and so on) and histogram of a distribution given
+    as counts per waiting time and (waiting time, count) pairs above them.
+    """
+    stats = RunningStats()
+    for waiting_time, count in [*enumerate(counts), *overflow]:
+        if count:
+            stats.add(waiting_time, count)
+
+    histogram = [sum(counts[start:start + WAITING_TIME_BIN_WIDTH])
+                 for start in range(0, len(counts), WAITING_TIME_BIN_WIDTH)]
+    histogram.append(sum(count for _, count in overflow))
+
+    description = {'count': stats.count, 'mean': round(stats.mean, 2), 'std': round(stats.variance() ** 0.5, 2),
+                   'min': stats.minimum, 'max': stats.maximum}
+    for probability, value in zip(WAITING_TIME_QUANTILES, quantiles(counts, overflow)):
+        description[f"p{probability * 100:g}"] = value
+    description['histogram'] = histogram
+    return description
@@ -0,0 +1,65 @@
+"""
+Once the number of desks is fixed, a run does not depend on any other run, so the runs of a linear search can be
+simulated side by side. The parallel search keeps N numbers of desks in flight on the process pool (see
+workers.py), N being PARALLEL_WORKERS divided by the number of replications of each one (see replication.py):
+it starts with k..k+N-1, and every time the result of the smallest number of desks has been handed on, the next
+number of desks is submitted. The results are handed on in the order of the number of desks, so a result that
+finishes early waits until the results of the smaller numbers of desks are out. Once a number of desks is feasible,
+the runs that have not started yet are cancelled (running ones can not be stopped, their results are dropped).
+
+The seed of a run only depends on the seed of the search, its number of desks and its replication (see run_seed in
+sampler.py), not on when it is submitted, so the parallel and the linear search simulate the same runs and find the
+same required number of desks.
+"""
+
+from config import *
+from workers import get_process_pool
+from replication import submit_replications, summarize_replications
+
+
+def parallel_linear_search(config, start, draw_seeds, engine=SIMULATION_ENGINE, replications=REPLICATIONS,
+                           success_threshold=SUCCESS_RATE_THRESHOLD, width=None, telemetry_channel=None):
+    """
+    Simulates the numbers of desks from start on, width at a time, until one is feasible.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - start (int): The first number of desks to simulate.
+    - draw_seeds (function): Returns the seeds of the given number of replications of the given number of desks.
+    - engine (str): Key of ENGINES that runs each simulation.
+    - replications (int): Number of independent runs of every number of desks (see replication.py).
+    - success_threshold (float): The success rate a feasible number of desks needs.
+    - width (int): How many numbers of desks are simulated at once. By default, enough to keep the
+      PARALLEL_WORKERS processes busy.
+    - telemetry_channel (Queue): Where the runs publish their telemetry (see telemetry.py), or None.
+
+    Yields the DeskResult of every number of desks in increasing order, and returns the required number of desks.
+    """
+    if width is None:
+        width = max(1, -(-PARALLEL_WORKERS // replications))
+    futures = {}
+    for number_of_desks in range(start, start + width):
+        futures[number_of_desks] = submit_replications(config, number_of_desks,
+                                                       draw_seeds(replications, number_of_desks), engine,
+                                                       telemetry_channel)
+    next_submitted = start + width
+
+    try:
+        number_of_desks = start
+        while True:
+            results = [future.result() for future in futures.pop(number_of_desks)]
+            result = summarize_replications(number_of_desks, results, success_threshold)
+            yield result
+            if result.feasible:
+                return number_of_desks
+
+            futures[next_submitted] = submit_replications(config, next_submitted,
+                                                          draw_seeds(replications, next_submitted), engine,
+                                                          telemetry_channel)
+            next_submitted += 1
+            number_of_desks += 1
+    finally:
+        # Also runs when the client goes away and the generator is closed
+        for replication_futures in futures.values():
+            for future in replication_futures:
+                future.cancel()
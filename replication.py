@@ -0,0 +1,268 @@
+"""
+A single run per number of desks is too noisy for staffing decisions: the same number of desks can succeed with one
+stream of patients and fail with the next. With replications, every number of desks is simulated R times with
+independent seeds, on the worker processes (see workers.py) or from the result cache (see result_cache.py), and the
+runs are summarized in a DeskResult:
+
+    1. average_waiting_time and confidence_interval: the mean of the runs' average waiting times and its
+    CONFIDENCE_LEVEL confidence interval (mean +- t * s / sqrt(R), with the Student t quantile for R - 1 degrees of
+    freedom), cut off at 0 since waiting times can not be negative. With a single replication the interval is just
+    the run's average waiting time.
+
+    2. stop_cause_fractions: the fraction of the runs that ended with each STOP_TRIGGERS cause.
+
+    3. success_rate and feasible: the fraction of successful runs, and whether it reaches SUCCESS_RATE_THRESHOLD.
+    The searches only count a number of desks as successful if it is feasible.
+
+    4. stop_cause: the cause the number of desks is shown with. It is success if the number of desks is feasible
+    and the most frequent failure cause if it is not.
+
+    5. waiting_time_stats: the statistics of the waiting times of all the patients of all the runs (see
+    online_stats.py), whose waiting time counts are merged.
+
+    6. stop_time: the mean of the simulation times the runs stopped at, the first arrival after SIMULATION_TIME for
+    the successful runs. For the others it tells how long they held out.
+"""
+
+from math import atan, cos, exp, lgamma, log, log1p, pi, sin, sqrt, tan
+from statistics import NormalDist
+from concurrent.futures import Future, CancelledError
+from functools import partial
+from typing import NamedTuple
+from config import *
+from simulation import simulate_run, simulate_replications, simulate_desk_counts
+from workers import get_process_pool
+from result_cache import get_result_cache
+from metrics import record_run, record_simulated_run
+
+
+class DeskResult(NamedTuple):
+    number_of_desks: int
+    replications: int
+    stop_cause: int
+    average_waiting_time: float
+    confidence_interval: tuple
+    stop_cause_fractions: dict
+    success_rate: float
+    feasible: bool
+    waiting_time_stats: dict
+    stop_time: float
+
+
+def student_t_cdf(t, degrees_of_freedom):
+    """
+    Cumulative distribution function of the Student t distribution with a whole number of degrees of freedom, from
+    the finite series in cos(theta), theta = atan(|t| / sqrt(v)) (Abramowitz and Stegun 26.7.3 and 26.7.4).
+    """
+    v = degrees_of_freedom
+    theta = atan(abs(t) / sqrt(v))
+    cos_squared = cos(theta) ** 2
+    series = term = 1.0
+    if v % 2:
+        for k in range(1, (v - 1) // 2):
+            term *= cos_squared * 2 * k / (2 * k + 1)
+            series += term
+        inside = 2 / pi * (theta + (sin(theta) * cos(theta) * series if v > 1 else 0))
+    else:
+        for k in range(1, v // 2):
+            term *= cos_squared * (2 * k - 1) / (2 * k)
+            series += term
+        inside = sin(theta) * series
+    return (1 + inside) / 2 if t >= 0 else (1 - inside) / 2
+
+
+def student_t_quantile(probability, degrees_of_freedom):
+    """
+    Quantile of the Student t distribution. It is exact for 1 and 2 degrees of freedom. Otherwise the Cornish-Fisher
+    expansion around the normal quantile gives a first guess, which can be off by 0.05 at 3 degrees of freedom and
+    a 0.995 probability, and Newton's method on student_t_cdf refines it to the exact quantile.
+    """
+    if degrees_of_freedom == 1:
+        return tan(pi * (probability - 0.5))
+    if degrees_of_freedom == 2:
+        return (2 * probability - 1) * sqrt(2 / (4 * probability * (1 - probability)))
+
+    z = NormalDist().inv_cdf(probability)
+    v = degrees_of_freedom
+    t = (z
+         + (z**3 + z) / (4 * v)
+         + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * v**2)
+         + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * v**3)
+         + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * v**4))
+    log_density_scale = lgamma((v + 1) / 2) - lgamma(v / 2) - log(v * pi) / 2
+    for _ in range(20):
+        density = exp(log_density_scale - (v + 1) / 2 * log1p(t * t / v))
+        step = (student_t_cdf(t, v) - probability) / density
+        t -= step
+        if abs(step) < 1e-12:
+            break
+    return t
+
+
+def summarize_replications(num_desks, results, success_threshold=SUCCESS_RATE_THRESHOLD):
+    """
+    Summarizes the RunResults of the replications of one number of desks in a DeskResult.
+
+    Parameters:
+    - num_desks (int): The simulated number of desks.
+    - results (list): The RunResult of every replication.
+    - success_threshold (float): The success rate a feasible number of desks needs.
+    """
+    replications = len(results)
+    averages = [result.average_waiting_time for result in results]
+    mean = sum(averages) / replications
+    if replications > 1:
+        variance = sum((average - mean) ** 2 for average in averages) / (replications - 1)
+        t = student_t_quantile((1 + CONFIDENCE_LEVEL) / 2, replications - 1)
+        half_width = t * sqrt(variance / replications)
+    else:
+        half_width = 0.0
+
+    stop_cause_fractions = {}
+    for cause in STOP_TRIGGERS.values():
+        count = sum(1 for result in results if result.stop_cause == cause)
+        stop_cause_fractions[cause] = count / replications
+    success_rate = stop_cause_fractions[STOP_TRIGGERS['success']]
+    feasible = success_rate >= success_threshold
+
+    waiting_time_counts = results[0].waiting_time_counts.copy()
+    for result in results[1:]:
+        waiting_time_counts.merge(result.waiting_time_counts)
+
+    if feasible:
+        stop_cause = STOP_TRIGGERS['success']
+    else:
+        failures = {cause: fraction for cause, fraction in stop_cause_fractions.items()
+                    if cause != STOP_TRIGGERS['success']}
+        stop_cause = max(failures, key=failures.get)
+
+    return DeskResult(num_desks, replications, stop_cause, round(mean, 2),
+                      (max(0.0, round(mean - half_width, 2)), round(mean + half_width, 2)),
+                      stop_cause_fractions, success_rate, feasible, waiting_time_counts.summary(),
+                      round(sum(result.stop_time for result in results) / replications, 2))
+
+
+def store_result(cache, config, engine, future):
+    """
+    Stores the result of a finished run of an engine in the result cache.
+    """
+    if not future.cancelled() and future.exception() is None:
+        cache.put(config, future.result(), engine)
+
+
+def resolve_batch(futures, batch):
+    """
+    Hands the results of a finished batch of the lockstep engine to the futures of its runs.
+    """
+    for position, future in enumerate(futures):
+        if not future.set_running_or_notify_cancel():
+            continue
+        if batch.cancelled():
+            future.set_exception(CancelledError())
+        elif batch.exception() is not None:
+            future.set_exception(batch.exception())
+        else:
+            future.set_result(batch.result()[position])
+
+
+def cancel_batch(futures, batch, future):
+    """
+    Cancels a batch of the lockstep engine once the futures of all its runs are cancelled.
+    """
+    if all(future.cancelled() for future in futures):
+        batch.cancel()
+
+
+def submit_replications(config, num_desks, seeds, engine=SIMULATION_ENGINE, telemetry_channel=None):
+    """
+    Submits one replication per seed of one number of desks and returns their futures. The runs in the result cache
+    get futures that are done already, the others are submitted to the process pool and stored once they are done.
+    With the 'vector' engine, the runs that are not in the cache are submitted as one batch (see vector_engine.py),
+    whose results are handed to their futures. Every run is counted in the metrics (see metrics.py). The simulated
+    runs publish their telemetry to telemetry_channel, if it is given (see telemetry.py).
+    """
+    pool = get_process_pool()
+    cache = get_result_cache()
+    futures = []
+    batch_seeds = []
+    batch_futures = []
+    for seed in seeds:
+        result = cache.get(config, num_desks, seed, engine) if cache is not None else None
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            record_run(result, engine, 'cache')
+        else:
+            if engine == 'vector':
+                future = Future()
+                batch_seeds.append(seed)
+                batch_futures.append(future)
+            else:
+                future = pool.submit(simulate_run, config, num_desks, seed, engine, telemetry_channel)
+            future.add_done_callback(partial(record_simulated_run, engine))
+            if cache is not None:
+                future.add_done_callback(partial(store_result, cache, config, engine))
+        futures.append(future)
+
+    if batch_seeds:
+        batch = pool.submit(simulate_replications, config, num_desks, batch_seeds)
+        batch.add_done_callback(partial(resolve_batch, batch_futures))
+        for future in batch_futures:
+            future.add_done_callback(partial(cancel_batch, batch_futures, batch))
+    return futures
+
+
+def submit_desk_counts(config, desk_counts, seeds):
+    """
+    Submits one replication per seed of every number of desks of desk_counts, with the same seeds for all of them,
+    and returns a dict of their futures by number of desks. The numbers of desks whose runs are all in the result
+    cache get futures that are done already; the others are simulated together in one pass of the lockstep engine
+    (see simulate_desk_counts in simulation.py), whose results are handed to their futures and stored.
+    """
+    pool = get_process_pool()
+    cache = get_result_cache()
+    futures = {}
+    batch_counts = []
+    batch_futures = []
+    for num_desks in desk_counts:
+        results = [cache.get(config, num_desks, seed, 'vector') for seed in seeds] if cache is not None else [None]
+        if None not in results:
+            futures[num_desks] = []
+            for result in results:
+                future = Future()
+                future.set_result(result)
+                record_run(result, 'vector', 'cache')
+                futures[num_desks].append(future)
+            continue
+
+        batch_counts.append(num_desks)
+        futures[num_desks] = [Future() for _ in seeds]
+        for future in futures[num_desks]:
+            future.add_done_callback(partial(record_simulated_run, 'vector'))
+            if cache is not None:
+                future.add_done_callback(partial(store_result, cache, config, 'vector'))
+            batch_futures.append(future)
+
+    if batch_counts:
+        batch = pool.submit(simulate_desk_counts, config, batch_counts, seeds)
+        batch.add_done_callback(partial(resolve_batch, batch_futures))
+        for future in batch_futures:
+            future.add_done_callback(partial(cancel_batch, batch_futures, batch))
+    return futures
+
+
+def run_replications(config, num_desks, seeds, engine=SIMULATION_ENGINE, success_threshold=SUCCESS_RATE_THRESHOLD,
+                     telemetry_channel=None):
+    """
+    Simulates one number of desks once per seed (or replays it from the result cache) and returns the DeskResult.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - num_desks (int): Number of service desks of the hospital.
+    - seeds (list): The seed of every replication.
+    - engine (str): Key of ENGINES that runs each simulation.
+    - success_threshold (float): The success rate a feasible number of desks needs.
+    - telemetry_channel (Queue): Where the runs publish their telemetry, or None.
+    """
+    results = [future.result() for future in submit_replications(config, num_desks, seeds, engine, telemetry_channel)]
+    return summarize_replications(num_desks, results, success_threshold)
@@ -0,0 +1,166 @@
+"""
+A run is fully determined by its config, its number of desks and its seed, so its result can be stored and replayed
+instead of simulated again. ResultCache keeps the RunResults (see simulation.py) in an SQLite database in the
+instance folder (RESULT_CACHE_PATH), so they survive restarts and are shared by all the sessions and processes.
+When a search asks for a run that is in the cache, its result is handed on right away; the runs that are not in
+it are simulated on the process pool and stored once they are done (see replication.py).
+
+The key of a run is a hash of:
+
+    1. the engine class of the engine that simulated it (ENGINE_CLASSES): the engines that are meant to give the
+    same stop cause and waiting times for the same run share a class, so their runs are replayed for each other,
+    and an engine of another class never gets them.
+
+    2. the config, all of its fields, so changing any parameter of the hospital makes new keys and the old results
+    are not used anymore (they are evicted over time). A config with an arrival log also adds the size and
+    modification time of the log's binary (see arrival_log.py), so a log that is converted again makes new keys.
+
+    3. the number of desks and the seed.
+
+    4. RNG_SCHEME of sampler.py, which names how the seed is turned into patients, and RESULT_CACHE_VERSION, which is
+    raised whenever a change to the model changes the results of the same runs.
+
+The 'simpy' and 'heap' engines process the same events in the same order, so they share a class and only the stored
+wall time and events tell which of them simulated a run. The lockstep engine (see vector_engine.py) gives the same
+runs by other means and keeps a class of its own, so a change to it can never hand its runs to the other engines.
+The waiting time counts of a run (see online_stats.py) are stored as JSON, and its seed as text, since it has more
+bits than an SQLite integer (see run_seed in sampler.py).
+
+The database stores RESULT_CACHE_VERSION as its user_version. A database of another version, whose table may not
+have the columns of the current RunResult, is emptied when it is opened.
+
+The cache holds at most RESULT_CACHE_SIZE runs. Every read and write of a run stamps it with the current time, and
+once the cache is full the least recently used runs are evicted, through the index on the stamps. A write does not
+count the runs: the cache keeps an upper bound of their number (the count when it last looked, plus the writes since),
+and only counts them again once the bound passes RESULT_CACHE_SIZE. The eviction then makes room for one percent of
+the size at once, so the next writes do not evict again right away.
+
+Every thread keeps one connection to the database open, instead of opening one per read or write.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import *
+from sampler import RNG_SCHEME
+from simulation import RunResult
+from online_stats import WaitingTimeCounts
+from arrival_log import log_fingerprint
+
+RESULT_CACHE_VERSION = 8
+
+"""
+ENGINE_CLASSES: The engine class of every engine of simulation.py's ENGINES, in the keys of the runs. An engine that
+is not listed is a class of its own.
+"""
+
+ENGINE_CLASSES = {'simpy': 'event', 'heap': 'event', 'vector': 'lockstep'}
+
+result_cache = None
+result_cache_lock = threading.Lock()
+
+
+def run_key(config, num_desks, seed, engine=SIMULATION_ENGINE):
+    """
+    Returns the cache key of a run.
+    """
+    description = [RESULT_CACHE_VERSION, RNG_SCHEME, ENGINE_CLASSES.get(engine, engine), config._asdict(), num_desks,
+                   seed]
+    if config.arrival_log:
+        description.append(log_fingerprint(config.arrival_log))
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_SIZE):
+        """
+        Parameters:
+        - path (str): The SQLite database file. Its folder is created if needed.
+        - max_entries (int): Number of runs the cache holds before the least recently used ones are evicted.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.eviction_batch = max(1, max_entries // 100)
+        self.local = threading.local()
+        self.size_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = self.connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        if connection.execute('PRAGMA user_version').fetchone()[0] != RESULT_CACHE_VERSION:
+            connection.execute('DROP TABLE IF EXISTS runs')
+            connection.execute(f'PRAGMA user_version = {RESULT_CACHE_VERSION}')
+        connection.execute('CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, number_of_desks INTEGER, '
+                           'seed TEXT, stop_cause INTEGER, average_waiting_time REAL, '
+                           'patients_served INTEGER, wall_time REAL, patients_created INTEGER, '
+                           'peak_waiting_line INTEGER, events INTEGER, stop_time INTEGER, '
+                           'waiting_time_counts TEXT, last_used REAL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS runs_last_used ON runs (last_used)')
+        # At least the number of runs in the cache, see put
+        self.size_bound = len(self)
+
+    def connection(self):
+        """
+        Returns the connection of the calling thread to the database, and opens it on first use. SQLite connections
+        can not be shared by threads, so the cache can be used from any thread this way.
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self.local.connection = connection
+        return connection
+
+    def get(self, config, num_desks, seed, engine=SIMULATION_ENGINE):
+        """
+        Returns the RunResult of a run of an engine, or None if it is not in the cache.
+        """
+        key = run_key(config, num_desks, seed, engine)
+        connection = self.connection()
+        row = connection.execute('SELECT number_of_desks, seed, stop_cause, average_waiting_time, '
+                                 'patients_served, wall_time, patients_created, peak_waiting_line, events, '
+                                 'stop_time, waiting_time_counts FROM runs WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE runs SET last_used = ? WHERE key = ?', (time.time(), key))
+        number_of_desks, seed, *fields, waiting_time_counts = row
+        return RunResult(number_of_desks, int(seed), *fields,
+                         WaitingTimeCounts.from_dict(json.loads(waiting_time_counts)))
+
+    def put(self, config, result, engine=SIMULATION_ENGINE):
+        """
+        Stores the RunResult of a run of an engine, and evicts the least recently used runs once there are more than
+        max_entries.
+        """
+        key = run_key(config, result.number_of_desks, result.seed, engine)
+        connection = self.connection()
+        connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (key, result.number_of_desks, str(result.seed), *result[2:-1],
+                            json.dumps(result.waiting_time_counts.to_dict()), time.time()))
+        with self.size_lock:
+            self.size_bound += 1
+            if self.size_bound <= self.max_entries:
+                return
+            size = len(self)
+            if size > self.max_entries:
+                evicted = size - self.max_entries + self.eviction_batch
+                connection.execute('DELETE FROM runs WHERE key IN (SELECT key FROM runs ORDER BY last_used LIMIT ?)',
+                                   (evicted,))
+                size -= evicted
+            self.size_bound = size
+
+    def __len__(self):
+        return self.connection().execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+
+def get_result_cache():
+    """
+    Returns the result cache shared by all the searches, and opens it on first use. None if RESULT_CACHE is off.
+    The lock keeps the sessions that use it first at the same time from opening one each.
+    """
+    global result_cache
+    with result_cache_lock:
+        if RESULT_CACHE and result_cache is None:
+            result_cache = ResultCache()
+        return result_cache
@@ -0,0 +1,129 @@
+"""
+Every patient needs a priority, an allowed waiting time and a service time, and every arrival needs an interarrival
+gap. Drawing them one by one means several scalar NumPy calls per patient, and at our arrival rates the Python to
+NumPy overhead of those calls is a large part of a run. PatientSampler draws these values as NumPy arrays in large
+blocks (SAMPLER_BLOCK_SIZE values at a time) and converts each block to a plain list once. Creating a patient or
+scheduling an arrival then only reads the next index, and a new block is drawn once the current one is used up.
+
+Reproducibility: the seed of a sampler is turned into a SeedSequence, which spawns three child sequences, and the
+sampler keeps one numpy.random.Generator per child: one for the interarrival gaps, one for the priorities and one for
+the service times. A block of N values drawn from a Generator is exactly the same sequence as N scalar calls on it,
+so the values a sampler produces for a given seed do not depend on SAMPLER_BLOCK_SIZE. With one stream per
+attribute, the i-th patient and the i-th gap only depend on the seed and on i, which is what lets two different
+engines, or two numbers of desks (common random numbers, see session.py), replay the same patients. The
+distributions are unchanged; the Generators draw other values than RandomStates would, and draw them faster.
+
+Nothing uses the global NumPy RNG. The seed of a run is derived by run_seed() from a SeedSequence keyed by the seed
+of its search (SEARCH_SEED by default), its number of desks and its replication, so any run of a search can be
+simulated again on its own, on any worker process, in any order, or replayed from the result cache (see
+result_cache.py), and it does not depend on the runs before it or on other searches running at the same time. The
+seed of a run has RUN_SEED_BITS bits: with 32 bit seeds, two of the runs of a search with many replications (or two
+of the runs in the result cache) would get the same seed, and so the same patients, once in a while (the birthday
+bound: about 1 in 8600 for 1000 runs), while with 128 bits it does not happen in practice. A sampler without a seed
+gets fresh entropy from the operating system.
+"""
+
+import numpy as np
+from config import *
+
+# Names how a seed is turned into patients (see result_cache.py). Change it whenever the drawn values change.
+RNG_SCHEME = 'seed-sequence/3-pcg64-generators'
+
+RUN_SEED_BITS = 128
+
+
+def run_seed(search_seed, replication, num_desks=None):
+    """
+    Returns the seed of a run of a search, a RUN_SEED_BITS bit int taken from a SeedSequence keyed by (search seed,
+    number of desks, replication).
+
+    Parameters:
+    - search_seed (int): Seed of the search.
+    - replication (int): Index of the replication, from 0.
+    - num_desks (int or None): Number of desks of the run. None gives replication r the same seed for every
+      number of desks (common random numbers).
+    """
+    spawn_key = (replication,) if num_desks is None else (num_desks, replication)
+    words = np.random.SeedSequence(search_seed, spawn_key=spawn_key).generate_state(RUN_SEED_BITS // 32)
+    return sum(int(word) << 32 * i for i, word in enumerate(words))
+
+
+class PatientSampler:
+    def __init__(self, seed=None, config=DEFAULT_CONFIG, block_size=SAMPLER_BLOCK_SIZE):
+        """
+        Parameters:
+        - seed (int or None): Seed of the sampler. None uses fresh entropy from the operating system.
+        - config (SimulationConfig): The simulated hospital, which defines the distributions.
+        - block_size (int): Number of values pre-drawn per attribute every time a block runs out.
+        """
+        arrivals, priorities, service_times = np.random.SeedSequence(seed).spawn(3)
+        self.config = config
+        self.block_size = block_size
+        self.interarrival_stream = np.random.Generator(np.random.PCG64(arrivals))
+        self.priority_stream = np.random.Generator(np.random.PCG64(priorities))
+        self.service_time_stream = np.random.Generator(np.random.PCG64(service_times))
+
+        self.priorities = []
+        self.allowed_waiting_times = []
+        self.service_times = []
+        self.patient_index = 0
+        self.interarrival_times = []
+        self.interarrival_index = 0
+
+    def draw_patients(self, size):
+        """
+        Returns the priorities, allowed waiting times and service times of the next size patients, as arrays.
+        """
+        config = self.config
+        priorities = self.priority_stream.integers(config.priority_lower_bound, config.priority_upper_bound + 1,
+                                                   size=size)
+        allowed_waiting_times = np.where(priorities <= config.emergency_threshold, priorities,
+                                         config.non_emergency_allowed_waiting_time)
+        service_times = np.maximum(1, np.round(
+            self.service_time_stream.exponential(scale=config.service_time_lambda_param, size=size)))
+        return priorities, allowed_waiting_times, service_times.astype(np.int64)
+
+    def draw_interarrival_times(self, size):
+        """
+        Returns the next size interarrival gaps, as an array.
+        """
+        interarrival_times = np.maximum(1, np.round(
+            self.interarrival_stream.exponential(scale=self.config.interarrival_rate_lambda_param, size=size)))
+        return interarrival_times.astype(np.int64)
+
+    def refill_patients(self):
+        """
+        Draws the next block of priorities, allowed waiting times and service times.
+        """
+        priorities, allowed_waiting_times, service_times = self.draw_patients(self.block_size)
+        self.priorities = priorities.tolist()
+        self.allowed_waiting_times = allowed_waiting_times.tolist()
+        self.service_times = service_times.tolist()
+        self.patient_index = 0
+
+    def refill_interarrival_times(self):
+        """
+        Draws the next block of interarrival gaps.
+        """
+        self.interarrival_times = self.draw_interarrival_times(self.block_size).tolist()
+        self.interarrival_index = 0
+
+    def next_patient(self):
+        """
+        Returns the (priority, allowed_waiting_time, service_time) of the next patient.
+        """
+        if self.patient_index == len(self.priorities):
+            self.refill_patients()
+        i = self.patient_index
+        self.patient_index = i + 1
+        return self.priorities[i], self.allowed_waiting_times[i], self.service_times[i]
+
+    def next_interarrival_time(self):
+        """
+        Returns the gap between the current arrival and the next one.
+        """
+        if self.interarrival_index == len(self.interarrival_times):
+            self.refill_interarrival_times()
+        i = self.interarrival_index
+        self.interarrival_index = i + 1
+        return self.interarrival_times[i]
@@ -0,0 +1,100 @@
+"""
+A search decides which number of desks is simulated next. Each search is a generator: it yields the number of desks
+of the next run, is sent back whether that run was successful, and returns the required (minimum successful) number
+of desks once it is done. SimulationSession.sequential_search in session.py drives it like this:
+
+    search = DESK_SEARCHES['galloping'](1)
+    number_of_desks = next(search)
+    while True:
+        ...run the simulation with number_of_desks...
+        try:
+            number_of_desks = search.send(run_succeeded)
+        except StopIteration as result:
+            required_desks = result.value
+            break
+
+Both searches assume that adding desks never turns a successful run into a failed one.
+
+    1. linear: start at the first number of desks and add one desk after every failed run. It needs as many runs as
+    the required number of desks.
+
+    2. galloping: double the number of desks until a run succeeds, then bisect between the last failed and the
+    first successful number of desks. It needs about 2 * log2(required desks) runs, and the runs are not in
+    increasing order of desks.
+
+A search can also start at an estimate of the required number of desks, like the analytic one of analytic.py, with
+estimated_search. The estimate is not trusted: if the search finds the estimate itself, nothing below it has been
+simulated yet, so the numbers of desks below it are simulated downwards (descending_search) until one fails.
+"""
+
+
+def linear_search(start=1):
+    """
+    Adds one desk after every failed run.
+
+    Parameters:
+    - start (int): The first number of desks to simulate.
+    """
+    number_of_desks = start
+    while not (yield number_of_desks):
+        number_of_desks += 1
+    return number_of_desks
+
+
+def galloping_search(start=1):
+    """
+    Doubles the number of desks until a run succeeds, then bisects.
+
+    Parameters:
+    - start (int): The first number of desks to simulate. Everything below it is assumed to fail.
+    """
+    failed_desks = start - 1
+    number_of_desks = start
+    while not (yield number_of_desks):
+        failed_desks = number_of_desks
+        number_of_desks *= 2
+    successful_desks = number_of_desks
+
+    while successful_desks - failed_desks > 1:
+        number_of_desks = (failed_desks + successful_desks) // 2
+        if (yield number_of_desks):
+            successful_desks = number_of_desks
+        else:
+            failed_desks = number_of_desks
+    return successful_desks
+
+
+def descending_search(successful_desks, start=1):
+    """
+    Removes one desk after every successful run.
+
+    Parameters:
+    - successful_desks (int): A number of desks that has succeeded. The first number of desks to simulate is one
+      below it.
+    - start (int): The fewest desks to simulate.
+    """
+    while successful_desks > start and (yield successful_desks - 1):
+        successful_desks -= 1
+    return successful_desks
+
+
+def estimated_search(search_mode, estimate, start=1):
+    """
+    Runs a search of DESK_SEARCHES from an estimate of the required number of desks, and then checks the numbers of
+    desks below the estimate with descending_search if the estimate itself succeeds.
+
+    Parameters:
+    - search_mode (str): Key of DESK_SEARCHES.
+    - estimate (int): The first number of desks to simulate.
+    - start (int): The fewest desks to simulate. Everything below it is assumed to fail.
+    """
+    required_desks = yield from DESK_SEARCHES[search_mode](estimate)
+    if required_desks == estimate:
+        required_desks = yield from descending_search(estimate, start)
+    return required_desks
+
+
+DESK_SEARCHES = {
+    'linear': linear_search,
+    'galloping': galloping_search
+}
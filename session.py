@@ -0,0 +1,573 @@
+"""
+A SimulationSession is one search for the required number of desks. It owns everything the search changes, so every
+/run-simulation request gets a session of its own and any number of searches can run at the same time without
+seeing each other's results. The variables of a single run live in the run itself (Hospital in simulation.py,
+local variables in event_engine.py), since even the runs of one session can be simulated at the same time.
+
+The runs are simulated on the process pool shared by all sessions (see workers.py). The pool has PARALLEL_WORKERS
+processes, so the sessions share the cores instead of each of them holding on to one, and the CPU work never runs
+in the threads that serve the requests.
+
+These are the variables of a session:
+
+number_of_desks: A hospital needs at least one desk to operate. so the initial value of this
+variable is 1. After every run, the desk search (see search.py) picks the number of desks of the next run.
+
+average_waiting_times: The average waiting time of each run is stored in this list.
+
+simulations_stop_causes: It is important to know why we cannot operate with X number of service desks.
+So we store the causes of failure in this list to use it for visualization and analyzing the results.
+
+simulated_desk_counts: The number of desks of each run. A search does not have to try the numbers of desks in
+order, so the results above are tagged with the desk count they belong to.
+
+confidence_intervals, success_rates, stop_cause_fractions: With several replications per number of desks (see
+replication.py), the confidence interval of the average waiting time, the fraction of successful replications and
+the fraction of replications per stop cause of each number of desks.
+
+success: It's a trigger that once equals to true, we know that the whole simulation must be stopped and
+the problem of finding the optimum amount of service desks is solved
+
+required_desks: The minimum number of desks with a successful run, once the search is over.
+
+seed, common_random_numbers: The seed of the search, which the seeds of its runs are derived from (see run_seed in
+sampler.py), and whether every number of desks reuses the seeds of the same replications.
+
+session_id, events: The id of the session and the events the search has produced so far, which are streamed to
+the clients (see simulate_and_stream).
+
+started, driver, condition, finished, listeners, last_listened: Whether the search has been queued for a driver
+thread (see start), the thread that runs it, the condition it notifies the streams with, whether the search is over,
+how many clients are listening and when the last one left.
+
+detached: Whether the session is a job (see jobs.py). A job is started by the job queue instead of its first
+stream, and runs to the end whether anybody listens to it or not. The job queue also gives it a job_kind and a
+job_key, which identifies identical submissions.
+
+telemetry_channel: With TELEMETRY, the queue the runs of the session publish their telemetry to (see telemetry.py).
+
+telemetry, telemetry_version: The latest telemetry of every run that is being simulated and of the last run that
+finished, by run, with the version it got when it arrived. Every run publishes its whole buffer of snapshots again
+and again, so only the latest one is kept, outside of the events: the streams send it as 'telemetry' events without
+an id whenever its version is newer than the one they sent last, and a stream that resumes gets the latest
+telemetry instead of every buffer the runs have published.
+
+wakeups: The asyncio queues of the async streams (see simulate_and_stream_async), with their event loops. The
+driver thread puts a wakeup in them whenever there is a new event.
+"""
+
+import asyncio
+import json
+import queue
+import threading
+import traceback
+import time
+import uuid
+from collections import OrderedDict
+from config import *
+from sampler import run_seed
+from search import DESK_SEARCHES, estimated_search, descending_search
+from simulation import ENGINES
+from parallel import parallel_linear_search
+from single_pass import single_pass_search
+from workers import get_process_manager
+from replication import run_replications
+from analytic import analytic_estimate
+from metrics import SEARCH_RUNS, SSE_STREAMS
+from messages import success_message, run_number_message, analytic_estimate_message
+
+"""
+The runs are simulated by simulate_run (see simulation.py) on one of its ENGINES.
+
+Each run of the search gets its own seed, derived from the seed of the search, its number of desks and its
+replication, unless common random numbers are used (see below). Every number of desks
+is simulated replications times and counts as successful once the success rate of its replications reaches
+SUCCESS_RATE_THRESHOLD. After each number of desks is over, its average waiting time, confidence interval, stop
+causes and number of desks are stored and streamed, and the desk search picks the number of desks of the next run.
+The searches of DESK_SEARCHES (see search.py) run one number of desks at a time; the 'parallel' search runs several
+numbers of desks at once (see parallel.py) and the 'single-pass' search simulates a window of numbers of desks in
+one pass over the same patients on the lockstep engine (see single_pass.py), whatever the engine of the session.
+This will continue until the search has found the required number of desks.
+
+With common random numbers (COMMON_RANDOM_NUMBERS or the common_random_numbers argument), the seed of a run is only
+derived from the seed of the search and its replication, so every number of desks reuses the same seeds. A
+PatientSampler draws the arrivals, the priorities and the service times from dedicated streams (see sampler.py), so
+replication r sees exactly the same patients with k and with k + 1 desks and only the number of desks differs between
+them. The comparisons of two numbers of desks are then paired: the noise that comes from different patient streams
+cancels out, the success of the replications is (nearly always) monotone in the number of desks, as the searches of
+search.py assume, and far fewer replications are needed to tell two numbers of desks apart.
+
+If ANALYTIC_LOWER_BOUND is set, the search starts at the analytic estimate of the required number of desks (see
+analytic.py), which is reported in a first event. The estimate only describes the long run, so if it succeeds, the
+numbers of desks below it are simulated downwards until one fails (see estimated_search in search.py); the search
+finds the same required number of desks as without the estimate, with fewer runs when the estimate is good.
+
+The search runs in one of the SESSION_WORKERS driver threads shared by all the sessions (see drive), which stores its
+events, and the clients stream them from there (see simulate_and_stream). A search that is started while all the
+driver threads are busy waits for one in a queue, and its streams send heartbeats meanwhile, so the number of
+threads does not grow with the number of requests. Every event only carries what is new, the record of one number of desks, and has
+an id, so a client that loses its connection reconnects with its Last-Event-ID and picks up the same search where
+it left off instead of starting it over.
+"""
+
+SEARCH_MODES = [*DESK_SEARCHES, 'parallel', 'single-pass']
+
+
+class SimulationSession:
+    def __init__(self, config=DEFAULT_CONFIG, engine=SIMULATION_ENGINE, search_mode=DESK_SEARCH,
+                 replications=REPLICATIONS, seed=SEARCH_SEED, common_random_numbers=COMMON_RANDOM_NUMBERS):
+        """
+        Parameters:
+        - config (SimulationConfig): The simulated hospital.
+        - engine (str): Key of ENGINES that runs each simulation.
+        - search_mode (str): One of SEARCH_MODES, which picks the number of desks of each run.
+        - replications (int): Number of independent runs of every number of desks.
+        - seed (int): Seed of the search, which the seeds of its runs are derived from.
+        - common_random_numbers (bool): Whether every number of desks replays the same replications.
+        """
+        self.config = config
+        self.engine = engine
+        self.search_mode = search_mode
+        self.replications = replications
+        self.seed = seed
+        self.common_random_numbers = common_random_numbers
+
+        self.number_of_desks = 1
+        self.average_waiting_times = []
+        self.simulations_stop_causes = []
+        self.simulated_desk_counts = []
+        self.confidence_intervals = []
+        self.success_rates = []
+        self.stop_cause_fractions = []
+        self.success = False
+        self.required_desks = None
+
+        self.session_id = uuid.uuid4().hex
+        self.events = []
+        self.started = False
+        self.driver = None
+        self.condition = threading.Condition()
+        self.finished = False
+        self.listeners = 0
+        self.last_listened = time.monotonic()
+        self.wakeups = set()
+        self.telemetry_channel = None
+        self.telemetry = {}
+        self.telemetry_version = 0
+        self.detached = False
+
+    def draw_seeds(self, count, number_of_desks=None):
+        """
+        Returns the seeds of the first count replications of a number of desks. With common random numbers, or
+        without a number of desks, they are the same for every number of desks.
+        """
+        if self.common_random_numbers:
+            number_of_desks = None
+        return [run_seed(self.seed, replication, number_of_desks) for replication in range(count)]
+
+    def sequential_search(self, search):
+        """
+        Runs a search of search.py, one number of desks after the other. The linear and galloping searches of a
+        browser are RUN_PACING seconds apart, a job runs at full speed.
+
+        Parameters:
+        - search (generator): The search, which yields the number of desks of every run (see search.py).
+
+        Yields the DeskResult of every number of desks and returns the required number of desks.
+        """
+        # The single-pass search simulates every number of desks on the same seeds
+        seeds_of_desks = self.search_mode != 'single-pass'
+        number_of_desks = next(search)
+        while True:
+            # Paced for the scatterplot of a browser only
+            if self.search_mode in DESK_SEARCHES and not self.detached and RUN_PACING:
+                print(run_number_message(number_of_desks))
+                time.sleep(RUN_PACING)
+
+            seeds = self.draw_seeds(self.replications, number_of_desks if seeds_of_desks else None)
+            result = run_replications(self.config, number_of_desks, seeds, self.engine,
+                                      telemetry_channel=self.telemetry_channel)
+            yield result
+
+            # Let the search pick the number of desks of the next run
+            try:
+                number_of_desks = search.send(result.feasible)
+            except StopIteration as search_result:
+                return search_result.value
+
+    def checked_below(self, runs, estimate, start):
+        """
+        Hands on the DeskResults of a parallel or single-pass search that starts at an estimate, and simulates the
+        numbers of desks below the estimate one at a time, down to start, if the estimate itself succeeds (see
+        descending_search in search.py).
+
+        Returns the required number of desks.
+        """
+        required_desks = yield from runs
+        if required_desks == estimate:
+            required_desks = yield from self.sequential_search(descending_search(estimate, start))
+        return required_desks
+
+    def search_events(self):
+        """
+        Runs the search until the required number of desks is found and yields its events as (name, payload) tuples:
+        'analytic' for the analytic estimate the search starts at, 'run' for the DeskResult of every number of desks
+        and 'done' once the search is over.
+        """
+        # Start at the analytic estimate, and check below it if it succeeds
+        start = estimate = self.number_of_desks
+        if ANALYTIC_LOWER_BOUND:
+            estimate = analytic_estimate(start, self.config)
+            if estimate > start:
+                print(analytic_estimate_message(estimate))
+                yield 'analytic', {'analytic_estimate': estimate}
+
+        if self.search_mode == 'parallel':
+            runs = self.checked_below(parallel_linear_search(self.config, estimate, self.draw_seeds, self.engine,
+                                                             self.replications,
+                                                             telemetry_channel=self.telemetry_channel),
+                                      estimate, start)
+        elif self.search_mode == 'single-pass':
+            runs = self.checked_below(single_pass_search(self.config, estimate, self.draw_seeds(self.replications)),
+                                      estimate, start)
+        else:
+            runs = self.sequential_search(estimated_search(self.search_mode, estimate, start))
+
+        try:
+            while not self.success:
+                try:
+                    result = next(runs)
+                except StopIteration as search_result:
+                    self.required_desks = search_result.value
+                    self.success = True
+                    continue
+
+                self.number_of_desks = result.number_of_desks
+                self.simulations_stop_causes.append(result.stop_cause)
+                self.simulated_desk_counts.append(result.number_of_desks)
+                self.average_waiting_times.append(result.average_waiting_time)
+                self.confidence_intervals.append(result.confidence_interval)
+                self.success_rates.append(result.success_rate)
+                self.stop_cause_fractions.append(result.stop_cause_fractions)
+
+                yield 'run', {'number_of_desks': result.number_of_desks,
+                              'replications': result.replications,
+                              'average_waiting_time': result.average_waiting_time,
+                              'confidence_interval': result.confidence_interval,
+                              'success_rate': result.success_rate,
+                              'stop_cause_fractions': result.stop_cause_fractions,
+                              'stop_cause': result.stop_cause,
+                              'stop_time': result.stop_time,
+                              'waiting_time_stats': result.waiting_time_stats}
+        finally:
+            # Cancels the runs of a parallel or single-pass search that are not needed anymore
+            runs.close()
+
+        # Final message
+        SEARCH_RUNS.observe(len(self.simulated_desk_counts))
+        print(success_message(self.required_desks))
+        yield 'done', {'message': success_message(self.required_desks), 'required_desks': self.required_desks,
+                       'runs': len(self.simulated_desk_counts)}
+
+    def start(self):
+        """
+        Queues the search for a driver thread, unless it has been started already or is a job, which the job queue
+        starts.
+        """
+        with self.condition:
+            if self.started or self.detached:
+                return
+            self.started = True
+        with drivers_lock:
+            while len(session_drivers) < SESSION_WORKERS:
+                driver = threading.Thread(target=run_sessions, daemon=True)
+                driver.start()
+                session_drivers.append(driver)
+        session_queue.put(self)
+
+    def drive(self):
+        """
+        Runs the search and stores its events. Unless the session is a job, the search is stopped once nobody has
+        listened to it for SESSION_RESUME_TIMEOUT seconds, also while it is waiting for a driver thread.
+        """
+        with self.condition:
+            self.driver = threading.current_thread()
+        if self.abandoned():
+            forget_session(self.session_id)
+            self.finish()
+            return
+
+        relay = None
+        if TELEMETRY:
+            self.telemetry_channel = get_process_manager().Queue()
+            relay = threading.Thread(target=self.relay_telemetry, daemon=True)
+            relay.start()
+
+        events = self.search_events()
+        try:
+            for event in events:
+                abandoned = self.add_event(event)
+                if abandoned:
+                    forget_session(self.session_id)
+                    break
+        finally:
+            events.close()
+            if relay is not None:
+                self.telemetry_channel.put(None)
+                relay.join()
+            self.finish()
+
+    def finish(self):
+        """
+        Marks the search as over and wakes up the streams.
+        """
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+            self.wake_async_streams()
+
+    def relay_telemetry(self):
+        """
+        Keeps the latest telemetry the runs publish and wakes up the streams, until the search puts None in the
+        channel. The telemetry of a finished run is dropped once another run finishes.
+        """
+        for telemetry in iter(self.telemetry_channel.get, None):
+            run = (telemetry['number_of_desks'], telemetry['seed'])
+            with self.condition:
+                if telemetry['finished']:
+                    self.telemetry = {other: update for other, update in self.telemetry.items()
+                                      if not update[1]['finished']}
+                self.telemetry_version += 1
+                self.telemetry[run] = (self.telemetry_version, telemetry)
+                self.condition.notify_all()
+                self.wake_async_streams()
+
+    def telemetry_after(self, telemetry_version):
+        """
+        Returns the telemetry that is newer than telemetry_version as Server-Sent Events, oldest first, and the
+        latest version. Called with the condition held.
+        """
+        updates = sorted((update for update in self.telemetry.values() if update[0] > telemetry_version),
+                         key=lambda update: update[0])
+        return ([f"event: telemetry\ndata: {json.dumps(telemetry)}\n\n" for _, telemetry in updates],
+                self.telemetry_version)
+
+    def add_event(self, event):
+        """
+        Stores an event and wakes up the streams. Returns whether the search has been abandoned.
+        """
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+            self.wake_async_streams()
+            return self.abandoned()
+
+    def abandoned(self):
+        """
+        Returns whether the search has been abandoned: it is not a job, and nobody has listened to it for
+        SESSION_RESUME_TIMEOUT seconds.
+        """
+        with self.condition:
+            return (not self.detached and self.listeners == 0
+                    and time.monotonic() - self.last_listened > SESSION_RESUME_TIMEOUT)
+
+    def wake_async_streams(self):
+        """
+        Wakes up the async streams from the driver thread. Called with the condition held.
+        """
+        for loop, wakeup in self.wakeups:
+            loop.call_soon_threadsafe(wakeup.put_nowait, None)
+
+    def format_event(self, event_number):
+        """
+        Returns an event of the search as a Server-Sent Event.
+        """
+        name, payload = self.events[event_number]
+        return f"id: {self.session_id}:{event_number}\nevent: {name}\ndata: {json.dumps(payload)}\n\n"
+
+    def simulate_and_stream(self, last_event_number=-1):
+        """
+        Streams the events of the search as Server-Sent Events, starting after last_event_number. The id of every
+        event is session_id:event number, so a client that reconnects with its Last-Event-ID gets the events it
+        has missed and then follows the search from there. The latest telemetry of the runs is sent in between,
+        without an id. While no event is ready, a heartbeat comment is sent every SSE_HEARTBEAT_INTERVAL seconds.
+        """
+        self.start()
+        next_event = last_event_number + 1
+        telemetry_version = 0
+        with self.condition:
+            self.listeners += 1
+        SSE_STREAMS.inc()
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: (len(self.events) > next_event or self.finished
+                                                     or self.telemetry_version > telemetry_version),
+                                            timeout=SSE_HEARTBEAT_INTERVAL)
+                    pending = self.events[next_event:]
+                    telemetry, telemetry_version = self.telemetry_after(telemetry_version)
+                    finished = self.finished
+
+                yield from telemetry
+                for _ in pending:
+                    yield self.format_event(next_event)
+                    next_event += 1
+                if not pending:
+                    if finished:
+                        return
+                    if not telemetry:
+                        yield ": heartbeat\n\n"
+        finally:
+            SSE_STREAMS.dec()
+            with self.condition:
+                self.listeners -= 1
+                self.last_listened = time.monotonic()
+
+    async def simulate_and_stream_async(self, last_event_number=-1):
+        """
+        The same stream as simulate_and_stream for an asyncio server (see asgi.py). Instead of holding a thread
+        while it waits, the stream waits on an asyncio queue that the driver thread of the search wakes up, so an
+        event loop can serve any number of streams. The searches themselves share the SESSION_WORKERS driver
+        threads.
+        """
+        wakeup = asyncio.Queue()
+        listener = (asyncio.get_running_loop(), wakeup)
+        with self.condition:
+            self.listeners += 1
+            self.wakeups.add(listener)
+        SSE_STREAMS.inc()
+        self.start()
+        next_event = last_event_number + 1
+        telemetry_version = 0
+        try:
+            while True:
+                with self.condition:
+                    pending = len(self.events) - next_event
+                    telemetry, telemetry_version = self.telemetry_after(telemetry_version)
+                    finished = self.finished
+
+                for update in telemetry:
+                    yield update
+                for _ in range(pending):
+                    yield self.format_event(next_event)
+                    next_event += 1
+                if pending <= 0 and not telemetry:
+                    if finished:
+                        return
+                    try:
+                        await asyncio.wait_for(wakeup.get(), SSE_HEARTBEAT_INTERVAL)
+                    except asyncio.TimeoutError:
+                        yield ": heartbeat\n\n"
+        finally:
+            SSE_STREAMS.dec()
+            with self.condition:
+                self.listeners -= 1
+                self.wakeups.discard(listener)
+                self.last_listened = time.monotonic()
+
+
+"""
+The searches of the sessions run in SESSION_WORKERS driver threads, which are started with the first search and take
+the sessions from session_queue in the order they are started. A driver thread runs one search at a time, and most
+of that time it waits for the runs on the process pool.
+"""
+
+session_queue = queue.Queue()
+session_drivers = []
+drivers_lock = threading.Lock()
+
+
+def run_sessions():
+    """
+    Runs the searches of the queue, one after the other. The loop of every driver thread.
+    """
+    for session in iter(session_queue.get, None):
+        try:
+            session.drive()
+        except Exception:
+            # A failed search ends its session, not the driver thread
+            traceback.print_exc()
+
+
+"""
+The sessions are kept by their id for a while after they are created, so that a client can reconnect to its
+search. Only the last SESSION_HISTORY sessions can be resumed, and a search that has been stopped because nobody
+listened to it can not be resumed either.
+"""
+
+sessions = OrderedDict()
+sessions_lock = threading.Lock()
+
+
+def open_session(*args, session_class=None, **kwargs):
+    """
+    Creates a SimulationSession (or a session of session_class, like SweepSession of sweep.py) with the given
+    arguments and keeps it for resuming.
+    """
+    session = (session_class or SimulationSession)(*args, **kwargs)
+    with sessions_lock:
+        sessions[session.session_id] = session
+        while len(sessions) > SESSION_HISTORY:
+            sessions.popitem(last=False)
+    return session
+
+
+def find_session(session_id):
+    """
+    Returns the session with the given id, or None if it can not be resumed.
+    """
+    with sessions_lock:
+        return sessions.get(session_id)
+
+
+def forget_session(session_id):
+    with sessions_lock:
+        sessions.pop(session_id, None)
+
+
+"""
+/run-simulation is served by app.py (Flask) and asgi.py (FastAPI), which read their query parameters and the
+Last-Event-ID of a reconnecting client with the functions below. SSE_HEADERS are the response headers of the
+streams: no caching, and no buffering by proxies such as nginx.
+"""
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def search_arguments(parameters):
+    """
+    Reads the arguments of a new session from the query parameters of /run-simulation.
+
+    Parameters:
+    - parameters (mapping): The query parameters, engine, search, replications (at most MAX_REPLICATIONS) and
+      common_random_numbers (1 or 0). SIMULATION_ENGINE, DESK_SEARCH, REPLICATIONS and COMMON_RANDOM_NUMBERS are
+      their defaults.
+
+    Returns the keyword arguments of open_session, and raises ValueError with a message for the client if a
+    parameter is not valid.
+    """
+    engine = parameters.get('engine', SIMULATION_ENGINE)
+    search_mode = parameters.get('search', DESK_SEARCH)
+    replications = parameters.get('replications', str(REPLICATIONS))
+    common_random_numbers = parameters.get('common_random_numbers', str(int(COMMON_RANDOM_NUMBERS)))
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {sorted(ENGINES)}")
+    if search_mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search '{search_mode}', expected one of {sorted(SEARCH_MODES)}")
+    if not replications.isdigit() or not 1 <= int(replications) <= MAX_REPLICATIONS:
+        raise ValueError(f"replications must be an integer from 1 to {MAX_REPLICATIONS}")
+    if common_random_numbers not in ('0', '1'):
+        raise ValueError("common_random_numbers must be 0 or 1")
+    return {'engine': engine, 'search_mode': search_mode, 'replications': int(replications),
+            'common_random_numbers': common_random_numbers == '1'}
+
+
+def resume_position(last_event_id):
+    """
+    Returns the session and the last event number of a Last-Event-ID, or None if the search can not be resumed.
+    """
+    session_id, _, last_event_number = last_event_id.partition(':')
+    session = find_session(session_id)
+    if session is None or not last_event_number.isdigit():
+        return None
+    return session, int(last_event_number)
@@ -0,0 +1,425 @@
+"""
+This file holds the simulation of a single run: the SimPy model of the hospital, and simulate_run, which runs one
+simulation with a given config, number of desks and seed on either engine and returns its result. simulate_run
+does not touch anything outside of the run, so it can be handed to a worker process (see parallel.py).
+"""
+
+import time
+import simpy
+from typing import NamedTuple
+from config import *
+from arrival_log import make_sampler
+from event_engine import run_heap_simulation
+from vector_engine import run_vector_simulation, run_lockstep, run_desk_counts
+from telemetry import Telemetry, telemetry_process
+from online_stats import WaitingTimeCounts
+from event_trace import (default_trace, PATIENT_ARRIVAL, DESK_ARRIVAL, PATIENT_EXIT,
+                         WAITING_TIME_FAILURE, WAITING_LINE_FAILURE)
+
+"""
+Hospital is our environment and everything happens in it. Its main function is to service the 
+patients. It's done by service desks which are our resources. Resources are the things that are 
+shared between the users (patients in this case) and are limited. Since this project focuses on
+priority-based servicing, we have used a special type of resource (PriorityResource) that does 
+the job for us.
+
+The hospital also holds the variables of its run, so that any number of runs can happen at the same time:
+
+waiting_count: The length of the hospital's waiting queue, the number of patients that have arrived and are yet
+to be serviced. Only the count is kept (the desks' PriorityResource keeps the actual queue): it goes up when a
+patient arrives and down once the patient gets to a desk.
+
+waiting_by_priority: The same count per priority, indexed by the priority. Together with waiting_count it is
+returned by waiting_line_stats().
+
+peak_waiting_count: The longest the waiting queue has been in the run.
+
+waiting_time_counts: The waiting times of patients are counted here, per priority (see online_stats.py). They
+give the average waiting time of each run, which is one of the main goals of this project, and its other
+statistics, in constant memory.
+
+stop_simulation: a simPy event which can be triggered throughout the simulation to end the run.
+
+stop_cause: The STOP_TRIGGERS value of the condition that stopped the run (see config.py).
+
+patient_number: The name of the next patient.
+
+config: The SimulationConfig of the run.
+
+trace: The Trace of the run (see event_trace.py), which records the patient events and the failures.
+"""
+
+class Hospital:
+    def __init__(self, env, num_desks, config=DEFAULT_CONFIG, trace=None):
+        self.env = env
+        self.desks = simpy.PriorityResource(env, num_desks)
+        self.config = config
+        self.waiting_count = 0
+        self.waiting_by_priority = [0] * (config.priority_upper_bound + 1)
+        self.peak_waiting_count = 0
+        self.waiting_time_counts = WaitingTimeCounts(config)
+        self.stop_simulation = env.event()
+        self.stop_cause = None
+        self.patient_number = 1
+        self.trace = default_trace() if trace is None else trace
+
+    def waiting_line_stats(self):
+        """
+        Returns the number of waiting patients, in total and per priority.
+        """
+        return {
+            'waiting': self.waiting_count,
+            'by_priority': {priority: self.waiting_by_priority[priority] for priority in
+                            range(self.config.priority_lower_bound, self.config.priority_upper_bound + 1)}
+        }
+
+
+"""
+There are three reasons for stopping the simulation. the following method has been written to check whether
+we have encountered any of them:
+
+    1. allowed waiting time of the patient is assigned to them once they arrive in the hospital, and is 
+    based on their priority. Their actual waiting time is calculated once they get to a service desk. 
+    If a patient is kept waiting more than we are allowed to, it means we have failed and we need at  
+    least one more desk; hence, the simulation is stopped.
+    
+    2. In some cases, the capacity of a hospital waiting line is limited. So every time a patient arrives,
+    we should check to see if we have reached the capacity. If so, it means the number of hospital's 
+    service desks was not sufficient to visit the patients.
+    
+   3. If we have reached the end of our simulation time unit and have not had any failures, the current number
+   of desks are enough and we practically have solved the problem. 
+
+Triggering stop_simulation does not stop the run right away: the events already scheduled for the same time are
+processed first, and they may run into a stop condition as well. Only the first condition of a run counts.
+"""
+    
+def check_simulation_conditions(hospital, patient=None, waiting_count=None, queue_maximum_capacity=None, env=None):
+    """
+    Checks various failure or success conditions in the simulation.
+
+    Parameters:
+    - hospital (Hospital): The hospital of the run, whose stop_simulation event is triggered.
+    - patient (Patient): A patient that has got to a desk, with its allowed_waiting_time and waiting_time.
+    - waiting_count (int): Length of the hospital's waiting queue.
+    - queue_maximum_capacity (int): Maximum capacity of the waiting queue.
+    - env (SimPy Environment): Simulation environment to check the current time.
+    """
+    if hospital.stop_simulation.triggered:
+        return
+
+    if patient and patient.allowed_waiting_time < patient.waiting_time:
+        if hospital.trace.summary:
+            hospital.trace.record(WAITING_TIME_FAILURE, hospital.env.now, patient.name)
+        hospital.stop_simulation.succeed()
+        hospital.stop_cause = STOP_TRIGGERS['patient_waiting_time_failure']
+        return
+
+    if waiting_count is not None and waiting_count > queue_maximum_capacity:
+        if hospital.trace.summary:
+            hospital.trace.record(WAITING_LINE_FAILURE, hospital.env.now)
+        hospital.stop_simulation.succeed()
+        hospital.stop_cause = STOP_TRIGGERS['waiting_queue_failure']
+        return
+
+    if env and env.now > hospital.config.simulation_time:
+        hospital.stop_simulation.succeed()
+        hospital.stop_cause = STOP_TRIGGERS['success']
+
+
+        
+        
+"""
+The arrival of patients in a simulation means creating them and assigning them the necessary  values. The 
+initial values of a patient are as follows:
+
+    1. name: For better comprehension, we have assigned a number to each patient as their name. This
+    could prove useful in debugging and checking the flow of the simulation to see which state each patient 
+    is in.
+    
+    2. priority: Priority of a patient is a number between 1 (highest priority) and 10 (lowest priority). Since
+    this project focuses on priority-based service queues, this value is the basis of future functionalities of 
+    the simulation. You can imagine a patient who is having a stroke as a priority 1 patient, and someone who 
+    is at the hospital for their annual check-up as a priority 10 patient.
+   
+    3. allowed_waiting_time: determines how long a patient can be kept waiting. If the priority of a patient
+    is high (between 1 and 5) its value is equal to the patient's priority. If it's not, we are allowed to keep
+    them waiting for the NON_EMERGENCY_ALLOWED_WAITING_TIME time unit. 
+    
+    4. service_time: Each patient requires a certain amount of time for their treatment. This number is calculated
+    based on an exponential distribution with a lambda parameter of SERVICE_TIME_LAMBDA_PARAM. Because in real
+    scenarios we cannot have a 0 service time, the value of this variable should be greater or equal to 1. 
+
+The random values (2 to 4) are not drawn here but read from the run's PatientSampler, which pre-draws them in blocks (or
+from an arrival log, see arrival_log.py).
+
+A run creates thousands of patients, so Patient declares its attributes in __slots__: the patients are smaller and
+faster to create and their attributes are faster to read than with a __dict__ per patient.
+    
+"""
+    
+class Patient:
+    __slots__ = ('name', 'priority', 'allowed_waiting_time', 'service_time',
+                 'hospital_arrival_time', 'desk_arrival_time', 'exit_time', 'waiting_time')
+
+    def __init__(self, name, priority, allowed_waiting_time, service_time):
+        self.name = name
+        self.priority = priority
+        self.allowed_waiting_time = allowed_waiting_time
+        self.service_time = service_time
+        self.hospital_arrival_time = None
+        self.desk_arrival_time = None
+        self.exit_time = None
+        self.waiting_time = None
+
+    @staticmethod
+    def create_patient(hospital, sampler):
+        """
+        Factory method to create a patient with randomized attributes read from the sampler.
+        """
+        name = hospital.patient_number
+        hospital.patient_number += 1
+        priority, allowed_waiting_time, service_time = sampler.next_patient()
+        return Patient(name, priority, allowed_waiting_time, service_time)
+
+    def hospital_arrival(self, hospital):
+        """
+        Handles the arrival of the patient at the hospital.
+        """
+        hospital.waiting_count += 1
+        hospital.waiting_by_priority[self.priority] += 1
+        if hospital.waiting_count > hospital.peak_waiting_count:
+            hospital.peak_waiting_count = hospital.waiting_count
+        check_simulation_conditions(hospital, waiting_count=hospital.waiting_count,
+                                    queue_maximum_capacity=hospital.config.waiting_line_capacity)
+        self.hospital_arrival_time = hospital.env.now
+        if hospital.trace.patients:
+            hospital.trace.record(PATIENT_ARRIVAL, self.hospital_arrival_time, self.name, self.priority,
+                                  self.service_time, self.allowed_waiting_time)
+
+    def desk_arrival(self, hospital):
+        """
+        Handles the arrival of the patient at a service desk.
+        """
+        self.desk_arrival_time = hospital.env.now
+        if hospital.trace.patients:
+            hospital.trace.record(DESK_ARRIVAL, self.desk_arrival_time, self.name)
+        self.waiting_time = self.desk_arrival_time - self.hospital_arrival_time
+        hospital.waiting_time_counts.add(self.priority, self.waiting_time)
+        check_simulation_conditions(hospital, patient=self)
+        hospital.waiting_count -= 1
+        hospital.waiting_by_priority[self.priority] -= 1
+
+    def hospital_exit(self, hospital):
+        """
+        Handles the patient's exit from the hospital.
+        """
+        self.exit_time = hospital.env.now
+        if hospital.trace.patients:
+            hospital.trace.record(PATIENT_EXIT, self.exit_time, self.name, self.waiting_time)
+
+
+"""
+The three explained states of a patient in the hospital are implemented in this method. Hospital as the environment
+of the whole simulation is an argument of this method, and it is here that we model the patient in the hospital.
+First, the patient arrives and requests a service desk from the hospital. It is done by sending a special type of 
+simPy request which is based on priority. The patient now has to wait until the system dedicates a resource (desk) 
+to them. After they get to a service desk, we let the system pass the simulation time by the patient's service
+time, with a plain timeout in the patient's own process. Finally, the patient leaves the hospital.
+"""
+
+def patient_process(env, hospital, sampler):
+    patient = Patient.create_patient(hospital, sampler)
+    patient.hospital_arrival(hospital)
+
+    with hospital.desks.request(priority=patient.priority) as request:
+        yield request
+        patient.desk_arrival(hospital)
+        yield env.timeout(patient.service_time)
+        patient.hospital_exit(hospital)
+
+"""
+An object of hospital class is created with the desired number of desks. The patient_process method is constantly
+executed until the simulation is successful. There must be a time between the arrival of patients; this time is 
+calculated using the exponential distribution with the lambda parameter of INTERARRIVAL_RATE_LAMBDA_PARAM and is
+read from the sampler as well.
+"""
+    
+def setup(env, hospital, sampler):
+    while True:
+        env.process(patient_process(env, hospital, sampler))
+        interarrival_rate = sampler.next_interarrival_time()
+        check_simulation_conditions(hospital, env=env)
+        yield env.timeout(interarrival_rate)  
+        
+    
+"""
+Each run gets a new simPy environment and a new hospital with the desired number of desks. The run ends once the
+hospital's stop_simulation event is processed. The environment is stepped one event at a time, as env.run would,
+so that the processed events can be counted without reading SimPy's internals.
+"""
+
+
+def run_simpy_simulation(num_desks, sampler, config=DEFAULT_CONFIG, trace=None, telemetry=None, counters=None):
+    """
+    Runs one simulation with the SimPy model above.
+
+    Parameters:
+    - num_desks (int): Number of service desks of the hospital.
+    - sampler (PatientSampler): Source of the patients' random attributes and interarrival gaps.
+    - config (SimulationConfig): The simulated hospital.
+    - trace (Trace): Records the events of the run. None uses default_trace() (see event_trace.py).
+    - telemetry (Telemetry): Takes snapshots of the run while it is simulated (see telemetry.py), or None.
+    - counters (dict): If given, gets the events, patients_created, peak_waiting_line and stop_time of the run.
+
+    Returns:
+    - (stop_cause, waiting_time_counts): The STOP_TRIGGERS value that ended the run and the WaitingTimeCounts of the
+      patients that got to a desk.
+    """
+    env = simpy.Environment()
+    hospital = Hospital(env, num_desks, config, trace)
+    env.process(setup(env, hospital, sampler))
+    if telemetry is not None:
+        env.process(telemetry_process(env, hospital, telemetry))
+    events = 0
+    stop_simulation = hospital.stop_simulation
+    step = env.step
+    while not stop_simulation.processed:
+        step()
+        events += 1
+    if telemetry is not None:
+        telemetry.publish(finished=True)
+        events -= telemetry.events
+    if counters is not None:
+        counters.update(events=events, patients_created=hospital.patient_number - 1,
+                        peak_waiting_line=hospital.peak_waiting_count, stop_time=env.now)
+    return hospital.stop_cause, hospital.waiting_time_counts
+
+
+"""
+The simulation can be run by two engines that model the same hospital: 'simpy' (the model above) and 'heap', the
+compact heapq based event kernel of event_engine.py that skips SimPy's scheduling overhead. Given the same sampler
+both return the same stop cause and waiting time counts and record the same trace. A third engine, 'vector' (see
+vector_engine.py), simulates all the replications of a number of desks at once as NumPy arrays
+(simulate_replications), with the same stop causes and waiting time counts as the other two.
+
+RunResult is the record of one run:
+
+    1. number_of_desks, seed: what was simulated. The seed is the seed of the run's PatientSampler, so the run can
+    be repeated on its own.
+
+    2. stop_cause: the STOP_TRIGGERS value that ended the run.
+
+    3. average_waiting_time: the average waiting time of the patients that got to a desk, rounded to 2 decimals.
+
+    4. patients_served: the number of patients that got to a desk.
+
+    5. wall_time: how many seconds the run took.
+
+    6. patients_created, peak_waiting_line, events, stop_time: the number of patients that arrived, the longest
+    the waiting line got, the number of events the engine processed and the simulation time the run stopped at.
+    Only the events are engine specific, since the engines split the same run into different events.
+
+    7. waiting_time_counts: the WaitingTimeCounts of the run (see online_stats.py), which give the statistics of
+    its waiting times.
+"""
+
+ENGINES = {
+    'simpy': run_simpy_simulation,
+    'heap': run_heap_simulation,
+    'vector': run_vector_simulation
+}
+
+
+class RunResult(NamedTuple):
+    number_of_desks: int
+    seed: int
+    stop_cause: int
+    average_waiting_time: float
+    patients_served: int
+    wall_time: float
+    patients_created: int
+    peak_waiting_line: int
+    events: int
+    stop_time: int
+    waiting_time_counts: WaitingTimeCounts
+
+
+def simulate_run(config, num_desks, seed, engine=SIMULATION_ENGINE, telemetry_channel=None):
+    """
+    Runs one simulation and returns its RunResult.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - num_desks (int): Number of service desks of the hospital.
+    - seed (int): Seed of the run's PatientSampler.
+    - engine (str): Key of ENGINES that runs the simulation.
+    - telemetry_channel (Queue): Where the telemetry of the run is published (see telemetry.py), or None.
+    """
+    telemetry = None
+    if telemetry_channel is not None:
+        telemetry = Telemetry(telemetry_channel, {'number_of_desks': num_desks, 'seed': seed})
+    counters = {}
+    start = time.perf_counter()
+    stop_cause, waiting_time_counts = ENGINES[engine](num_desks, make_sampler(seed, config), config,
+                                                      telemetry=telemetry, counters=counters)
+    wall_time = time.perf_counter() - start
+    patients_served = len(waiting_time_counts)
+    average_waiting_time = round(waiting_time_counts.total() / patients_served, 2) if patients_served else 0.0
+    return RunResult(num_desks, seed, stop_cause, average_waiting_time, patients_served, wall_time,
+                     counters['patients_created'], counters['peak_waiting_line'], counters['events'],
+                     counters['stop_time'], waiting_time_counts)
+
+
+def simulate_replications(config, num_desks, seeds):
+    """
+    Runs one simulation per seed with the lockstep engine, all in one batch (see vector_engine.py), and returns
+    their RunResults in the order of the seeds. The wall time of every run is its share of the batch.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - num_desks (int): Number of service desks of the hospital.
+    - seeds (list): The seed of every run.
+    """
+    start = time.perf_counter()
+    runs = run_lockstep(num_desks, [make_sampler(seed, config) for seed in seeds], config)
+    wall_time = (time.perf_counter() - start) / len(seeds)
+    return lockstep_run_results(num_desks, seeds, runs, wall_time)
+
+
+def simulate_desk_counts(config, desk_counts, seeds):
+    """
+    Runs every number of desks of desk_counts once per seed with the lockstep engine, all in one pass over the
+    patients of every seed (see run_desk_counts in vector_engine.py), and returns their RunResults ordered by number
+    of desks and then by seed. The wall time of every run is its share of the pass.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - desk_counts (list): The numbers of service desks to simulate.
+    - seeds (list): The seed of every replication, shared by all the numbers of desks.
+    """
+    start = time.perf_counter()
+    runs = run_desk_counts(desk_counts, [make_sampler(seed, config) for seed in seeds], config)
+    wall_time = (time.perf_counter() - start) / (len(desk_counts) * len(seeds))
+    results = []
+    for num_desks, desk_runs in zip(desk_counts, runs):
+        results.extend(lockstep_run_results(num_desks, seeds, desk_runs, wall_time))
+    return results
+
+
+def lockstep_run_results(num_desks, seeds, runs, wall_time):
+    """
+    Returns the RunResults of the runs of one number of desks of the lockstep engine, and records the failures that
+    ended them in the trace.
+    """
+    trace = default_trace()
+    results = []
+    for seed, (stop_cause, waiting_time_counts, counters, failure) in zip(seeds, runs):
+        if failure is not None and trace.summary:
+            trace.record(*failure)
+        patients_served = len(waiting_time_counts)
+        average_waiting_time = round(waiting_time_counts.total() / patients_served, 2) if patients_served else 0.0
+        results.append(RunResult(num_desks, seed, stop_cause, average_waiting_time, patients_served, wall_time,
+                                 counters['patients_created'], counters['peak_waiting_line'], counters['events'],
+                                 counters['stop_time'], waiting_time_counts))
+    return results
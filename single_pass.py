@@ -0,0 +1,51 @@
+"""
+The other searches simulate every number of desks on patients of its own: the patients are drawn again and the
+whole horizon is run again for k, k + 1, k + 2 and so on. Yet the arrivals, priorities and service times of a seed
+do not depend on the number of desks. The single-pass search draws the seeds of its replications once and runs
+SINGLE_PASS_WIDTH numbers of desks at a time on the lockstep engine (see run_desk_counts in vector_engine.py): every
+seed's patients are drawn once, and each number of desks only keeps its own desks and waiting line, side by side
+with the others. Every run still stops at its own time and with its own cause, the failure curve of the whole
+window costs about one pass over the patients instead of one run per number of desks. The lockstep engine
+processes the events of one time in the order of the heap engine (see vector_engine.py), also the several arrivals
+in one minute of an arrival log, so the runs are the runs the heap engine gives for the same number of desks and
+seed; bench_single_pass.py checks it on sampled patients and on an arrival log.
+
+The results are handed on in increasing order of the number of desks until one is feasible, so the search finds
+the same required number of desks as a linear search with common random numbers (see session.py). If no number of
+desks of a window is feasible, the next window is simulated on the same seeds.
+"""
+
+from config import *
+from replication import submit_desk_counts, summarize_replications
+
+
+def single_pass_search(config, start, seeds, success_threshold=SUCCESS_RATE_THRESHOLD, width=SINGLE_PASS_WIDTH):
+    """
+    Simulates the numbers of desks from start on, width at a time in one pass, until one is feasible.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - start (int): The first number of desks to simulate.
+    - seeds (list): The seed of every replication, shared by all the numbers of desks.
+    - success_threshold (float): The success rate a feasible number of desks needs.
+    - width (int): How many numbers of desks every pass simulates.
+
+    Yields the DeskResult of every number of desks in increasing order, and returns the required number of desks.
+    """
+    futures = {}
+    try:
+        number_of_desks = start
+        while True:
+            if number_of_desks not in futures:
+                futures = submit_desk_counts(config, range(number_of_desks, number_of_desks + width), seeds)
+            results = [future.result() for future in futures.pop(number_of_desks)]
+            result = summarize_replications(number_of_desks, results, success_threshold)
+            yield result
+            if result.feasible:
+                return number_of_desks
+            number_of_desks += 1
+    finally:
+        # Also runs when the client goes away and the generator is closed
+        for replication_futures in futures.values():
+            for future in replication_futures:
+                future.cancel()
@@ -0,0 +1,239 @@
+"""
+A sweep finds the required number of desks for every cell of a grid of hospitals, for capacity planning. The grid
+is spanned by ranges of four parameters of SimulationConfig (SWEEP_PARAMETERS); the other parameters keep their
+DEFAULT_CONFIG values. Every cell gets a desk search of its own (see search_required_desks), like a
+SimulationSession with that config would run.
+
+The required number of desks grows with the load of the hospital: it goes up with longer service times and down
+with longer interarrival gaps, a larger waiting line capacity and a longer allowed waiting time. So a cell needs at
+least as many desks as any cell that is easier in one parameter and the same in the others, and the sweep uses
+those neighbours to warm-start the search of every cell: everything below the largest number of desks a neighbour
+needed is assumed to fail. This relies on the same monotonicity the desk searches of search.py assume. The search
+starts there, or at the analytic estimate of the cell (see analytic.py) if that is larger, in which case the numbers
+of desks between the two are still simulated if the estimate succeeds (see estimated_search in search.py).
+
+To have the neighbours done first, the cells are searched in waves. The difficulty of a cell is the sum of the
+positions of its values in their ranges, counted from the easy end. All the easier neighbours of a cell are in
+earlier waves, and the cells of one wave can not warm-start each other, so they are searched at the same time,
+by up to PARALLEL_WORKERS threads that each run one cell's search on the shared process pool (see workers.py).
+Once nobody listens to the sweep any more (see SimulationSession.abandoned), the searches that have not started are
+cancelled and the running ones stop after the number of desks they are simulating.
+
+The sweep is streamed like a desk search (see session.py), with the same ids, resume and heartbeats: a 'grid'
+event with the ranges, a 'cell' event with the required number of desks of every cell once its search is over,
+and a 'done' event.
+"""
+
+import itertools
+import math
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import *
+from sampler import run_seed
+from search import DESK_SEARCHES, estimated_search
+from replication import run_replications
+from analytic import analytic_estimate
+from metrics import SEARCH_RUNS
+from session import SimulationSession, forget_session, search_arguments
+
+"""
+SWEEP_PARAMETERS: The parameters a sweep can span, and whether a larger value makes the hospital harder to run
+(so that it needs more desks).
+"""
+
+SWEEP_PARAMETERS = {
+    'interarrival_rate_lambda_param': False,
+    'service_time_lambda_param': True,
+    'waiting_line_capacity': False,
+    'non_emergency_allowed_waiting_time': False
+}
+
+
+def search_required_desks(config, start, engine=SIMULATION_ENGINE, search_mode='linear',
+                          replications=REPLICATIONS, seed=SEARCH_SEED, common_random_numbers=COMMON_RANDOM_NUMBERS,
+                          results=None, estimate=None, stop=None):
+    """
+    Runs a desk search for one config and returns the required number of desks and the number of desk counts
+    it simulated. A stopped search returns None desks.
+
+    Parameters:
+    - config (SimulationConfig): The simulated hospital.
+    - start (int): The fewest desks to simulate, and the first one without an estimate. Everything below it is
+      assumed to fail.
+    - engine (str): Key of ENGINES that runs each simulation.
+    - search_mode (str): Key of DESK_SEARCHES.
+    - replications (int): Number of independent runs of every number of desks.
+    - seed (int): Seed of the search, which the seeds of its runs are derived from.
+    - common_random_numbers (bool): Whether every number of desks replays the same replications.
+    - results (list): If given, gets the DeskResult of every simulated number of desks (see replication.py).
+    - estimate (int): An estimate of the required number of desks to start the search at instead (see
+      estimated_search in search.py), or None.
+    - stop (threading.Event): If given, the search stops before the next number of desks once it is set.
+    """
+    search = estimated_search(search_mode, max(start, estimate or start), start)
+    number_of_desks = next(search)
+    simulated = 0
+    while True:
+        if stop is not None and stop.is_set():
+            return None, simulated
+        seeds = [run_seed(seed, replication, None if common_random_numbers else number_of_desks)
+                 for replication in range(replications)]
+        result = run_replications(config, number_of_desks, seeds, engine)
+        simulated += 1
+        if results is not None:
+            results.append(result)
+        try:
+            number_of_desks = search.send(result.feasible)
+        except StopIteration as search_result:
+            SEARCH_RUNS.observe(simulated)
+            return search_result.value, simulated
+
+
+class SweepSession(SimulationSession):
+    def __init__(self, grid, engine=SIMULATION_ENGINE, search_mode='linear', replications=REPLICATIONS,
+                 seed=SEARCH_SEED, common_random_numbers=COMMON_RANDOM_NUMBERS):
+        """
+        Parameters:
+        - grid (dict): The values of every parameter of SWEEP_PARAMETERS, in increasing order.
+        - engine, search_mode, replications, seed, common_random_numbers: Those of the search of every cell
+          (see search_required_desks).
+        """
+        super().__init__(DEFAULT_CONFIG, engine, search_mode, replications, seed, common_random_numbers)
+        self.grid = grid
+        self.seed = seed
+        self.common_random_numbers = common_random_numbers
+
+    def cell_config(self, cell):
+        """
+        Returns the config of a cell, given as the positions of its values in the grid.
+        """
+        return DEFAULT_CONFIG._replace(**{name: self.grid[name][position]
+                                          for name, position in zip(self.grid, cell)})
+
+    def difficulty(self, cell):
+        """
+        Returns the positions of a cell's values counted from the easy end of their ranges.
+        """
+        return tuple(position if SWEEP_PARAMETERS[name] else len(self.grid[name]) - 1 - position
+                     for name, position in zip(self.grid, cell))
+
+    def warm_start(self, cell, required_desks):
+        """
+        Returns the fewest desks the search of a cell simulates: the most desks an easier neighbour needed.
+        """
+        start = 1
+        for i, name in enumerate(self.grid):
+            step = -1 if SWEEP_PARAMETERS[name] else 1
+            neighbour = cell[:i] + (cell[i] + step,) + cell[i + 1:]
+            if neighbour in required_desks:
+                start = max(start, required_desks[neighbour])
+        return start
+
+    def search_events(self):
+        """
+        Searches every cell of the grid, in waves of equal difficulty, and yields the 'grid', 'cell' and 'done'
+        events of the sweep.
+        """
+        cells = list(itertools.product(*(range(len(values)) for values in self.grid.values())))
+        yield 'grid', {'parameters': self.grid, 'cells': len(cells)}
+
+        waves = {}
+        for cell in cells:
+            waves.setdefault(sum(self.difficulty(cell)), []).append(cell)
+
+        required_desks = {}
+        simulated = 0
+        stop = threading.Event()
+        threads = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS)
+        try:
+            for difficulty in sorted(waves):
+                searches = {}
+                for cell in waves[difficulty]:
+                    config = self.cell_config(cell)
+                    start = self.warm_start(cell, required_desks)
+                    estimate = analytic_estimate(start, config) if ANALYTIC_LOWER_BOUND else start
+                    search = threads.submit(search_required_desks, config, start, self.engine, self.search_mode,
+                                            self.replications, self.seed, self.common_random_numbers,
+                                            estimate=estimate, stop=stop)
+                    searches[search] = cell, estimate
+
+                pending = set(searches)
+                while pending:
+                    done, pending = wait(pending, timeout=SSE_HEARTBEAT_INTERVAL, return_when=FIRST_COMPLETED)
+                    if not done and self.abandoned():
+                        forget_session(self.session_id)
+                        return
+                    for search in done:
+                        cell, start = searches[search]
+                        required_desks[cell], desk_counts = search.result()
+                        simulated += desk_counts
+                        yield 'cell', {'cell': list(cell),
+                                       'parameters': {name: self.grid[name][position]
+                                                      for name, position in zip(self.grid, cell)},
+                                       'start': start,
+                                       'required_desks': required_desks[cell],
+                                       'desk_counts': desk_counts}
+        finally:
+            # Also when the stream is closed: the searches that have not started are cancelled, the running ones
+            # stop at their next number of desks
+            stop.set()
+            threads.shutdown(wait=False, cancel_futures=True)
+
+        yield 'done', {'cells': len(cells), 'desk_counts': simulated}
+
+
+def parse_values(name, text):
+    """
+    Reads the values of a parameter: a comma separated list, or start:stop:step with stop included. Whole values
+    are made ints, so that they read like the DEFAULT_CONFIG ones. A range is counted before its values are made,
+    so that one with more than SWEEP_MAX_CELLS values is rejected without making them.
+    """
+    try:
+        if ':' in text:
+            start, stop, step = (float(part) for part in text.split(':'))
+            if not all(map(math.isfinite, (start, stop, step))) or not step > 0 or stop < start:
+                raise ValueError
+            steps = (stop - start) / step
+        else:
+            values = [float(part) for part in text.split(',')]
+    except ValueError:
+        raise ValueError(f"{name} must be a comma separated list or start:stop:step") from None
+
+    if ':' in text:
+        if not steps < SWEEP_MAX_CELLS:
+            raise ValueError(f"{name} has too many values, at most {SWEEP_MAX_CELLS} are allowed")
+        count = math.floor(steps + 1e-9) + 1
+        values = [round(start + i * step, 10) for i in range(count)]
+
+    if not all(map(math.isfinite, values)):
+        raise ValueError(f"{name} must be finite")
+    if any(value <= 0 for value in values):
+        raise ValueError(f"{name} must be positive")
+    if name == 'waiting_line_capacity' and any(value != int(value) for value in values):
+        raise ValueError(f"{name} must be whole numbers")
+    return sorted({int(value) if value == int(value) else value for value in values})
+
+
+def sweep_arguments(parameters):
+    """
+    Reads the arguments of a SweepSession from the query parameters of /run-sweep: the SWEEP_PARAMETERS (a
+    parameter that is not given keeps its DEFAULT_CONFIG value) and the engine, search, replications and
+    common_random_numbers of the searches (see search_arguments in session.py).
+
+    Returns the keyword arguments of SweepSession, and raises ValueError with a message for the client if a
+    parameter is not valid.
+    """
+    grid = {}
+    for name in SWEEP_PARAMETERS:
+        text = parameters.get(name)
+        grid[name] = parse_values(name, text) if text else [getattr(DEFAULT_CONFIG, name)]
+    cells = 1
+    for values in grid.values():
+        cells *= len(values)
+    if cells > SWEEP_MAX_CELLS:
+        raise ValueError(f"the sweep has {cells} cells, at most {SWEEP_MAX_CELLS} are allowed")
+
+    arguments = search_arguments({'search': 'linear', **parameters})
+    if arguments['search_mode'] not in DESK_SEARCHES:
+        raise ValueError(f"search must be one of {sorted(DESK_SEARCHES)}, the cells are searched in parallel already")
+    return {'grid': grid, **arguments}
@@ -0,0 +1,117 @@
+"""
+The telemetry of a run shows what goes on inside it while it is simulated: how many desks are busy, how long the
+waiting line is (in total and per priority) and how long the latest patients waited. A run only reports its result
+once it is over, which for long horizons is a long time to watch nothing.
+
+The cost of the telemetry does not grow with the number of events of a run:
+
+    1. A sampling process in the SimPy environment (see telemetry_process) takes a snapshot every
+    TELEMETRY_INTERVAL simulated minutes, not on every event. The heap engine does not record telemetry.
+
+    2. The snapshots are kept in a buffer of at most TELEMETRY_BUFFER_SIZE snapshots. Once it is full, every other
+    snapshot is dropped and only every second snapshot from then on is kept, so the buffer always covers the whole
+    run with evenly spaced snapshots.
+
+    3. The buffer is published to the run's channel at most TELEMETRY_RATE times per second of wall-clock time,
+    and once more when the run is over. The channel is a queue of the process manager (see workers.py), since the
+    runs are simulated in the worker processes, and the session keeps the latest buffer of every run it receives
+    and streams it as 'telemetry' events (see session.py).
+
+The sampling process adds a few SimPy events of its own to the run. It counts them (Telemetry.events), so that the
+events counter of the run (see run_simpy_simulation in simulation.py) only counts the events of the model, the same
+with and without telemetry.
+
+A snapshot is a dict with the simulated time, busy_desks, utilisation (busy desks / desks), waiting,
+waiting_by_priority and the median, 90th percentile and maximum of the waiting times of the patients that got to a
+desk since the previous snapshot.
+"""
+
+import time
+from config import *
+from online_stats import quantiles
+
+
+class Telemetry:
+    def __init__(self, channel, run, interval=TELEMETRY_INTERVAL, capacity=TELEMETRY_BUFFER_SIZE,
+                 rate=TELEMETRY_RATE):
+        """
+        Parameters:
+        - channel (Queue): Where the snapshots are published.
+        - run (dict): Tells the run apart from the other runs on the channel, like its number of desks and seed.
+        - interval (int): Simulated minutes between two snapshots.
+        - capacity (int): Number of snapshots the buffer holds.
+        - rate (float): How many times per second the buffer is published at most.
+        """
+        self.channel = channel
+        self.run = run
+        self.interval = interval
+        self.capacity = capacity
+        self.publish_gap = 1 / rate
+        self.snapshots = []
+        self.stride = 1
+        self.samples = 0
+        self.events = 0
+        self.last_published = time.monotonic()
+
+    def record(self, snapshot):
+        """
+        Adds a snapshot to the buffer, halving the buffer once it is full, and publishes it if it is time to.
+        """
+        if self.samples % self.stride == 0:
+            self.snapshots.append(snapshot)
+            if len(self.snapshots) > self.capacity:
+                self.snapshots = self.snapshots[::2]
+                self.stride *= 2
+        self.samples += 1
+
+        now = time.monotonic()
+        if now - self.last_published >= self.publish_gap:
+            self.publish()
+            self.last_published = now
+
+    def publish(self, finished=False):
+        self.channel.put({**self.run, 'finished': finished, 'snapshots': self.snapshots})
+
+
+def waiting_time_percentiles(counts, overflow):
+    """
+    Returns the median, 90th percentile and maximum of some waiting times, given as counts per waiting time and
+    (waiting time, count) pairs above them (see online_stats.py), or Nones if there are none.
+    """
+    median, p90, maximum = quantiles(counts, overflow, (0.5, 0.9, 1))
+    return median, p90, maximum
+
+
+def telemetry_process(env, hospital, telemetry):
+    """
+    Takes a snapshot of the hospital every telemetry.interval simulated minutes.
+    """
+    # The events of this process are not events of the model, so the run leaves them out of its counters
+    telemetry.events += 1
+    num_desks = hospital.desks.capacity
+    waiting_time_counts = hospital.waiting_time_counts
+    served = [0] * waiting_time_counts.bins
+    overflowed = []
+    while True:
+        yield env.timeout(telemetry.interval)
+        telemetry.events += 1
+        stats = hospital.waiting_line_stats()
+        counts, overflow = waiting_time_counts.distribution()
+        # Only the patients served since the last snapshot
+        overflowed_before = dict(overflowed)
+        new_overflow = [(waiting_time, count - overflowed_before.get(waiting_time, 0))
+                        for waiting_time, count in overflow]
+        median, p90, maximum = waiting_time_percentiles([count - previous for count, previous in zip(counts, served)],
+                                                        [entry for entry in new_overflow if entry[1]])
+        served = counts
+        overflowed = overflow
+        telemetry.record({
+            'time': env.now,
+            'busy_desks': hospital.desks.count,
+            'utilisation': round(hospital.desks.count / num_desks, 3),
+            'waiting': stats['waiting'],
+            'waiting_by_priority': stats['by_priority'],
+            'waiting_time_p50': median,
+            'waiting_time_p90': p90,
+            'waiting_time_max': maximum
+        })
@@ -0,0 +1,132 @@
+"""
+The engines of simulation.py model the same hospital, so given the same sampler they must give the same run: the
+same stop cause and stop time, the same waiting time counts, the same patients created and longest waiting line, and
+the same summary trace (the failure that ends the run). The SimPy model is the reference; the heap engine and the
+lockstep engine are held to it on several seeds, numbers of desks and configs, among them an unbounded waiting line,
+no limit on the waiting times and arrival logs with many arrivals in the same minute.
+
+Run it from the repository root:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler
+from arrival_log import LogSampler, convert_arrival_log
+from simulation import ENGINES
+from vector_engine import run_desk_counts
+from event_trace import Trace
+
+SEEDS = range(4)
+DESK_COUNTS = (1, 8, 14, 17, 22)
+CONFIGS = {
+    'default': DEFAULT_CONFIG,
+    'unbounded line': DEFAULT_CONFIG._replace(waiting_line_capacity=float('inf')),
+    'busy': DEFAULT_CONFIG._replace(interarrival_rate_lambda_param=0.5, waiting_line_capacity=25),
+    'short waits': DEFAULT_CONFIG._replace(emergency_threshold=9, non_emergency_allowed_waiting_time=12,
+                                           service_time_lambda_param=6),
+    # No patient is an emergency, so the waits grow past the bins of the waiting time counts
+    'no waiting limit': DEFAULT_CONFIG._replace(priority_lower_bound=2, emergency_threshold=1,
+                                                non_emergency_allowed_waiting_time=float('inf'),
+                                                waiting_line_capacity=float('inf')),
+}
+LOG_DESK_COUNTS = (1, 3, 6, 10, 15, 20, 25)
+
+# A log whose run with 3 desks fails on the waiting time at minute 10. The services ending at 10 were scheduled
+# before and after the arrival of 10, so the engines only agree if they process those events in the same order.
+ORDERED_LOG = [(0, 5, 10), (0, 5, 5), (0, 5, 5), (1, 5, 5), (2, 5, 5), (3, 5, 5), (5, 5, 5), (10, 5, 5), (20, 5, 5)]
+
+
+def write_log(path, rows):
+    with open(path, 'w') as log_file:
+        log_file.write('timestamp,priority,service_time\n')
+        for row in rows:
+            log_file.write(','.join(map(str, row)) + '\n')
+    return convert_arrival_log(path)
+
+
+def bursty_rows(seed, rows=2000, gap=0.7):
+    # Gaps of a fraction of a minute, rounded: many patients arrive in the minute of the one before
+    generator = np.random.default_rng(seed)
+    timestamps = np.cumsum(np.rint(generator.exponential(gap, rows)).astype(int))
+    priorities = generator.integers(PRIORITY_LOWER_BOUND, PRIORITY_UPPER_BOUND + 1, rows)
+    service_times = np.maximum(1, np.rint(generator.exponential(SERVICE_TIME_LAMBDA_PARAM, rows)).astype(int))
+    return zip(timestamps.tolist(), priorities.tolist(), service_times.tolist())
+
+
+@pytest.fixture(scope='module')
+def log_configs(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('logs')
+    return {
+        'bursty log': DEFAULT_CONFIG._replace(arrival_log=write_log(folder / 'bursty.csv', bursty_rows(0))),
+        'bursty log, unbounded line': DEFAULT_CONFIG._replace(
+            arrival_log=write_log(folder / 'bursty_unbounded.csv', bursty_rows(1, gap=0.5)),
+            waiting_line_capacity=float('inf')),
+        'ordered log': DEFAULT_CONFIG._replace(arrival_log=write_log(folder / 'ordered.csv', ORDERED_LOG),
+                                               waiting_line_capacity=float('inf')),
+        'short log': DEFAULT_CONFIG._replace(
+            arrival_log=write_log(folder / 'short.csv', [(3 * minute, 5, 5) for minute in range(300)])),
+    }
+
+
+def run(engine, num_desks, sampler, config):
+    trace = Trace('summary')
+    counters = {}
+    stop_cause, waiting_time_counts = ENGINES[engine](num_desks, sampler, config, trace=trace, counters=counters)
+    return {'stop_cause': stop_cause, 'stop_time': counters['stop_time'], 'waiting_time_counts': waiting_time_counts,
+            'patients_created': counters['patients_created'], 'peak_waiting_line': counters['peak_waiting_line'],
+            'trace': trace.events()}
+
+
+@pytest.mark.parametrize('engine', ['heap', 'vector'])
+@pytest.mark.parametrize('config_name', CONFIGS)
+@pytest.mark.parametrize('num_desks', DESK_COUNTS)
+def test_sampled_runs_match_simpy(engine, config_name, num_desks):
+    config = CONFIGS[config_name]
+    for seed in SEEDS:
+        expected = run('simpy', num_desks, PatientSampler(seed, config), config)
+        assert run(engine, num_desks, PatientSampler(seed, config), config) == expected, f"seed {seed}"
+
+
+@pytest.mark.parametrize('engine', ['heap', 'vector'])
+@pytest.mark.parametrize('config_name', ['bursty log', 'bursty log, unbounded line'])
+def test_arrival_log_runs_match_simpy(engine, config_name, log_configs):
+    config = log_configs[config_name]
+    for num_desks in LOG_DESK_COUNTS:
+        expected = run('simpy', num_desks, LogSampler(config), config)
+        assert run(engine, num_desks, LogSampler(config), config) == expected, f"{num_desks} desks"
+
+
+@pytest.mark.parametrize('engine', ['heap', 'vector'])
+def test_events_of_one_time_in_order(engine, log_configs):
+    config = log_configs['ordered log']
+    expected = run('simpy', 3, LogSampler(config), config)
+    assert expected['stop_cause'] == STOP_TRIGGERS['patient_waiting_time_failure']
+    assert expected['stop_time'] == 10
+    assert run(engine, 3, LogSampler(config), config) == expected
+
+
+@pytest.mark.parametrize('engine', ['simpy', 'heap', 'vector'])
+def test_used_up_log_stops_after_simulation_time(engine, log_configs):
+    config = log_configs['short log']
+    result = run(engine, 4, LogSampler(config), config)
+    assert result['stop_cause'] == STOP_TRIGGERS['success']
+    assert result['stop_time'] == config.simulation_time + 1
+    assert result['patients_created'] == 301
+
+
+@pytest.mark.parametrize('config_name', ['bursty log', 'ordered log'])
+def test_single_pass_matches_heap(config_name, log_configs):
+    config = log_configs[config_name]
+    single_pass = run_desk_counts(LOG_DESK_COUNTS, [LogSampler(config)], config)
+    for num_desks, ((stop_cause, waiting_time_counts, counters, _),) in zip(LOG_DESK_COUNTS, single_pass):
+        expected = run('heap', num_desks, LogSampler(config), config)
+        assert (stop_cause, counters['stop_time'], waiting_time_counts) == (
+            expected['stop_cause'], expected['stop_time'], expected['waiting_time_counts']), f"{num_desks} desks"
@@ -0,0 +1,66 @@
+"""
+The desk searches of search.py must find the same required number of desks whatever number of desks they start at,
+as long as it is not below the required one: an analytic estimate (see analytic.py) that is too high costs runs, not
+a wrong answer. The searches are driven with a made-up monotone feasibility and with short heap engine runs, whose
+required number of desks is far below the estimate.
+
+Run it from the repository root:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import *
+from sampler import PatientSampler
+from search import DESK_SEARCHES, estimated_search
+from analytic import analytic_estimate
+from event_engine import run_heap_simulation
+from event_trace import Trace
+
+
+def drive(search, feasible):
+    """
+    Runs a search with the given feasibility of every number of desks, and returns the required number of desks
+    and the numbers of desks it simulated.
+    """
+    simulated = []
+    number_of_desks = next(search)
+    while True:
+        simulated.append(number_of_desks)
+        try:
+            number_of_desks = search.send(feasible(number_of_desks))
+        except StopIteration as result:
+            return result.value, simulated
+
+
+@pytest.mark.parametrize('search_mode', DESK_SEARCHES)
+@pytest.mark.parametrize('estimate', [1, 3, 8, 9, 10, 25])
+def test_estimated_search_finds_required_desks(search_mode, estimate):
+    required_desks, simulated = drive(estimated_search(search_mode, estimate), lambda desks: desks >= 9)
+    assert required_desks == 9
+    assert simulated[0] == estimate
+    # The answer is only found once the number of desks below it has failed
+    assert 8 in simulated
+
+
+def test_estimated_search_stops_at_start():
+    assert drive(estimated_search('linear', 6, start=4), lambda desks: True) == (4, [6, 5, 4])
+
+
+@pytest.mark.parametrize('search_mode', DESK_SEARCHES)
+def test_short_runs_below_the_estimate(search_mode):
+    config = DEFAULT_CONFIG._replace(simulation_time=50, waiting_line_capacity=100)
+
+    def feasible(num_desks):
+        stop_cause, _ = run_heap_simulation(num_desks, PatientSampler(0, config), config, trace=Trace('off'))
+        return stop_cause == STOP_TRIGGERS['success']
+
+    required_desks, _ = drive(DESK_SEARCHES['linear'](1), feasible)
+    estimate = analytic_estimate(1, config)
+    assert estimate > required_desks
+    assert drive(estimated_search(search_mode, estimate), feasible)[0] == required_desks
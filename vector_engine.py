@@ -0,0 +1,545 @@
+"""
+The replications of a number of desks are independent runs of the same hospital, and simulating them one after the
+other in Python leaves NumPy idle. The lockstep engine simulates R replications together: the state of every run is
+a row of NumPy arrays with a replication axis, and the runs advance through time side by side, with one set of
+array operations per simulation time for all of them.
+
+The state of the R runs:
+
+    1. desk_ends (R x num_desks): the time every desk finishes its service. A desk is free at time t if its end is
+    at most t.
+
+    2. the waiting lines: one FIFO ring buffer per run and priority, holding the arrival time, service time and
+    name of the waiting patients (R x priorities x slots, with head and tail indexes). Within a priority the
+    patients are served in arrival order, so the head of the first non-empty priority is the patient
+    PriorityResource would pick.
+
+    3. the patients: blocks of LOCKSTEP_BLOCK_SIZE priorities, service times and gaps per run, drawn from the run's
+    sampler (see sampler.py), so replication r gets exactly the patients of its seed in the other engines.
+
+    4. the counters, waiting time counts (R x priorities x minutes, see online_stats.py) and stop causes.
+
+Every step goes to the next time at which some run has an arrival or a service end, and at that time t, for all
+the runs that are still going:
+
+    1. the desks whose service ends at t are freed.
+
+    2. the runs with an arrival at t create the patient and add it to its waiting line. A run is a success if t is
+    past SIMULATION_TIME, and fails on the waiting line if the line is now longer than WAITING_LINE_CAPACITY.
+
+    3. the free desks go to the heads of the waiting lines, one patient per run at a time, with masked updates of
+    the runs that have a free desk and a waiting patient. The waiting times are counted, and a run fails on the
+    waiting time once all the desks of t are given out if one of its patients waited longer than allowed.
+
+The runs are the runs of the heap engine (see event_engine.py), which processes the events of one time in the order
+they were scheduled and then the events they schedule at that time, first in, first out. To follow that order the
+engine keeps when every next arrival and service end was scheduled. With one arrival at t the steps above come to
+the same decisions, since the desks freed at t go to the heads of the line including the patient of t; only a late
+head given a desk at the arrival stops the run before some of the desks of t are counted (first_grant_limits).
+Several arrivals at one time only come from the gaps of 0 of an arrival log, and there the heap engine gives a free
+desk at every arrival, before the later patients of that time have joined the line. Those runs process that time
+one event at a time, in the order of the heap engine (arrive_in_order). bench_vector_engine.py checks that both
+engines agree, on sampled patients and on an arrival log. The events of a run are its arrivals, desk arrivals and
+service ends.
+
+The runs that are over keep their rows, with their next arrival and desk ends set past any time so that no step
+picks them up again, and the engine stops once all of them are over. Only the summary trace (the failures that end
+the runs) is recorded; there is no per-patient trace and no telemetry.
+"""
+
+from collections import deque
+import numpy as np
+from config import *
+from online_stats import WaitingTimeCounts
+from event_trace import default_trace, WAITING_TIME_FAILURE, WAITING_LINE_FAILURE
+from event_engine import ARRIVAL, DESK_ARRIVAL, SERVICE_END, RELEASE, STOP
+
+NEVER = np.iinfo(np.int64).max
+
+# Patients and gaps drawn per run at a time. It is smaller than SAMPLER_BLOCK_SIZE since every run of a batch has a
+# block of its own, and it does not change the drawn values (see sampler.py).
+LOCKSTEP_BLOCK_SIZE = 512
+
+
+class LockstepRuns:
+    def __init__(self, desk_counts, samplers, config=DEFAULT_CONFIG, streams=None, block_size=LOCKSTEP_BLOCK_SIZE):
+        """
+        The state of R runs, as arrays with a run axis. The arrays are kept flat and indexed by run * row length +
+        column: NumPy gathers and scatters a single index array much faster than a tuple of them.
+
+        Parameters:
+        - desk_counts (list): The number of service desks of every run.
+        - samplers (list): The PatientSampler of every patient stream.
+        - config (SimulationConfig): The simulated hospital.
+        - streams (list): The index of the patient stream of every run. None gives every run a stream of its own.
+        - block_size (int): Number of patients and gaps drawn per stream every time a block runs out.
+        """
+        runs = len(desk_counts)
+        self.runs = runs
+        self.desk_counts = np.asarray(desk_counts, np.int64)
+        self.max_desks = int(self.desk_counts.max())
+        self.streams = np.arange(runs) if streams is None else np.asarray(streams, np.int64)
+        self.num_priorities = config.priority_upper_bound + 1
+        self.bins = WaitingTimeCounts(config).bins
+        self.samplers = samplers
+        self.config = config
+        self.block_size = block_size
+        self.allowed_waiting_times = np.array(
+            [priority if priority <= config.emergency_threshold else config.non_emergency_allowed_waiting_time
+             for priority in range(self.num_priorities)])
+
+        self.priorities = np.empty(len(samplers) * block_size, np.int64)
+        self.service_times = np.empty(len(samplers) * block_size, np.int64)
+        self.interarrival_times = np.empty(len(samplers) * block_size, np.int64)
+        # Every arrival takes one patient and one gap, so both are read at the same index. The runs of a stream
+        # arrive together, so the index is kept per stream.
+        self.patient_index = np.zeros(len(samplers), np.int64)
+        for stream in range(len(samplers)):
+            self.refill(stream)
+
+        self.next_arrival = np.zeros(runs, np.int64)
+        # The desks a run does not have are never free
+        self.desk_ends = np.where(np.arange(self.max_desks) < self.desk_counts[:, None], -1, NEVER)
+        self.flat_desk_ends = self.desk_ends.reshape(-1)
+        # When the next arrival and every service end were scheduled, as (time, position among the events of that
+        # time): the order the heap engine processes the events of one time in
+        self.arrival_scheduled = np.full(runs, -1, np.int64)
+        self.arrival_positions = np.zeros(runs, np.int64)
+        self.desk_scheduled = np.full((runs, self.max_desks), -1, np.int64)
+        self.desk_positions = np.zeros((runs, self.max_desks), np.int64)
+        self.flat_desk_scheduled = self.desk_scheduled.reshape(-1)
+        self.flat_desk_positions = self.desk_positions.reshape(-1)
+
+        if config.waiting_line_capacity == float('inf'):
+            self.slots = 64
+        else:
+            # A line never holds more than capacity + 1 patients, the last of which stops the run
+            self.slots = 1 << int(config.waiting_line_capacity + 1).bit_length()
+        lines = runs * self.num_priorities
+        self.line_arrivals = np.zeros(lines * self.slots, np.int64)
+        self.line_service_times = np.zeros(lines * self.slots, np.int64)
+        self.line_names = np.zeros(lines * self.slots, np.int64)
+        self.heads = np.zeros(lines, np.int64)
+        self.tails = np.zeros(lines, np.int64)
+
+        self.line_lengths = np.zeros(runs, np.int64)
+        self.peak_line_lengths = np.zeros(runs, np.int64)
+        self.patients_created = np.zeros(runs, np.int64)
+        self.events = np.zeros(runs, np.int64)
+        self.counts = np.zeros(lines * self.bins, np.int64)
+        self.overflow = [{} for _ in range(runs)]
+        self.stop_causes = np.zeros(runs, np.int64)
+        self.stop_times = np.zeros(runs, np.int64)
+        self.running = runs
+        self.failures = [None] * runs
+
+    def refill(self, stream):
+        """
+        Draws the next block of patients and gaps of a stream.
+        """
+        sampler = self.samplers[stream]
+        block = slice(stream * self.block_size, (stream + 1) * self.block_size)
+        self.priorities[block], _, self.service_times[block] = sampler.draw_patients(self.block_size)
+        self.interarrival_times[block] = sampler.draw_interarrival_times(self.block_size)
+        self.patient_index[stream] = 0
+
+    def grow_lines(self):
+        """
+        Doubles the slots of the waiting lines, with the waiting patients moved to the start of their buffers.
+        """
+        slots = self.slots
+        order = (self.heads[:, None] + np.arange(slots)) % slots
+        for name in ('line_arrivals', 'line_service_times', 'line_names'):
+            line = np.take_along_axis(getattr(self, name).reshape(-1, slots), order, axis=1)
+            setattr(self, name, np.concatenate([line, np.zeros_like(line)], axis=1).reshape(-1))
+        self.tails -= self.heads
+        self.heads[:] = 0
+        self.slots = 2 * slots
+
+    def stop(self, runs, cause, now, failure_kind=None, names=None):
+        """
+        Ends the runs in runs at now. Their next arrival and desks are set to NEVER, which leaves them out of all the
+        later steps.
+        """
+        self.stop_causes[runs] = cause
+        self.stop_times[runs] = now
+        self.running -= len(runs)
+        # The arrivals, desk arrivals and the services that ended by now; the others are cut off by the stop
+        desk_arrivals = self.counts.reshape(self.runs, -1)[runs].sum(axis=1)
+        desk_arrivals += [sum(self.overflow[run].values()) for run in runs.tolist()]
+        busy_desks = self.desk_counts[runs] - (self.desk_ends[runs] <= now).sum(axis=1)
+        self.events[runs] = self.patients_created[runs] + 2 * desk_arrivals - busy_desks
+        self.next_arrival[runs] = NEVER
+        self.desk_ends[runs] = NEVER
+        if failure_kind is not None:
+            for position, run in enumerate(runs.tolist()):
+                self.failures[run] = (failure_kind, now) if names is None else (failure_kind, now, names[position])
+
+    def arrive(self, runs, now):
+        """
+        Creates the patient of every run in runs, which all have an arrival at now, and adds it to its waiting line.
+        """
+        streams = self.streams[runs]
+        patient_index = self.patient_index[streams] + 1
+        patients = streams * self.block_size + patient_index - 1
+        priorities = self.priorities[patients]
+        service_times = self.service_times[patients]
+        self.next_arrival[runs] += self.interarrival_times[patients]
+        self.arrival_scheduled[runs] = now
+        self.arrival_positions[runs] = 0
+        self.patient_index[streams] = patient_index
+        used_up = patient_index == self.block_size
+        if used_up.any():
+            for stream in np.unique(streams[used_up]).tolist():
+                self.refill(stream)
+
+        names = self.patients_created[runs] + 1
+        self.patients_created[runs] = names
+        lines = runs * self.num_priorities + priorities
+        tails = self.tails[lines]
+        if (tails - self.heads[lines] >= self.slots).any():
+            self.grow_lines()
+            tails = self.tails[lines]
+        slots = lines * self.slots + tails % self.slots
+        self.line_arrivals[slots] = now
+        self.line_service_times[slots] = service_times
+        self.line_names[slots] = names
+        self.tails[lines] = tails + 1
+        line_lengths = self.line_lengths[runs] + 1
+        self.line_lengths[runs] = line_lengths
+        self.peak_line_lengths[runs] = np.maximum(self.peak_line_lengths[runs], line_lengths)
+
+        if now > self.config.simulation_time:
+            self.stop(runs, STOP_TRIGGERS['success'], now)
+        else:
+            over_capacity = line_lengths > self.config.waiting_line_capacity
+            if over_capacity.any():
+                self.stop(runs[over_capacity], STOP_TRIGGERS['waiting_queue_failure'], now, WAITING_LINE_FAILURE)
+
+    def first_grant_limits(self, runs, now):
+        """
+        Returns how many of the desks given out at now are counted in the runs in runs, which all have one arrival
+        at now, if their first desk goes to a patient that waited too long: the desk arrivals the heap engine
+        processes before that failure stops the run. The other runs count all their desks (NEVER). Returns None if
+        no run is limited.
+
+        The heap engine processes the service ends and the arrival of now in the order they were scheduled, and
+        then the releases and desk arrivals they lead to. If a desk was freed before the arrival, the arrival gives
+        it to the head of the line at once, and a late head stops the run before the releases of the services that
+        end after the arrival are processed. The desks of the releases before the arrival are still counted.
+        """
+        # A run with an empty line gives its first desk to the patient of now, who does not wait
+        runs = runs[self.line_lengths[runs] > 0]
+        if runs.size == 0:
+            return None
+        ending = self.desk_ends[runs] == now
+        scheduled = self.desk_scheduled[runs]
+        arrival_scheduled = self.arrival_scheduled[runs, None]
+        earlier = (scheduled < arrival_scheduled) | ((scheduled == arrival_scheduled) &
+                                                     (self.desk_positions[runs] < self.arrival_positions[runs, None]))
+        before = (ending & earlier).sum(axis=1)
+        limited = before > 0
+        if not limited.any():
+            return None
+        limits = np.full(self.runs, NEVER)
+        limits[runs[limited]] = 1 + np.minimum(before, ending.sum(axis=1) - 1)[limited]
+        return limits
+
+    def add_overflow(self, run, priority, waiting_time):
+        """
+        Counts a waiting time above the bins of a run, like WaitingTimeCounts.add_overflow.
+        """
+        overflow = self.overflow[run]
+        key = (priority, waiting_time)
+        overflow[key] = overflow.get(key, 0) + 1
+
+    def serve(self, now, limits=None):
+        """
+        Gives the free desks at now to the heads of the waiting lines, and stops the runs with a patient that waited
+        longer than allowed.
+
+        Parameters:
+        - now (int): The simulation time.
+        - limits (ndarray): The first_grant_limits of the runs with an arrival at now, or None.
+        """
+        grants = np.minimum((self.desk_ends <= now).sum(axis=1), self.line_lengths)
+        runs = np.flatnonzero(grants)
+        if runs.size == 0:
+            return
+        grants = grants[runs]
+        num_priorities = self.num_priorities
+        heads = self.heads.reshape(self.runs, num_priorities)
+        tails = self.tails.reshape(self.runs, num_priorities)
+        late = {}
+        first = True
+        uncounted = None
+        while True:
+            priorities = (tails[runs] > heads[runs]).argmax(axis=1)
+            lines = runs * num_priorities + priorities
+            line_heads = self.heads[lines]
+            slots = lines * self.slots + line_heads % self.slots
+            waiting_times = now - self.line_arrivals[slots]
+            self.heads[lines] = line_heads + 1
+            self.line_lengths[runs] -= 1
+            desks = runs * self.max_desks + (self.desk_ends[runs] <= now).argmax(axis=1)
+            self.flat_desk_ends[desks] = now + self.line_service_times[slots]
+            self.flat_desk_scheduled[desks] = now
+            self.flat_desk_positions[desks] = 1
+
+            too_late = waiting_times > self.allowed_waiting_times[priorities]
+            if first and limits is not None:
+                # The grants left to count, in the runs whose first grant is late
+                uncounted = np.where(too_late, limits[runs], NEVER)
+            counted = waiting_times < self.bins
+            if uncounted is not None:
+                uncounted -= 1
+                counted &= uncounted >= 0
+            if counted.all():
+                self.counts[lines * self.bins + waiting_times] += 1
+            else:
+                self.counts[lines[counted] * self.bins + waiting_times[counted]] += 1
+                overflow = ~counted & (waiting_times >= self.bins)
+                if uncounted is not None:
+                    overflow &= uncounted >= 0
+                for run, priority, waiting_time in zip(runs[overflow].tolist(), priorities[overflow].tolist(),
+                                                       waiting_times[overflow].tolist()):
+                    self.add_overflow(run, priority, waiting_time)
+
+            if too_late.any():
+                for run, name in zip(runs[too_late].tolist(), self.line_names[slots[too_late]].tolist()):
+                    late.setdefault(run, name)
+
+            more = grants > 1
+            if not more.any():
+                break
+            runs = runs[more]
+            grants = grants[more] - 1
+            if uncounted is not None:
+                uncounted = uncounted[more]
+            first = False
+
+        if late:
+            self.stop(np.array(list(late)), STOP_TRIGGERS['patient_waiting_time_failure'], now, WAITING_TIME_FAILURE,
+                      list(late.values()))
+
+    def draw_time(self, stream):
+        """
+        Returns the (priority, service_time, gap) of the next patients of a stream up to the first gap that is not
+        0: all the arrivals of one time.
+        """
+        patients = []
+        gap = 0
+        while gap == 0:
+            patient = stream * self.block_size + int(self.patient_index[stream])
+            gap = int(self.interarrival_times[patient])
+            patients.append((int(self.priorities[patient]), int(self.service_times[patient]), gap))
+            self.patient_index[stream] += 1
+            if self.patient_index[stream] == self.block_size:
+                self.refill(stream)
+        return patients
+
+    def arrive_in_order(self, run, now, patients):
+        """
+        Processes the events of a run at now one at a time, in the order of the heap engine: the arrival and the
+        service ends of now in the order they were scheduled, and then the events they schedule at now, first in,
+        first out. Used for the times with several arrivals, where a desk given out at an arrival goes to the head
+        of the line before the later patients of that time join it.
+
+        Parameters:
+        - run (int): The run, which has an arrival at now.
+        - now (int): The simulation time.
+        - patients (list): The (priority, service_time, gap) of the arrivals of now, see draw_time.
+        """
+        num_priorities = self.num_priorities
+        first_line = run * num_priorities
+        first_desk = run * self.max_desks
+        num_desks = int(self.desk_counts[run])
+        desk_ends = self.flat_desk_ends
+        desks = range(first_desk, first_desk + num_desks)
+        free = [desk for desk in desks if desk_ends[desk] < now]
+        busy = num_desks - len(free)
+        scheduled = [(int(self.flat_desk_scheduled[desk]), int(self.flat_desk_positions[desk]), SERVICE_END, desk)
+                     for desk in desks if desk_ends[desk] == now]
+        scheduled.append((int(self.arrival_scheduled[run]), int(self.arrival_positions[run]), ARRIVAL, -1))
+        events = deque((kind, desk) for _, _, kind, desk in sorted(scheduled))
+        arrivals = iter(patients)
+
+        waiting = queue_length = int(self.line_lengths[run])
+        patients_created = int(self.patients_created[run])
+        peak = int(self.peak_line_lengths[run])
+        heads, tails = self.heads, self.tails
+        stop_cause = failure = None
+
+        def grant():
+            # The desk goes to the head of the line, who gets to it at a later event of now
+            line = first_line + next(priority for priority in range(num_priorities)
+                                     if tails[first_line + priority] > heads[first_line + priority])
+            slot = line * self.slots + heads[line] % self.slots
+            heads[line] += 1
+            events.append((DESK_ARRIVAL, (free.pop(), line - first_line, int(self.line_arrivals[slot]),
+                                          int(self.line_service_times[slot]), int(self.line_names[slot]))))
+
+        position = 0
+        while events:
+            kind, event = events.popleft()
+            if kind == ARRIVAL:
+                priority, service_time, gap = next(arrivals)
+                if stop_cause is None and now > self.config.simulation_time:
+                    stop_cause = STOP_TRIGGERS['success']
+                    events.append((STOP, None))
+                if gap == 0:
+                    events.append((ARRIVAL, None))
+                else:
+                    self.next_arrival[run] = now + gap
+                    self.arrival_scheduled[run] = now
+                    self.arrival_positions[run] = position
+                patients_created += 1
+                queue_length += 1
+                peak = max(peak, queue_length)
+                if stop_cause is None and queue_length > self.config.waiting_line_capacity:
+                    stop_cause = STOP_TRIGGERS['waiting_queue_failure']
+                    failure = (WAITING_LINE_FAILURE, [])
+                    events.append((STOP, None))
+                line = first_line + priority
+                if tails[line] - heads[line] >= self.slots:
+                    self.grow_lines()
+                slot = line * self.slots + tails[line] % self.slots
+                self.line_arrivals[slot] = now
+                self.line_service_times[slot] = service_time
+                self.line_names[slot] = patients_created
+                tails[line] += 1
+                waiting += 1
+                if busy < num_desks:
+                    busy += 1
+                    waiting -= 1
+                    grant()
+
+            elif kind == DESK_ARRIVAL:
+                desk, priority, arrival, service_time, name = event
+                waiting_time = now - arrival
+                if waiting_time < self.bins:
+                    self.counts[(first_line + priority) * self.bins + waiting_time] += 1
+                else:
+                    self.add_overflow(run, priority, waiting_time)
+                if stop_cause is None and waiting_time > self.allowed_waiting_times[priority]:
+                    stop_cause = STOP_TRIGGERS['patient_waiting_time_failure']
+                    failure = (WAITING_TIME_FAILURE, [name])
+                    events.append((STOP, None))
+                queue_length -= 1
+                desk_ends[desk] = now + service_time
+                self.flat_desk_scheduled[desk] = now
+                self.flat_desk_positions[desk] = position
+
+            elif kind == SERVICE_END:
+                busy -= 1
+                free.append(event)
+                events.append((RELEASE, None))
+
+            elif kind == RELEASE:
+                if waiting and busy < num_desks:
+                    busy += 1
+                    waiting -= 1
+                    grant()
+
+            else:
+                break
+            position += 1
+
+        self.patients_created[run] = patients_created
+        self.peak_line_lengths[run] = peak
+        self.line_lengths[run] = waiting
+        if stop_cause is not None:
+            failure_kind, names = failure or (None, None)
+            self.stop(np.array([run]), stop_cause, now, failure_kind, names or None)
+
+    def advance(self):
+        """
+        Runs all the runs to their end.
+        """
+        now = 0
+        while True:
+            arriving = np.flatnonzero(self.next_arrival == now)
+            limits = None
+            if arriving.size:
+                streams = self.streams[arriving]
+                # Only the gaps of an arrival log can be 0
+                together = self.interarrival_times[streams * self.block_size + self.patient_index[streams]] == 0
+                if together.any():
+                    for stream in np.unique(streams[together]).tolist():
+                        patients = self.draw_time(stream)
+                        for run in arriving[together & (streams == stream)].tolist():
+                            self.arrive_in_order(run, now, patients)
+                    arriving = arriving[~together]
+                if arriving.size:
+                    limits = self.first_grant_limits(arriving, now)
+                    self.arrive(arriving, now)
+            self.serve(now, limits)
+            if self.running == 0:
+                break
+            now = int(min(self.next_arrival.min(), np.where(self.desk_ends > now, self.desk_ends, NEVER).min()))
+
+    def results(self):
+        """
+        Returns the (stop_cause, waiting_time_counts, counters, failure) of every run, in the order of the runs.
+        failure is the summary trace event of the failure that ended the run, or None.
+        """
+        counts = self.counts.reshape(self.runs, self.num_priorities, self.bins)
+        results = []
+        for run in range(self.runs):
+            waiting_time_counts = WaitingTimeCounts.from_dict({'bins': self.bins, 'counts': counts[run].tolist(),
+                                                               'overflow': []})
+            waiting_time_counts.overflow = self.overflow[run]
+            counters = {'events': int(self.events[run]), 'patients_created': int(self.patients_created[run]),
+                        'peak_waiting_line': int(self.peak_line_lengths[run]), 'stop_time': int(self.stop_times[run])}
+            results.append((int(self.stop_causes[run]), waiting_time_counts, counters, self.failures[run]))
+        return results
+
+
+def run_lockstep(num_desks, samplers, config=DEFAULT_CONFIG):
+    """
+    Runs one simulation per sampler, all with num_desks desks, in lockstep. Returns the (stop_cause,
+    waiting_time_counts, counters, failure) of every run, see LockstepRuns.results.
+    """
+    runs = LockstepRuns([num_desks] * len(samplers), samplers, config)
+    runs.advance()
+    return runs.results()
+
+
+def run_desk_counts(desk_counts, samplers, config=DEFAULT_CONFIG):
+    """
+    Runs every number of desks of desk_counts on the patients of every sampler, all in one pass: the runs of a
+    sampler share its stream, which is drawn once. Returns the results of every number of desks, a list with the
+    (stop_cause, waiting_time_counts, counters, failure) of every sampler, see LockstepRuns.results.
+    """
+    runs = LockstepRuns(np.repeat(desk_counts, len(samplers)), samplers, config,
+                        streams=np.tile(np.arange(len(samplers)), len(desk_counts)))
+    runs.advance()
+    results = runs.results()
+    return [results[position:position + len(samplers)] for position in range(0, len(results), len(samplers))]
+
+
+def run_vector_simulation(num_desks, sampler, config=DEFAULT_CONFIG, trace=None, telemetry=None, counters=None):
+    """
+    Runs one simulation with the lockstep engine, as a batch of one. simulate_replications in simulation.py runs
+    the replications of a number of desks as one batch.
+
+    Parameters:
+    - num_desks (int): Number of service desks of the hospital.
+    - sampler (PatientSampler): Source of the patients' random attributes and interarrival gaps.
+    - config (SimulationConfig): The simulated hospital.
+    - trace (Trace): Records the failure that ends the run. None uses default_trace() (see event_trace.py).
+    - telemetry (Telemetry): Not used, the lockstep engine does not record telemetry.
+    - counters (dict): If given, gets the events, patients_created, peak_waiting_line and stop_time of the run.
+
+    Returns:
+    - (stop_cause, waiting_time_counts): The STOP_TRIGGERS value that ended the run and the WaitingTimeCounts of the
+      patients that got to a desk.
+    """
+    (stop_cause, waiting_time_counts, run_counters, failure), = run_lockstep(num_desks, [sampler], config)
+    if trace is None:
+        trace = default_trace()
+    if failure is not None and trace.summary:
+        trace.record(*failure)
+    if counters is not None:
+        counters.update(run_counters)
+    return stop_cause, waiting_time_counts
@@ -0,0 +1,43 @@
+"""
+The worker processes of the simulations. All the searches share one ProcessPoolExecutor of PARALLEL_WORKERS
+processes, which is created the first time it is needed. The runs handed to it must be picklable, like
+simulate_run in simulation.py.
+
+The runs send their telemetry (see telemetry.py) back through queues of a multiprocessing manager, whose proxies
+can be handed to the workers like any other argument. The manager is shared as well and started on first use.
+
+The sessions run in threads of their own, so the first use can come from several threads at once; a lock makes sure
+only one pool and one manager are ever started.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import *
+
+process_pool = None
+process_manager = None
+workers_lock = threading.Lock()
+
+
+def get_process_pool(max_workers=PARALLEL_WORKERS, initializer=None):
+    """
+    Returns the process pool shared by all the searches, and creates it on first use with max_workers processes
+    that each call initializer when they start, if it is given. Both are ignored once the pool exists.
+    """
+    global process_pool
+    with workers_lock:
+        if process_pool is None:
+            process_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer)
+        return process_pool
+
+
+def get_process_manager():
+    """
+    Returns the multiprocessing manager shared by all the searches, and starts it on first use.
+    """
+    global process_manager
+    with workers_lock:
+        if process_manager is None:
+            process_manager = multiprocessing.Manager()
+        return process_manager